@@ -1,12 +1,15 @@
-import json
 import re
+import sys
 from collections import Counter
+from pathlib import Path
 
-file_path = r'D:\AG1\prompt-aggregator\data\prompts.json'
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "scripts"))
+import prompt_store
+
+file_path = prompt_store.DATA_FILE
 
 try:
-    with open(file_path, 'r', encoding='utf-8') as f:
-        data = json.load(f)
+    data = prompt_store.open_store(file_path).load()
 except Exception as e:
     print(f"Error loading JSON: {e}")
     exit(1)
@@ -1,8 +1,12 @@
-import json
 import os
+import sys
+from pathlib import Path
 
-input_file = r'D:\AG1\prompt-aggregator\data\prompts.json'
-output_file = r'D:\AG1\prompt-aggregator\data\prompts.md'
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "scripts"))
+import prompt_store
+
+input_file = prompt_store.DATA_FILE
+output_file = input_file.with_name('prompts.md')
 
 def main():
     if not os.path.exists(input_file):
@@ -10,8 +14,7 @@ def main():
         return
 
     try:
-        with open(input_file, 'r', encoding='utf-8') as f:
-            data = json.load(f)
+        data = prompt_store.open_store(input_file).load()
         
         print(f"Loaded {len(data)} items from JSON.")
 
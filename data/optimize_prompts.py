@@ -1,8 +1,12 @@
-import json
 import re
+import sys
+from pathlib import Path
 
-INPUT_FILE = r'D:\AG1\prompt-aggregator\data\prompts.json'
-OUTPUT_FILE = r'D:\AG1\prompt-aggregator\data\prompts_optimized.json'
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "scripts"))
+import prompt_store
+
+INPUT_FILE = prompt_store.DATA_FILE
+OUTPUT_FILE = INPUT_FILE.with_name('prompts_optimized.json')
 
 IDS_TO_REMOVE = ['979', '999']
 
@@ -22,8 +26,7 @@ REPLACEMENTS = {
 
 def optimize_prompts():
     try:
-        with open(INPUT_FILE, 'r', encoding='utf-8') as f:
-            data = json.load(f)
+        data = [p.to_dict() for p in prompt_store.open_store(INPUT_FILE).load()]
     except Exception as e:
         print(f"Error loading JSON: {e}")
         return
@@ -64,8 +67,8 @@ def optimize_prompts():
 
     # 6. Save as Minified JSON
     try:
-        with open(OUTPUT_FILE, 'w', encoding='utf-8') as f:
-            json.dump(optimized_data, f, ensure_ascii=False, indent=4)
+        output = prompt_store.open_store(OUTPUT_FILE, prompt_store.JsonBackend(indent=4))
+        output.save(optimized_data)
         print(f"Optimization complete. Saved to {OUTPUT_FILE}")
         print(f"Original count: {len(data)}, Optimized count: {len(optimized_data)}")
     except Exception as e:
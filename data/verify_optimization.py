@@ -1,9 +1,14 @@
 import json
 import os
 import re
+import sys
+from pathlib import Path
 
-ORIGINAL_FILE = r'D:\AG1\prompt-aggregator\data\prompts.json'
-OPTIMIZED_FILE = r'D:\AG1\prompt-aggregator\data\prompts_optimized.json'
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "scripts"))
+import prompt_store
+
+ORIGINAL_FILE = prompt_store.DATA_FILE
+OPTIMIZED_FILE = ORIGINAL_FILE.with_name('prompts_optimized.json')
 
 REMOVED_IDS = ['979', '999']
 
@@ -12,10 +17,8 @@ def verify():
 
     # Load data
     try:
-        with open(ORIGINAL_FILE, 'r', encoding='utf-8') as f:
-            orig_data = json.load(f)
-        with open(OPTIMIZED_FILE, 'r', encoding='utf-8') as f:
-            opt_data = json.load(f)
+        orig_data = prompt_store.open_store(ORIGINAL_FILE).load()
+        opt_data = prompt_store.open_store(OPTIMIZED_FILE).load()
     except Exception as e:
         print(f"Error loading files: {e}")
         return
@@ -63,7 +66,7 @@ def verify():
     
     # Let's search for old terms in the entire file
     old_terms = ['市役所', '庁内', '市民', '市長', '議員', '市議会', '行政', '市政', '公務員', '職員', '自治体']
-    text_dump = json.dumps(opt_data, ensure_ascii=False)
+    text_dump = json.dumps([item.to_dict() for item in opt_data], ensure_ascii=False)
     
     found_terms = {term: text_dump.count(term) for term in old_terms}
     total_found = sum(found_terms.values())
@@ -0,0 +1,263 @@
+#!/usr/bin/env python3
+"""
+Classifier Benchmark
+====================
+Measures speed and quality of the category classifier against a frozen,
+labelled snapshot of prompts (data/classify_snapshot.json.gz), offline.
+
+Engines compared side by side:
+  reference   classify_reference(): keyword-by-keyword substring scans
+  compiled    classify(): the compiled Aho-Corasick matcher
+  batch       classify_batch() on --workers processes (with --workers > 1)
+  vectorized  category_engine: sparse hit matrix x weight matrix (needs numpy)
+
+Reported per engine: prompts/sec, per-prompt latency p50/p99 (amortized for
+batch engines), peak traced memory, and agreement with the snapshot's
+reference tags (exact tag list, and primary tag only). The run fails (exit
+1) if any engine agrees on fewer than --min-agreement of the prompts, or
+the compiled engine - the one categorize_prompts.py uses - falls below
+--min-rate prompts/sec.
+
+The snapshot is frozen from data/prompts.json (or dify/knowledge_base if
+there is none) with the tags the pipeline assigned. After an intended rule
+change, refreeze with --relabel to take the current classify() output as
+the new reference.
+
+Usage:
+  python bench_classify.py
+  python bench_classify.py --runs 5 --workers 4 --json-out bench.json
+  python bench_classify.py --freeze [--sample 300] [--relabel]
+"""
+
+import argparse
+import gzip
+import json
+import statistics
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Callable
+
+import categorize_prompts
+import prompt_store
+from categorize_prompts import classify, classify_batch, classify_reference
+
+# Fix Windows console encoding
+if sys.platform == "win32":
+    import io
+    sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding="utf-8", errors="replace")
+
+# ---------------------------------------------------------------------------
+# Configuration
+# ---------------------------------------------------------------------------
+SCRIPT_DIR = Path(__file__).resolve().parent
+PROJECT_DIR = SCRIPT_DIR.parent
+SNAPSHOT_FILE = PROJECT_DIR / "data" / "classify_snapshot.json.gz"
+KNOWLEDGE_BASE_DIR = PROJECT_DIR / "dify" / "knowledge_base"
+MIN_AGREEMENT = 0.99
+MIN_RATE = 500.0  # prompts/sec for the compiled engine
+
+# ---------------------------------------------------------------------------
+# Snapshot
+# ---------------------------------------------------------------------------
+
+def load_knowledge_base(directory: Path) -> list[dict]:
+    """Prompts (with their exported categories) from the Dify text files."""
+    prompts = []
+    for path in sorted(directory.glob("prompt_*.txt")):
+        text = path.read_text(encoding="utf-8")
+        header, sep, body = text.partition("\n---\n")
+        if not sep:
+            continue
+        fields = dict(
+            line.split(": ", 1) for line in header.splitlines() if ": " in line
+        )
+        prompts.append({
+            "id": fields.get("ID", path.stem.removeprefix("prompt_")),
+            "title": fields.get("タイトル", ""),
+            "body": body.strip(),
+            "categories": [c.strip() for c in fields.get("カテゴリ", "").split(",") if c.strip()],
+        })
+    return prompts
+
+
+def freeze(path: Path, sample: int, relabel: bool) -> None:
+    if categorize_prompts.DATA_FILE.exists():
+        prompts = prompt_store.open_store(categorize_prompts.DATA_FILE).load()
+        source = categorize_prompts.DATA_FILE
+    else:
+        prompts, source = load_knowledge_base(KNOWLEDGE_BASE_DIR), KNOWLEDGE_BASE_DIR
+    prompts = sorted(prompts, key=lambda p: p["id"])
+    if sample and sample < len(prompts):
+        # Evenly spaced over the ID range, so old and new prompts are both in
+        step = len(prompts) / sample
+        prompts = [prompts[int(i * step)] for i in range(sample)]
+
+    records = []
+    for p in prompts:
+        tags = classify(p["title"], p["body"]) if relabel else p.get("categories")
+        if tags:
+            records.append({"id": p["id"], "title": p["title"], "body": p["body"], "tags": tags})
+
+    snapshot = {
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "source": source.relative_to(PROJECT_DIR).as_posix(),
+        "labels": "classify()" if relabel else "pipeline categories",
+        "rules": categorize_prompts.RULES.source_hash,
+        "prompts": records,
+    }
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with gzip.open(path, "wt", encoding="utf-8", compresslevel=9) as f:
+        json.dump(snapshot, f, ensure_ascii=False, separators=(",", ":"))
+    print(f"Froze {len(records)} prompts from {snapshot['source']} "
+          f"({snapshot['labels']}) -> {path} ({path.stat().st_size / 1024:.0f} KB)")
+
+
+def load_snapshot(path: Path) -> dict:
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        return json.load(f)
+
+# ---------------------------------------------------------------------------
+# Engines
+# ---------------------------------------------------------------------------
+
+def per_prompt(fn: Callable[[str, str], list[str]]) -> Callable:
+    """Engine that classifies one prompt at a time, timing each call."""
+    def run(prompts: list[dict]) -> tuple[list[list[str]], list[float]]:
+        tags, latencies = [], []
+        for p in prompts:
+            start = time.perf_counter()
+            tags.append(fn(p["title"], p["body"]))
+            latencies.append(time.perf_counter() - start)
+        return tags, latencies
+    return run
+
+
+def whole_corpus(fn: Callable[[list[dict]], list[list[str]]]) -> Callable:
+    """Engine that classifies the whole list at once (latency is amortized)."""
+    def run(prompts: list[dict]) -> tuple[list[list[str]], list[float]]:
+        start = time.perf_counter()
+        tags = fn(prompts)
+        elapsed = time.perf_counter() - start
+        return tags, [elapsed / max(len(prompts), 1)] * len(prompts)
+    return run
+
+
+def engines(workers: int) -> dict[str, Callable]:
+    found = {
+        "reference": per_prompt(classify_reference),
+        "compiled": per_prompt(classify),
+    }
+    if workers > 1:
+        found["batch"] = whole_corpus(
+            lambda prompts: list(classify_batch(prompts, workers, chunksize=64))
+        )
+    try:
+        import category_engine
+    except ImportError:
+        print("numpy not installed - skipping the vectorized engine")
+    else:
+        found["vectorized"] = whole_corpus(category_engine.classify_corpus)
+    return found
+
+# ---------------------------------------------------------------------------
+# Measurement
+# ---------------------------------------------------------------------------
+
+def percentile(values: list[float], q: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q / 100 * len(ordered)))]
+
+
+def bench_engine(run: Callable, prompts: list[dict], runs: int) -> dict:
+    rates, latencies = [], []
+    tags: list[list[str]] = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        tags, lat = run(prompts)
+        rates.append(len(prompts) / (time.perf_counter() - start))
+        latencies.extend(lat)
+
+    # Separate pass: tracing allocations slows the code it measures
+    tracemalloc.start()
+    run(prompts)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    reference = [p["tags"] for p in prompts]
+    exact = sum(a == b for a, b in zip(tags, reference))
+    primary = sum(a[:1] == b[:1] for a, b in zip(tags, reference))
+    return {
+        "prompts_per_sec": statistics.median(rates),
+        "p50_ms": percentile(latencies, 50) * 1000,
+        "p99_ms": percentile(latencies, 99) * 1000,
+        "peak_mem_mb": peak / 1e6,
+        "agreement": exact / len(prompts),
+        "primary_agreement": primary / len(prompts),
+        "disagreements": [p["id"] for p, a in zip(prompts, tags) if a != p["tags"]],
+    }
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description="Benchmark classify() on a frozen labelled snapshot.")
+    parser.add_argument("--snapshot", type=Path, default=SNAPSHOT_FILE)
+    parser.add_argument("--runs", type=int, default=3, help="timed passes per engine (median reported)")
+    parser.add_argument("--workers", type=int, default=1, help="also bench classify_batch on N processes")
+    parser.add_argument("--min-agreement", type=float, default=MIN_AGREEMENT)
+    parser.add_argument("--min-rate", type=float, default=MIN_RATE, help="compiled engine prompts/sec")
+    parser.add_argument("--json-out", type=Path, default=None, help="write results as JSON")
+    parser.add_argument("--freeze", action="store_true", help="(re)create the snapshot and exit")
+    parser.add_argument("--sample", type=int, default=300, help="prompts to freeze (0 = all)")
+    parser.add_argument("--relabel", action="store_true", help="freeze with classify() output as reference")
+    args = parser.parse_args(argv)
+
+    if args.freeze:
+        freeze(args.snapshot, args.sample, args.relabel)
+        return
+
+    snapshot = load_snapshot(args.snapshot)
+    prompts = snapshot["prompts"]
+    chars = sum(len(p["title"]) + len(p["body"]) for p in prompts)
+    print(f"Snapshot: {len(prompts)} prompts ({chars / 1e6:.2f} M chars), "
+          f"frozen {snapshot['created_at']} from {snapshot['source']} ({snapshot['labels']})")
+    if snapshot["rules"] != categorize_prompts.RULES.source_hash:
+        print("  note: category rules changed since the snapshot was frozen")
+
+    results = {}
+    for name, run in engines(args.workers).items():
+        results[name] = bench_engine(run, prompts, args.runs)
+
+    print(f"\n  {'engine':<11s} {'prompts/s':>10s} {'p50 ms':>8s} {'p99 ms':>8s}"
+          f" {'mem MB':>7s} {'agree':>7s} {'primary':>8s}")
+    for name, r in results.items():
+        print(f"  {name:<11s} {r['prompts_per_sec']:>10.0f} {r['p50_ms']:>8.3f} {r['p99_ms']:>8.3f}"
+              f" {r['peak_mem_mb']:>7.1f} {r['agreement']:>7.1%} {r['primary_agreement']:>8.1%}")
+
+    failures = []
+    for name, r in results.items():
+        if r["agreement"] < args.min_agreement:
+            failures.append(
+                f"{name}: agreement {r['agreement']:.1%} < {args.min_agreement:.1%}"
+                f" (e.g. {', '.join(r['disagreements'][:10])})"
+            )
+    if results["compiled"]["prompts_per_sec"] < args.min_rate:
+        failures.append(
+            f"compiled: {results['compiled']['prompts_per_sec']:.0f} prompts/s < {args.min_rate:.0f}"
+        )
+
+    if args.json_out:
+        with open(args.json_out, "w", encoding="utf-8") as f:
+            json.dump({"snapshot": {k: v for k, v in snapshot.items() if k != "prompts"},
+                       "results": results, "failures": failures}, f, ensure_ascii=False, indent=2)
+
+    print()
+    for failure in failures:
+        print(f"FAIL {failure}")
+    if failures:
+        sys.exit(1)
+    print("OK")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,423 @@
+#!/usr/bin/env python3
+"""
+Crawl Benchmark
+===============
+Runs crawl_prompts.py end-to-end against a local replay server, so changes
+to the fetch or parse path can be measured without touching
+nanyo-city.jpn.org.
+
+Fixture pages come from the first source that has any:
+  1. --fixtures DIR     NNN.html files (e.g. a saved copy of the site)
+  2. --cache-dir DIR    the crawler's HTML cache (cache/html)
+  3. dify/knowledge_base/prompt_NNN.txt, rendered into the site's layout
+
+The server adds --latency (+ --jitter) to every response and injects
+faults: --missing-rate of the IDs answer 404, --malformed-rate are served
+truncated / unbalanced, --slow-rate of requests take --slow-ms longer and
+--error-rate of requests get a 503 (retried by the crawler). Faults are
+seeded, so runs with the same options see the same site.
+
+Reported per run: pages/sec, p50/p99 fetch latency (from the crawler's
+--timings-out), parse time per page for the chosen extractor (alone, and
+inside the crawler from its metrics JSON), and the crawler's peak RSS.
+
+Usage:
+  python bench_crawl.py
+  python bench_crawl.py --pages 300 --latency 30 --jitter 20 --concurrency 8
+  python bench_crawl.py --error-rate 0.05 --slow-rate 0.02 --runs 3
+  python bench_crawl.py --extractor stream --json-out bench.json
+  python bench_crawl.py -- --no-keep-alive      # extra crawler arguments
+"""
+
+import argparse
+import gzip
+import html
+import json
+import random
+import re
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+try:
+    import resource  # Not available on Windows
+except ImportError:
+    resource = None
+
+# Fix Windows console encoding
+if sys.platform == "win32":
+    import io
+    sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding="utf-8", errors="replace")
+
+# ---------------------------------------------------------------------------
+# Configuration
+# ---------------------------------------------------------------------------
+SCRIPT_DIR = Path(__file__).resolve().parent
+PROJECT_DIR = SCRIPT_DIR.parent
+CRAWLER = SCRIPT_DIR / "crawl_prompts.py"
+CACHE_DIR = SCRIPT_DIR / "cache" / "html"
+KNOWLEDGE_BASE_DIR = PROJECT_DIR / "dify" / "knowledge_base"
+
+# ---------------------------------------------------------------------------
+# Fixtures
+# ---------------------------------------------------------------------------
+
+def render_page(title: str, body: str) -> str:
+    """Lay a prompt out like the site: .box-title plus one .box-bun per 【section】."""
+    sections = re.split(r"\n(?=【)", body.strip())
+    boxes = []
+    for section in sections:
+        heading, _, text = section.partition("\n")
+        m = re.fullmatch(r"【(.+)】", heading.strip())
+        if m:
+            h2, content = m.group(1), text
+        else:
+            h2, content = "プロンプト", section
+        lines = "<br>\n".join(html.escape(line) for line in content.strip().splitlines())
+        boxes.append(
+            f'<div class="box-bun"><h2>{html.escape(h2)}</h2>\n{lines}\n'
+            f'<button class="copy">コピー</button></div>'
+        )
+    return (
+        '<!DOCTYPE html>\n<html lang="ja"><head><meta charset="UTF-8">'
+        f"<title>{html.escape(title)} | プロンプト</title></head>\n<body>"
+        f'<div class="box-title">{html.escape(title)}</div>\n'
+        f'<div class="form-content">{"".join(boxes)}</div>'
+        "<script>function copy(){}</script></body></html>\n"
+    )
+
+
+def load_knowledge_base(directory: Path) -> dict[int, str]:
+    pages = {}
+    for path in sorted(directory.glob("prompt_*.txt")):
+        text = path.read_text(encoding="utf-8")
+        header, sep, body = text.partition("\n---\n")
+        if not sep:
+            continue
+        fields = dict(
+            line.split(": ", 1) for line in header.splitlines() if ": " in line
+        )
+        if fields.get("ID", "").isdigit():
+            pages[int(fields["ID"])] = render_page(fields.get("タイトル", ""), body)
+    return pages
+
+
+def load_fixtures(fixtures: Path | None, cache_dir: Path) -> tuple[dict[int, str], str]:
+    """Pages to serve, keyed by ID, and a description of where they came from."""
+    if fixtures is not None:
+        pages = {
+            int(p.stem): p.read_text(encoding="utf-8")
+            for p in fixtures.glob("*.html") if p.stem.isdigit()
+        }
+        return pages, str(fixtures)
+
+    if (cache_dir / "index.tsv").exists():
+        sys.path.insert(0, str(SCRIPT_DIR))
+        from html_cache import HtmlCache
+
+        pages = {int(pid): text for pid, text in HtmlCache(cache_dir).items() if pid.isdigit()}
+        if pages:
+            return pages, str(cache_dir)
+
+    return load_knowledge_base(KNOWLEDGE_BASE_DIR), f"{KNOWLEDGE_BASE_DIR} (rendered)"
+
+
+def malform(page: str, rng: random.Random) -> str:
+    """Damage a page the ways real HTML breaks: truncation, lost end tags, junk."""
+    choice = rng.randrange(3)
+    if choice == 0:
+        return page[: rng.randrange(len(page) // 3, len(page))]
+    if choice == 1:
+        return re.sub(r"</(div|h2)>", lambda m: "" if rng.random() < 0.5 else m.group(0), page)
+    pos = rng.randrange(len(page))
+    return page[:pos] + "<div class=\"box-bun\"><h2>&#xD800;<<!-- " + page[pos:]
+
+# ---------------------------------------------------------------------------
+# Replay server
+# ---------------------------------------------------------------------------
+
+class ReplaySite:
+    """The pages to serve and the faults to inject, fixed up front by a seed."""
+
+    def __init__(self, pages: dict[int, str], args: argparse.Namespace) -> None:
+        rng = random.Random(args.seed)
+        ids = sorted(pages)[: args.pages]
+        self.ids = ids
+        self.missing = {i for i in ids if rng.random() < args.missing_rate}
+        self.malformed = {
+            i: malform(pages[i], rng)
+            for i in ids if i not in self.missing and rng.random() < args.malformed_rate
+        }
+        self.pages = {
+            i: self.malformed.get(i, pages[i]).encode("utf-8")
+            for i in ids if i not in self.missing
+        }
+        self.args = args
+        self._rng = random.Random(args.seed + 1)
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.injected_errors = 0
+
+    def delay_and_fault(self) -> tuple[float, bool]:
+        """Latency in seconds for one request, and whether it gets a 503."""
+        a = self.args
+        with self._lock:
+            self.requests += 1
+            delay = a.latency + self._rng.uniform(0, a.jitter)
+            if self._rng.random() < a.slow_rate:
+                delay += a.slow_ms
+            error = self._rng.random() < a.error_rate
+            if error:
+                self.injected_errors += 1
+        return delay / 1000, error
+
+
+class ReplayHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+    site: ReplaySite
+
+    def log_message(self, format, *args) -> None:
+        pass
+
+    def _send(self, status: int, body: bytes, gzip_ok: bool = False) -> None:
+        self.send_response(status)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        if gzip_ok:
+            body = gzip.compress(body, compresslevel=6, mtime=0)
+            self.send_header("Content-Encoding", "gzip")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self) -> None:
+        delay, error = self.site.delay_and_fault()
+        time.sleep(delay)
+        if error:
+            self._send(503, b"Service Unavailable")
+            return
+        m = re.fullmatch(r"/(\d+)\.html", self.path)
+        page = self.site.pages.get(int(m.group(1))) if m else None
+        if page is None:
+            self._send(404, b"Not Found")
+            return
+        self._send(200, page, "gzip" in self.headers.get("Accept-Encoding", ""))
+
+
+def start_server(site: ReplaySite) -> ThreadingHTTPServer:
+    handler = type("Handler", (ReplayHandler,), {"site": site})
+    server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+# ---------------------------------------------------------------------------
+# Measurements
+# ---------------------------------------------------------------------------
+
+def percentile(values: list[float], q: float) -> float | None:
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * q))]
+
+
+def parse_time_per_page(pages: list[str], extractor: str) -> float:
+    """Mean ms per page for the crawler's extractor, measured in-process."""
+    sys.path.insert(0, str(SCRIPT_DIR))
+    import logging
+    from crawl_prompts import EXTRACTORS
+
+    parse = EXTRACTORS[extractor]
+    logging.disable(logging.WARNING)  # malformed pages warn on every parse
+    try:
+        started = time.perf_counter()
+        for i, page in enumerate(pages):
+            parse(page, f"{i:03d}")
+        elapsed = time.perf_counter() - started
+    finally:
+        logging.disable(logging.NOTSET)
+    return elapsed * 1000 / max(len(pages), 1)
+
+
+def peak_rss_mb() -> float | None:
+    """Largest RSS of any finished child process (the crawler or a parse worker)."""
+    if resource is None:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    return rss / (1024 * 1024) if sys.platform == "darwin" else rss / 1024
+
+
+def run_crawl(base_url: str, work: Path, args: argparse.Namespace, last_id: int) -> dict:
+    timings_file = work / "timings.jsonl"
+    metrics_file = work / "crawl_metrics.json"
+    output = work / "prompts.json"
+    cmd = [
+        sys.executable, str(CRAWLER),
+        "--base-url", base_url,
+        "--start", "1", "--end", str(last_id),
+        "--output", str(output),
+        "--state-db", str(work / "crawl_state.db"),
+        "--cache-dir", str(work / "cache"),
+        "--log-file", str(work / "crawler.log"),
+        "--timings-out", str(timings_file),
+        "--metrics-json", str(metrics_file),
+        "--metrics-prom", str(work / "crawl_metrics.prom"),
+        "--concurrency", str(args.concurrency),
+        "--rate", str(args.rate),
+        "--extractor", args.extractor,
+        "--no-changeset",
+    ]
+    if args.parse_workers is not None:
+        cmd += ["--parse-workers", str(args.parse_workers)]
+    cmd += args.crawler_args
+
+    started = time.perf_counter()
+    proc = subprocess.run(cmd, capture_output=True, text=True, encoding="utf-8")
+    wall = time.perf_counter() - started
+    if proc.returncode != 0:
+        sys.stderr.write(proc.stdout[-2000:] + proc.stderr[-2000:])
+        raise SystemExit(f"crawler exited with {proc.returncode}")
+
+    entries = []
+    if timings_file.exists():
+        with open(timings_file, "r", encoding="utf-8") as f:
+            entries = [json.loads(line) for line in f if line.strip()]
+    ok = [e for e in entries if e["status"] == 200]
+    latencies = [e["total_ms"] for e in entries]
+    records = json.loads(output.read_text(encoding="utf-8")) if output.exists() else []
+    metrics = json.loads(metrics_file.read_text(encoding="utf-8")) if metrics_file.exists() else {}
+    parse = metrics.get("timings_ms", {}).get("parse", {})
+
+    return {
+        "wall_s": wall,
+        "requests": len(entries),
+        "pages_ok": len(ok),
+        "records": len(records),
+        "pages_per_s": len(ok) / wall if wall else 0.0,
+        "requests_per_s": len(entries) / wall if wall else 0.0,
+        "p50_ms": percentile(latencies, 0.50),
+        "p99_ms": percentile(latencies, 0.99),
+        "crawler_parse_ms": parse.get("mean"),
+        "status_counts": {
+            str(s): sum(1 for e in entries if e["status"] == s)
+            for s in sorted({e["status"] for e in entries}, key=str)
+        },
+    }
+
+# ---------------------------------------------------------------------------
+# Main
+# ---------------------------------------------------------------------------
+
+def parse_args(argv: list[str] | None = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description="Benchmark crawl_prompts.py against a local replay server.",
+        epilog="Arguments after -- are passed to crawl_prompts.py.",
+    )
+    parser.add_argument("--fixtures", type=Path, default=None, help="directory of NNN.html pages")
+    parser.add_argument("--cache-dir", type=Path, default=CACHE_DIR, help="crawler HTML cache to replay")
+    parser.add_argument("--pages", type=int, default=200, help="serve the first N fixture IDs")
+    parser.add_argument("--latency", type=float, default=20.0, help="base response latency, ms")
+    parser.add_argument("--jitter", type=float, default=10.0, help="extra uniform random latency, ms")
+    parser.add_argument("--slow-rate", type=float, default=0.02, help="fraction of slow responses")
+    parser.add_argument("--slow-ms", type=float, default=500.0, help="extra latency of a slow response")
+    parser.add_argument("--error-rate", type=float, default=0.02, help="fraction of 503 responses")
+    parser.add_argument("--missing-rate", type=float, default=0.05, help="fraction of IDs that 404")
+    parser.add_argument("--malformed-rate", type=float, default=0.05, help="fraction of broken pages")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--rate", type=float, default=1000.0, help="crawler --rate (req/s)")
+    parser.add_argument("--parse-workers", type=int, default=None, help="crawler --parse-workers")
+    parser.add_argument("--extractor", choices=["bs4", "stream"], default="bs4")
+    parser.add_argument("--runs", type=int, default=1, help="repeat the crawl N times")
+    parser.add_argument("--json-out", type=Path, default=None, help="write results as JSON")
+
+    argv = sys.argv[1:] if argv is None else argv
+    crawler_args = []
+    if "--" in argv:
+        split = argv.index("--")
+        argv, crawler_args = argv[:split], argv[split + 1:]
+    args = parser.parse_args(argv)
+    args.crawler_args = crawler_args
+    return args
+
+
+def fmt(value: float | None, spec: str = ".1f") -> str:
+    return "n/a" if value is None else format(value, spec)
+
+
+def main(argv: list[str] | None = None) -> None:
+    args = parse_args(argv)
+    pages, source = load_fixtures(args.fixtures, args.cache_dir)
+    if not pages:
+        raise SystemExit("No fixture pages found")
+
+    site = ReplaySite(pages, args)
+    server = start_server(site)
+    base_url = f"http://127.0.0.1:{server.server_address[1]}/"
+
+    print("=" * 60)
+    print("Crawl benchmark")
+    print(f"  Fixtures : {len(site.ids)} IDs from {source}")
+    print(f"  Faults   : {len(site.missing)} missing, {len(site.malformed)} malformed,"
+          f" {args.error_rate:.0%} 503, {args.slow_rate:.0%} slow (+{args.slow_ms:g} ms)")
+    print(f"  Latency  : {args.latency:g} ms + up to {args.jitter:g} ms")
+    print(f"  Crawler  : concurrency {args.concurrency}, extractor {args.extractor}"
+          + (f", extra {' '.join(args.crawler_args)}" if args.crawler_args else ""))
+    print("=" * 60)
+
+    served = [page.decode("utf-8") for page in site.pages.values()]
+    parse_ms = parse_time_per_page(served, args.extractor)
+
+    runs = []
+    try:
+        for n in range(1, args.runs + 1):
+            with tempfile.TemporaryDirectory(prefix="bench_crawl_") as tmp:
+                result = run_crawl(base_url, Path(tmp), args, max(site.ids))
+            runs.append(result)
+            print(
+                f"Run {n}: {result['pages_per_s']:.1f} pages/s"
+                f" ({result['pages_ok']} pages, {result['requests']} requests"
+                f" in {result['wall_s']:.2f} s), p50 {fmt(result['p50_ms'])} ms,"
+                f" p99 {fmt(result['p99_ms'])} ms, {result['records']} records,"
+                f" status {result['status_counts']}"
+            )
+    finally:
+        server.shutdown()
+
+    rss = peak_rss_mb()
+    summary = {
+        "fixtures": len(site.ids),
+        "pages_per_s": statistics.median(r["pages_per_s"] for r in runs),
+        "p50_ms": statistics.median(r["p50_ms"] or 0.0 for r in runs),
+        "p99_ms": statistics.median(r["p99_ms"] or 0.0 for r in runs),
+        "parse_ms_per_page": parse_ms,
+        "crawler_parse_ms_per_page": statistics.median(
+            r["crawler_parse_ms"] or 0.0 for r in runs
+        ),
+        "peak_rss_mb": rss,
+        "runs": runs,
+        "options": {k: v for k, v in vars(args).items() if not isinstance(v, Path)},
+    }
+
+    print("=" * 60)
+    print(f"  Pages/sec (median) : {summary['pages_per_s']:.1f}")
+    print(f"  Fetch p50 / p99    : {summary['p50_ms']:.1f} / {summary['p99_ms']:.1f} ms")
+    print(f"  Parse per page     : {parse_ms:.2f} ms alone, "
+          f"{summary['crawler_parse_ms_per_page']:.2f} ms in the crawler ({args.extractor})")
+    print(f"  Peak RSS (crawler) : {fmt(rss)} MB")
+    print("=" * 60)
+
+    if args.json_out:
+        with open(args.json_out, "w", encoding="utf-8") as f:
+            json.dump(summary, f, ensure_ascii=False, indent=2)
+        print(f"Results written to {args.json_out}")
+
+
+if __name__ == "__main__":
+    main()
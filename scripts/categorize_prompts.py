@@ -3,210 +3,109 @@
 Prompt Categorizer
 ==================
 Assigns category tags to each prompt based on title + body keyword analysis.
+The categories and their keywords are defined in data/category_rules.json.
 
-Categories:
-  #文章作成・要約
-  #文書校正・編集
-  #アイデア創出・企画
-  #業務改善
-  #情報収集・分析
-  #コミュニケーション支援
-  #プログラミング
-  #意識改革・スキルアップ
+With --changeset, only prompts the crawler added or modified (and any
+prompt still without categories) are classified; the rest keep theirs.
+Whenever categories change and a changeset exists, it is rewritten (with or
+without --changeset) so that the later --changeset stages also redo the
+prompts that were only reclassified.
+
+The rules are compiled into an Aho-Corasick automaton (cached on disk, see
+category_rules.py), so each prompt is scanned once regardless of how many
+keywords there are. classify_reference() keeps the original keyword-by-keyword scoring; run with
+--verify to check both agree on the current data.
+
+Results are cached in data/category_cache.json, keyed by each prompt's
+content hash; the cache is dropped whenever the rule file changes, so a
+rule edit reclassifies everything and routine runs reclassify only new or
+edited prompts. Whatever has to be classified is spread over
+--workers processes (default: CPU count) via classify_batch().
+
+--explain also writes every prompt's category scores and matched keywords
+to data/category_scores.npz (needs numpy; query it with explain_scores.py).
 """
 
+import argparse
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+from typing import Iterable, Iterator
 import json
 import io
+import os
 import sys
 import re
 from pathlib import Path
 
+import category_rules
+import changeset
+import prompt_store
+
 if sys.platform == "win32":
     sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding="utf-8", errors="replace")
     sys.stderr = io.TextIOWrapper(sys.stderr.buffer, encoding="utf-8", errors="replace")
 
 PROJECT_DIR = Path(__file__).resolve().parent.parent
-DATA_FILE = PROJECT_DIR / "data" / "prompts.json"
+DATA_FILE = prompt_store.DATA_FILE
+CACHE_FILE = PROJECT_DIR / "data" / "category_cache.json"
+CLASSIFY_WORKERS = os.cpu_count() or 1  # Classifier processes (1 = inline)
+BATCH_CHUNK = 256  # Prompts per task sent to a worker
 
 # ---------------------------------------------------------------------------
-# Category definitions: (tag, keywords, title_boost_keywords)
-#   - keywords: matched against title + body (case-insensitive)
-#   - title_boost: if matched in title, score gets extra weight
+# Category rules (data/category_rules.json, compiled by category_rules.py)
 # ---------------------------------------------------------------------------
 
-CATEGORIES: list[tuple[str, list[str], list[str]]] = [
-    (
-        "#文章作成・要約",
-        [
-            "文章を作", "文章作成", "文章案", "文書作成",
-            "要約", "要点", "まとめ",
-            "原稿", "草案", "ドラフト",
-            "レポート作成", "報告書作成", "報告書", "復命書",
-            "記事作成", "記事を作", "コンテンツ制作", "コンテンツを制作",
-            "メール作成", "メールの自動作成",
-            "議事録", "プレスリリース",
-            "スピーチ", "挨拶状", "お礼状", "依頼文", "招待状",
-            "答弁書", "計画書", "概要書", "提案書作成",
-            "テキスト作成", "文書の作成", "PR文", "紹介文",
-            "説明文作成", "説明テキスト",
-            "チラシ", "タイトル付け", "タイトルを",
-            "論述作成", "文章に", "文章を統合",
-            "表を作", "書き出し", "作文",
-            "翻訳", "多言語", "英訳", "和訳",
-            "送付状", "案内文", "通知文", "周知用文書",
-            "アンケート作成", "問題作成",
-        ],
-        [
-            "文章", "作成", "要約", "原稿", "レポート", "記事",
-            "メール", "議事録", "翻訳", "報告書",
-        ],
-    ),
-    (
-        "#文書校正・編集",
-        [
-            "校正", "添削", "リライト", "推敲",
-            "編集", "修正", "チェック",
-            "言い換え", "言い回し", "フレーズを",
-            "表現を変", "表現を豊か", "表現提案",
-            "フォーマットを抽出", "ブラッシュアップ",
-            "文章を解析", "文章の議論を分析",
-            "一貫性", "誤字", "脱字",
-            "変換", "書き換え", "再構築",
-            "人間味あふれる", "面白くする",
-            "深掘り", "具体例を追加",
-            "エピソード風", "共感文章",
-            "行動に移しやすい", "説得力を強化",
-        ],
-        [
-            "校正", "添削", "リライト", "言い換え", "編集",
-            "ブラッシュアップ", "変換",
-        ],
-    ),
-    (
-        "#アイデア創出・企画",
-        [
-            "アイデア", "企画", "発想", "ブレスト", "ブレインストーミング",
-            "キャッチコピー", "コピーの案",
-            "創出", "新サービス", "新規事業",
-            "イベント企画", "イベントの企画",
-            "提案してもらう", "案を出", "案出し",
-            "施策案", "事業提案", "ビジネスモデル",
-            "プロジェクト推進", "フレームワーク選択",
-            "グループワーク", "課題を設計",
-            "ビジョンを創出", "サービス創出",
-        ],
-        [
-            "アイデア", "企画", "キャッチコピー", "創出", "提案",
-        ],
-    ),
-    (
-        "#業務改善",
-        [
-            "業務改善", "業務効率", "効率化", "自動化",
-            "手順", "プロセス", "ワークフロー",
-            "課題解決", "問題解決", "課題洗い出し",
-            "トラブル", "是正", "原因を切り分け",
-            "改善", "最適化", "合理化",
-            "マニュアル", "手続き",
-            "論点", "洗い出し",
-            "リスク", "先読み", "影響予測",
-            "何から始めれば", "相談",
-            "作業手順", "手法の提案",
-            "チェックリスト",
-            "問い合わせ内容の傾向",
-        ],
-        [
-            "業務改善", "効率化", "課題", "改善", "トラブル",
-        ],
-    ),
-    (
-        "#情報収集・分析",
-        [
-            "分析", "リサーチ", "調査", "研究",
-            "データ分析", "データを",
-            "比較", "評価", "予測", "影響",
-            "統計", "傾向", "市場",
-            "レポートを作成", "分析レポート",
-            "情報収集", "情報整理",
-            "プロファイル", "解析",
-            "SWOT", "PEST", "マトリクス",
-            "調べ", "まとめる",
-        ],
-        [
-            "分析", "リサーチ", "調査", "データ", "評価", "解析",
-        ],
-    ),
-    (
-        "#コミュニケーション支援",
-        [
-            "コミュニケーション", "対話",
-            "返信", "メールへの返信", "メールに返信",
-            "声掛け", "フィードバック",
-            "質問", "想定質問", "FAQ", "Q＆A", "Q&A",
-            "クレーム", "対応",
-            "説明", "わかりやすく説明",
-            "プレゼン", "プレゼンテーション",
-            "伝える", "伝わる",
-            "注意・指導", "アドバイス",
-            "褒め言葉", "感謝", "お礼",
-            "フォローアップ", "相談者",
-            "読者", "市民の声",
-            "立場に応じた", "文化的配慮",
-        ],
-        [
-            "コミュニケーション", "返信", "クレーム", "プレゼン",
-            "質問", "説明", "対応",
-        ],
-    ),
-    (
-        "#プログラミング",
-        [
-            "プログラミング", "プログラム",
-            "コード", "コーディング",
-            "Excel", "エクセル", "数式", "関数",
-            "VBA", "マクロ",
-            "Python", "JavaScript", "TypeScript",
-            "HTML", "CSS", "SQL",
-            "API", "スクリプト",
-            "データベース", "DB",
-            "システム", "アプリ開発", "アプリケーション開発",
-            "GAS", "スプレッドシート",
-            "正規表現", "テスト",
-        ],
-        [
-            "Excel", "プログラミング", "コード", "VBA", "Python",
-            "数式", "関数", "マクロ", "GAS",
-        ],
-    ),
-    (
-        "#意識改革・スキルアップ",
-        [
-            "スキルアップ", "スキル向上",
-            "自己分析", "自己評価", "自己肯定",
-            "キャリア", "キャリアビジョン",
-            "マインド", "マインドチェンジ", "意識改革",
-            "アファメーション", "自分を好き",
-            "ストレスマネジメント", "アンガーマネジメント",
-            "研修", "セミナー", "講座",
-            "学習", "勉強", "リスキリング",
-            "ビジョン", "目標設定", "目標達成",
-            "コーチング", "メンタリング",
-            "挫折", "立ち直る", "成長",
-            "思考", "TEFCAS", "振り返り",
-            "行動計画", "モチベーション",
-            "欠点から長所", "自分の思っていること",
-            "人を魅了する",
-        ],
-        [
-            "スキルアップ", "自己", "キャリア", "マインド",
-            "研修", "コーチング", "ビジョン", "目標",
-        ],
-    ),
-]
+RULES = category_rules.load()
+CATEGORIES = RULES.categories
+MATCHER = RULES.matcher
+KEYWORD_WEIGHTS = RULES.weights
+
+
+def _pick(scores: dict[str, float]) -> list[str]:
+    """Top-scoring category plus any scoring >= 60% of it."""
+    if not scores:
+        # Fallback: assign most generic category
+        return [RULES.fallback]
+
+    # Sort by score descending
+    sorted_tags = sorted(scores.items(), key=lambda x: -x[1])
+    top_score = sorted_tags[0][1]
+
+    # Primary category (highest score)
+    result = [sorted_tags[0][0]]
+
+    # Add secondary categories if they score >= 60% of top
+    for tag, score in sorted_tags[1:]:
+        if score >= top_score * 0.6:
+            result.append(tag)
+        else:
+            break
+
+    return result
 
 
 def classify(title: str, body: str) -> list[str]:
     """Classify a prompt into one or more categories."""
+    # One pass: hits within the title, then hits anywhere in title + body
+    # (the same text classify_reference() searches)
+    in_title, in_text = MATCHER.find(title.lower(), f"\n{body}".lower())
+
+    totals = [0.0] * len(CATEGORIES)
+    for hit in in_text:
+        title_hit = hit in in_title
+        for cat, title_score, body_score in KEYWORD_WEIGHTS[hit]:
+            totals[cat] += title_score if title_hit else body_score
+
+    return _pick({
+        tag: score
+        for (tag, _kw, _boost), score in zip(CATEGORIES, totals)
+        if score > 0
+    })
+
+
+def classify_reference(title: str, body: str) -> list[str]:
+    """Keyword-by-keyword scoring that classify() must reproduce."""
     text_full = f"{title}\n{body}".lower()
     title_lower = title.lower()
 
@@ -230,48 +129,216 @@ def classify(title: str, body: str) -> list[str]:
         if score > 0:
             scores[tag] = score
 
-    if not scores:
-        # Fallback: assign most generic category
-        return ["#文章作成・要約"]
+    return _pick(scores)
 
-    # Sort by score descending
-    sorted_tags = sorted(scores.items(), key=lambda x: -x[1])
-    top_score = sorted_tags[0][1]
 
-    # Primary category (highest score)
-    result = [sorted_tags[0][0]]
+# ---------------------------------------------------------------------------
+# Batch classification
+# ---------------------------------------------------------------------------
 
-    # Add secondary categories if they score >= 60% of top
-    for tag, score in sorted_tags[1:]:
-        if score >= top_score * 0.6:
-            result.append(tag)
-        else:
-            break
+def _classify_chunk(items: list[tuple[str, str]]) -> list[list[str]]:
+    """Worker task: classify a chunk of (title, body) pairs."""
+    return [classify(title, body) for title, body in items]
 
-    return result
+
+def classify_batch(
+    prompts: Iterable[dict],
+    workers: int = 1,
+    chunksize: int = BATCH_CHUNK,
+) -> Iterator[list[str]]:
+    """
+    Classify prompts, yielding their categories in input order.
+
+    With workers > 1 the input is cut into chunks of `chunksize` (title,
+    body) pairs - only the text is pickled, not the whole record - and
+    classified on a process pool. At most two chunks per worker are in
+    flight, so a long input is streamed rather than loaded up front.
+    """
+    items = ((p["title"], p["body"]) for p in prompts)
+    if workers <= 1:
+        for title, body in items:
+            yield classify(title, body)
+        return
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        pending: deque = deque()
+        while chunk := list(islice(items, chunksize)):
+            pending.append(executor.submit(_classify_chunk, chunk))
+            if len(pending) >= 2 * workers:
+                yield from pending.popleft().result()
+        while pending:
+            yield from pending.popleft().result()
+
+
+def verify_classifier(prompts: list[dict]) -> int:
+    """Compare classify() with classify_reference() on every prompt."""
+    mismatches = 0
+    for p in prompts:
+        fast = classify(p["title"], p["body"])
+        slow = classify_reference(p["title"], p["body"])
+        if fast != slow:
+            mismatches += 1
+            print(f"  MISMATCH {p['id']}: {fast} != {slow}")
+    print(f"Verified {len(prompts)} prompts: {mismatches} mismatches")
+    return mismatches
+
+
+# ---------------------------------------------------------------------------
+# Classification cache
+# ---------------------------------------------------------------------------
+
+class ClassificationCache:
+    """Categories per content hash, valid for one version of the rules."""
+
+    def __init__(self, path: Path, rules: str):
+        self.path = path
+        self.rules = rules
+        self.entries: dict[str, list[str]] = {}
+        self.used: set[str] = set()
+        self.rules_changed = False
+        self.hits = 0
+        self.misses = 0
+        if path.exists():
+            with open(path, "r", encoding="utf-8") as f:
+                saved = json.load(f)
+            if saved.get("rules") == rules:
+                self.entries = saved["entries"]
+            else:
+                self.rules_changed = True
+
+    def classify_all(self, prompts: list[dict], workers: int = 1) -> list[list[str]]:
+        """Categories for each prompt, classifying only the cache misses."""
+        keys = [changeset.content_hash(p["title"], p["body"]) for p in prompts]
+        self.used.update(keys)
+        missing = {}
+        for key, p in zip(keys, prompts):
+            if key not in self.entries:
+                missing.setdefault(key, p)
+        self.misses += len(missing)
+        self.hits += len(prompts) - len(missing)
+        for key, cats in zip(missing, classify_batch(missing.values(), workers)):
+            self.entries[key] = cats
+        return [list(self.entries[key]) for key in keys]
+
+    def save(self, prune: bool) -> None:
+        """Write atomically; with `prune`, keep only entries used this run."""
+        if not self.misses and not self.rules_changed and self.path.exists():
+            if not prune or self.used.issuperset(self.entries):
+                return
+        entries = self.entries
+        if prune:
+            entries = {k: v for k, v in entries.items() if k in self.used}
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_name(f"{self.path.name}.tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"rules": self.rules, "entries": entries}, f,
+                      ensure_ascii=False, separators=(",", ":"))
+        os.replace(tmp, self.path)
+
+
+def write_explain(path: Path, prompts: list[dict]) -> None:
+    """Score the whole corpus once with the vectorized engine and save it."""
+    try:
+        import category_engine
+    except ImportError:
+        print("--explain needs numpy (pip install numpy) - skipped")
+        return
+    hits = category_engine.scan(prompts)
+    category_engine.save_explain(path, prompts, hits, category_engine.score(hits))
+    print(f"Explain data: {path}")
 
 
 def main() -> None:
-    with open(DATA_FILE, "r", encoding="utf-8") as f:
-        prompts = json.load(f)
+    parser = argparse.ArgumentParser(description="Assign category tags to prompts.json.")
+    parser.add_argument(
+        "--changeset", nargs="?", type=Path, const=changeset.CHANGESET_FILE, default=None,
+        help="only classify prompts changed since the last completed run",
+    )
+    parser.add_argument(
+        "--cache", type=Path, default=CACHE_FILE,
+        help=f"classification cache (default: {CACHE_FILE.relative_to(PROJECT_DIR)})",
+    )
+    parser.add_argument(
+        "--no-cache", dest="cache", action="store_const", const=None,
+        help="classify every prompt from scratch",
+    )
+    parser.add_argument(
+        "--workers", type=int, default=CLASSIFY_WORKERS,
+        help="classifier processes; 1 classifies inline (default: CPU count)",
+    )
+    parser.add_argument(
+        "--explain", nargs="?", type=Path, const=PROJECT_DIR / "data" / "category_scores.npz",
+        default=None, help="write per-prompt scores and keyword hits for explain_scores.py",
+    )
+    parser.add_argument(
+        "--verify", action="store_true",
+        help="check the compiled matcher against the reference scorer and exit",
+    )
+    args = parser.parse_args()
+
+    store = prompt_store.open_store(DATA_FILE)
+    prompts = store.load()
 
     print(f"Loaded {len(prompts)} prompts")
 
+    if args.verify:
+        sys.exit(1 if verify_classifier(prompts) else 0)
+
+    cache = ClassificationCache(args.cache, RULES.source_hash) if args.cache else None
+    if cache and cache.rules_changed:
+        print("Category rules changed - cache discarded, reclassifying everything")
+
+    # The manifest is kept current even without --changeset: categories are
+    # part of each record's hash, so reclassified prompts count as modified
+    manifest_path = args.changeset if args.changeset is not None else changeset.CHANGESET_FILE
+    manifest = changeset.load(manifest_path)
+    todo = None
+    if args.changeset is not None and not (cache and cache.rules_changed):
+        if manifest is None:
+            print(f"No changeset at {args.changeset} - classifying everything")
+        else:
+            todo = changeset.changed_ids(manifest)
+            print(f"Changeset: {changeset.summary(manifest)}")
+
+    targets = [
+        p for p in prompts
+        if todo is None or p.id in todo or p.categories is None
+    ]
+    # A pool only pays off once there is more than one chunk of work
+    workers = args.workers if len(targets) > BATCH_CHUNK else 1
+    if cache:
+        results = cache.classify_all(targets, workers)
+    else:
+        results = classify_batch(targets, workers)
+
+    classified = len(targets)
+    changed = 0
+    for p, cats in zip(targets, results):
+        if cats != p.categories:
+            p.categories = cats
+            changed += 1
+
     # Category distribution counter
     dist: dict[str, int] = {}
-
     for p in prompts:
-        tags = classify(p["title"], p["body"])
-        p["categories"] = tags
-
-        for t in tags:
+        for t in p.categories:
             dist[t] = dist.get(t, 0) + 1
 
-    # Save
-    with open(DATA_FILE, "w", encoding="utf-8") as f:
-        json.dump(prompts, f, ensure_ascii=False, indent=2)
+    # Save (nothing to write if no prompt's categories changed)
+    if changed:
+        store.save(prompts)
+        if manifest is not None:
+            manifest = changeset.write(manifest_path, manifest["base"], prompts)
+            print(f"Changeset updated: {changeset.summary(manifest)}")
+    if cache:
+        cache.save(prune=todo is None)
 
-    print(f"\nDone! Updated {len(prompts)} prompts.\n")
+    print(f"\nDone! Classified {classified} of {len(prompts)} prompts, {changed} changed.")
+    if cache:
+        print(f"Cache: {cache.hits} hits, {cache.misses} misses")
+    if args.explain:
+        write_explain(args.explain, prompts)
+    print()
     print("Category distribution:")
     for tag, count in sorted(dist.items(), key=lambda x: -x[1]):
         bar = "█" * (count // 5)
@@ -280,9 +347,9 @@ def main() -> None:
     # Show some examples
     print("\n--- Examples ---")
     for p in prompts[:10]:
-        cats = ", ".join(p["categories"])
-        title = p["title"][:50]
-        print(f"  {p['id']}: {title:<50s} -> {cats}")
+        cats = ", ".join(p.categories)
+        title = p.title[:50]
+        print(f"  {p.id}: {title:<50s} -> {cats}")
 
 
 if __name__ == "__main__":
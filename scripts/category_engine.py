@@ -0,0 +1,233 @@
+#!/usr/bin/env python3
+"""
+Vectorized Category Engine
+==========================
+classify() is a linear model: each keyword hit adds a fixed score to its
+categories (3.0 in the title, 1.0 only in the body, +2.0 for a title-boost
+keyword in the title). This engine scans the corpus once into a sparse
+prompt x keyword hit matrix, then scores every prompt with one product
+against a keyword x category weight matrix and picks the top category plus
+those within 60% of it, all in NumPy. With default weights it returns the
+same tags as classify().
+
+Rescanning is only needed when keywords change; re-weighting the existing
+hits (what-if tuning of the scores or the threshold) takes milliseconds.
+
+save_explain() stores one such pass as data/category_scores.npz - per
+prompt category scores plus the matched keywords - for explain_scores.py
+to query (`categorize_prompts.py --explain` writes it alongside a run).
+
+Requires numpy (categorize_prompts.py itself does not).
+
+Usage:
+  python category_engine.py                         # check against classify()
+  python category_engine.py --title 4 --ratio 0.5   # what-if: tags that change
+  python category_engine.py --explain               # also write the .npz
+"""
+
+import argparse
+import io
+import json
+import sys
+import time
+from dataclasses import asdict, dataclass
+from pathlib import Path
+
+import numpy as np
+
+import category_rules
+import prompt_store
+from categorize_prompts import CATEGORIES, DATA_FILE, MATCHER, PROJECT_DIR, RULES, classify
+
+if sys.platform == "win32":
+    sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding="utf-8", errors="replace")
+
+EXPLAIN_FILE = PROJECT_DIR / "data" / "category_scores.npz"
+
+
+@dataclass
+class Weights:
+    """Score per hit kind, and the secondary-category threshold."""
+    title: float = category_rules.TITLE_SCORE  # keyword in title
+    body: float = category_rules.BODY_SCORE    # keyword only in the body
+    boost: float = category_rules.BOOST_SCORE  # title-boost keyword in title
+    ratio: float = 0.6  # secondary categories need >= ratio * top score
+
+
+@dataclass
+class HitMatrix:
+    """CSR prompt x keyword hits; `in_title` flags hits within the title."""
+    indptr: np.ndarray   # (n_prompts + 1,)
+    indices: np.ndarray  # (nnz,) keyword index into MATCHER.keywords
+    in_title: np.ndarray  # (nnz,) bool
+
+    @property
+    def n_prompts(self) -> int:
+        return len(self.indptr) - 1
+
+
+def keyword_counts() -> tuple[np.ndarray, np.ndarray]:
+    """(keywords, boosts): keyword x category occurrence counts in CATEGORIES."""
+    index = {kw: i for i, kw in enumerate(MATCHER.keywords)}
+    keywords = np.zeros((len(index), len(CATEGORIES)))
+    boosts = np.zeros_like(keywords)
+    for cat, (_tag, kws, title_boost) in enumerate(CATEGORIES):
+        for kw in kws:
+            keywords[index[kw.lower()], cat] += 1
+        for bkw in title_boost:
+            boosts[index[bkw.lower()], cat] += 1
+    return keywords, boosts
+
+
+def scan(prompts: list[dict]) -> HitMatrix:
+    """One automaton pass per prompt into a sparse hit matrix."""
+    indptr = [0]
+    indices: list[int] = []
+    in_title: list[bool] = []
+    for p in prompts:
+        title_hits, text_hits = MATCHER.find(p["title"].lower(), f"\n{p['body']}".lower())
+        for hit in sorted(text_hits):
+            indices.append(hit)
+            in_title.append(hit in title_hits)
+        indptr.append(len(indices))
+    return HitMatrix(
+        np.array(indptr, dtype=np.int64),
+        np.array(indices, dtype=np.int64),
+        np.array(in_title, dtype=bool),
+    )
+
+
+def score(hits: HitMatrix, weights: Weights = Weights()) -> np.ndarray:
+    """(n_prompts, n_categories) scores: hit matrix x weight matrix."""
+    keywords, boosts = keyword_counts()
+    n_kw = len(keywords)
+    # Rows 0..K-1 weigh a body-only hit, rows K..2K-1 a title hit
+    w = np.vstack([
+        weights.body * keywords,
+        weights.title * keywords + weights.boost * boosts,
+    ])
+    contrib = w[hits.indices + n_kw * hits.in_title]
+
+    scores = np.zeros((hits.n_prompts, len(CATEGORIES)))
+    nonempty = np.diff(hits.indptr) > 0
+    if contrib.size:
+        sums = np.add.reduceat(contrib, hits.indptr[:-1][nonempty], axis=0)
+        scores[nonempty] = sums
+    return scores
+
+
+def select(scores: np.ndarray, ratio: float = 0.6) -> list[list[str]]:
+    """Tags per prompt: best category, then those >= ratio * best, by score."""
+    tags = RULES.tags
+    # Stable descending order keeps CATEGORIES order among equal scores,
+    # as sorted() does in classify()
+    order = np.argsort(-scores, axis=1, kind="stable")
+    ranked = np.take_along_axis(scores, order, axis=1)
+    top = ranked[:, :1]
+    keep = (ranked > 0) & (ranked >= top * ratio)
+
+    result = []
+    for row_order, row_keep in zip(order, keep):
+        picked = [tags[c] for c in row_order[row_keep]]
+        result.append(picked or [RULES.fallback])
+    return result
+
+
+def classify_corpus(prompts: list[dict], weights: Weights = Weights()) -> list[list[str]]:
+    return select(score(scan(prompts), weights), weights.ratio)
+
+
+def save_explain(
+    path: Path,
+    prompts: list[dict],
+    hits: HitMatrix,
+    scores: np.ndarray,
+    weights: Weights = Weights(),
+) -> None:
+    """
+    Write one scoring pass as a columnar .npz (no pickled objects):
+
+      ids, titles        (n,)      prompt ID / title
+      scores             (n, C)    score per category
+      indptr             (n + 1,)  CSR rows into keyword / in_title
+      keyword, in_title  (nnz,)    matched keyword index, hit within the title
+      keywords           (K,)      matcher keywords (lower-cased)
+      keyword_weights    (2K, C)   score per body-only hit, then per title hit
+      categories         (C,)      tags, in rule order
+      meta               ()        JSON: rules hash, weights
+    """
+    keywords, boosts = keyword_counts()
+    path.parent.mkdir(parents=True, exist_ok=True)
+    np.savez_compressed(
+        path,
+        ids=np.array([p["id"] for p in prompts]),
+        titles=np.array([p["title"] for p in prompts]),
+        scores=scores.astype(np.float32),
+        indptr=hits.indptr.astype(np.int32),
+        keyword=hits.indices.astype(np.int32),
+        in_title=hits.in_title,
+        keywords=np.array(MATCHER.keywords),
+        keyword_weights=np.vstack([
+            weights.body * keywords,
+            weights.title * keywords + weights.boost * boosts,
+        ]).astype(np.float32),
+        categories=np.array(RULES.tags),
+        meta=np.array(json.dumps({"rules": RULES.source_hash, "weights": asdict(weights)})),
+    )
+
+
+def main() -> None:
+    defaults = Weights()
+    parser = argparse.ArgumentParser(description="Vectorized scoring / what-if tuning over the corpus.")
+    parser.add_argument("--title", type=float, default=defaults.title, help="score for a keyword in the title")
+    parser.add_argument("--body", type=float, default=defaults.body, help="score for a keyword only in the body")
+    parser.add_argument("--boost", type=float, default=defaults.boost, help="score for a title-boost keyword")
+    parser.add_argument("--ratio", type=float, default=defaults.ratio, help="secondary category threshold")
+    parser.add_argument(
+        "--explain", nargs="?", type=Path, const=EXPLAIN_FILE, default=None,
+        help=f"write scores and keyword hits (default: {EXPLAIN_FILE.relative_to(PROJECT_DIR)})",
+    )
+    args = parser.parse_args()
+    weights = Weights(args.title, args.body, args.boost, args.ratio)
+
+    prompts = prompt_store.open_store(DATA_FILE).load()
+
+    t0 = time.perf_counter()
+    hits = scan(prompts)
+    t1 = time.perf_counter()
+    tags = select(score(hits, weights), weights.ratio)
+    t2 = time.perf_counter()
+    print(f"{len(prompts)} prompts, {len(hits.indices)} keyword hits")
+    print(f"  scan  : {(t1 - t0) * 1000:.0f} ms")
+    print(f"  score : {(t2 - t1) * 1000:.1f} ms  ({weights})")
+    if args.explain:
+        save_explain(args.explain, prompts, hits, score(hits, weights), weights)
+        print(f"  explain: {args.explain}")
+
+    if weights == defaults:
+        reference = [classify(p["title"], p["body"]) for p in prompts]
+        mismatches = [p["id"] for p, a, b in zip(prompts, tags, reference) if a != b]
+        print(f"Matches classify(): {len(prompts) - len(mismatches)}/{len(prompts)}")
+        if mismatches:
+            print(f"  MISMATCH: {', '.join(mismatches[:20])}")
+            sys.exit(1)
+        return
+
+    current = [p.get("categories") or classify(p["title"], p["body"]) for p in prompts]
+    changed = [(p, old, new) for p, old, new in zip(prompts, current, tags) if old != new]
+    print(f"Tags would change for {len(changed)} of {len(prompts)} prompts")
+    before: dict[str, int] = {}
+    after: dict[str, int] = {}
+    for old, new in zip(current, tags):
+        for t in old:
+            before[t] = before.get(t, 0) + 1
+        for t in new:
+            after[t] = after.get(t, 0) + 1
+    for tag, _kw, _boost in CATEGORIES:
+        print(f"  {tag:<20s} {before.get(tag, 0):>5d} -> {after.get(tag, 0):>5d}")
+    for p, old, new in changed[:10]:
+        print(f"  {p['id']}: {', '.join(old)} -> {', '.join(new)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+"""
+Category Rules
+==============
+The category rule table lives in data/category_rules.json:
+
+  {"fallback": "#文章作成・要約",
+   "categories": [{"tag": "#...", "keywords": [...], "title_boost": [...]}, ...]}
+
+  - keywords: matched against title + body (case-insensitive)
+  - title_boost: if matched in title, score gets extra weight
+  - fallback: tag for prompts that match nothing
+
+load() compiles it into what classify() runs on: every keyword lower-cased
+once and deduplicated into a single Aho-Corasick matcher, plus the scores
+each keyword contributes per category. The compiled form is pickled to
+scripts/cache/ (local and git-ignored - a pickle is never loaded from the
+repository), keyed by the rule file's hash, so a process start only
+unpickles it; editing the JSON triggers a recompile on the next load.
+
+Usage:
+  python category_rules.py      # compile (if needed) and summarize the rules
+"""
+
+import hashlib
+import io
+import json
+import os
+import pickle
+import sys
+from dataclasses import dataclass
+from pathlib import Path
+
+from keyword_matcher import KeywordMatcher
+
+if sys.platform == "win32":
+    sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding="utf-8", errors="replace")
+
+PROJECT_DIR = Path(__file__).resolve().parent.parent
+RULES_FILE = PROJECT_DIR / "data" / "category_rules.json"
+COMPILED_FILE = PROJECT_DIR / "scripts" / "cache" / "category_rules.pickle"
+COMPILED_VERSION = 1  # Bump when the compiled layout changes
+
+TITLE_SCORE = 3.0  # Strong signal: keyword in title
+BODY_SCORE = 1.0   # Weaker signal: keyword only in body
+BOOST_SCORE = 2.0  # Title-boost keyword in title
+
+
+@dataclass
+class CompiledRules:
+    source_hash: str  # hash of the rule file (and COMPILED_VERSION)
+    fallback: str
+    categories: list[tuple[str, list[str], list[str]]]  # (tag, keywords, title_boost)
+    matcher: KeywordMatcher
+    # Per matcher keyword: (category index, score if in title, score if body only)
+    weights: list[list[tuple[int, float, float]]]
+
+    @property
+    def tags(self) -> list[str]:
+        return [tag for tag, _kw, _boost in self.categories]
+
+
+def parse_rules(raw: bytes) -> tuple[str, list[tuple[str, list[str], list[str]]]]:
+    """(fallback, categories) from the rule file; ValueError if malformed."""
+    data = json.loads(raw.decode("utf-8"))
+    categories = []
+    for entry in data["categories"]:
+        tag, keywords, boost = entry["tag"], entry["keywords"], entry.get("title_boost", [])
+        if not all(isinstance(kw, str) and kw for kw in [*keywords, *boost]):
+            raise ValueError(f"{tag}: keywords must be non-empty strings")
+        categories.append((tag, keywords, boost))
+    fallback = data["fallback"]
+    if fallback not in [tag for tag, _kw, _boost in categories]:
+        raise ValueError(f"fallback {fallback!r} is not a category")
+    return fallback, categories
+
+
+def compile_rules(
+    fallback: str,
+    categories: list[tuple[str, list[str], list[str]]],
+    source_hash: str = "",
+) -> CompiledRules:
+    """Build the matcher and, per keyword, the scores it contributes."""
+    patterns: dict[str, int] = {}
+    weights: list[list[tuple[int, float, float]]] = []
+
+    def slot(kw: str) -> list[tuple[int, float, float]]:
+        kw_lower = kw.lower()
+        if kw_lower not in patterns:
+            patterns[kw_lower] = len(weights)
+            weights.append([])
+        return weights[patterns[kw_lower]]
+
+    for cat, (_tag, keywords, title_boost) in enumerate(categories):
+        for kw in keywords:
+            slot(kw).append((cat, TITLE_SCORE, BODY_SCORE))
+        for bkw in title_boost:
+            slot(bkw).append((cat, BOOST_SCORE, 0.0))
+
+    return CompiledRules(
+        source_hash, fallback, categories, KeywordMatcher(list(patterns)), weights,
+    )
+
+
+def load(path: Path = RULES_FILE, compiled_path: Path = COMPILED_FILE) -> CompiledRules:
+    """The compiled rules, from the on-disk cache if it matches the rule file."""
+    raw = path.read_bytes()
+    source_hash = hashlib.sha256(raw + f"\0{COMPILED_VERSION}".encode()).hexdigest()[:16]
+
+    try:
+        with open(compiled_path, "rb") as f:
+            cached = pickle.load(f)
+        if cached.source_hash == source_hash:
+            return cached
+    except (OSError, pickle.UnpicklingError, EOFError, AttributeError, ImportError):
+        pass  # Missing or unreadable: recompile
+
+    rules = compile_rules(*parse_rules(raw), source_hash)
+    try:
+        compiled_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = compiled_path.with_name(f"{compiled_path.name}.{os.getpid()}.tmp")
+        with open(tmp, "wb") as f:
+            pickle.dump(rules, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, compiled_path)
+    except OSError:
+        pass  # Read-only checkout: just compile every time
+    return rules
+
+
+def main() -> None:
+    # Import by module name so the pickle refers to category_rules, not __main__
+    import category_rules
+
+    rules = category_rules.load()
+    n_keywords = sum(len(kw) + len(boost) for _tag, kw, boost in rules.categories)
+    print(f"Rules: {RULES_FILE} ({rules.source_hash})")
+    print(f"  {len(rules.categories)} categories, {n_keywords} keywords,"
+          f" {len(rules.matcher.keywords)} distinct after lower-casing")
+    for tag, kw, boost in rules.categories:
+        print(f"  {tag:<20s} {len(kw):>3d} keywords, {len(boost):>2d} title boosts")
+    print(f"  fallback: {rules.fallback}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+"""
+Changeset Manifest
+==================
+Records which prompts changed since the pipeline last ran to completion,
+so categorize / generate / export can skip the untouched ones.
+
+Each record's hash covers what the downstream outputs show: title, body and
+categories. data/changeset.json holds the hashes of the last completed run
+("base") and the IDs that differ from it now:
+
+  {"base": {"001": "9f86d0...", ...},
+   "added": [...], "modified": [...], "removed": [...], "updated_at": "..."}
+
+The crawler rewrites the lists after every run against the same base, so
+several crawls without a downstream run accumulate correctly, and
+categorize_prompts.py rewrites them again once it has saved, so prompts that
+were only reclassified (e.g. after a rule edit) count as modified too. Once every
+stage has consumed the changeset, `python changeset.py commit` makes the
+current prompts.json the new base and empties the lists. Only runs that
+write prompts.json itself touch the manifest: a crawl into another file
+(a test, a benchmark, a shard) has no changeset unless one is given.
+
+Usage:
+  python changeset.py            # show the pending changeset
+  python changeset.py commit     # mark it consumed
+"""
+
+import argparse
+import hashlib
+import io
+import json
+import os
+import sys
+import time
+from pathlib import Path
+
+import prompt_store
+
+if sys.platform == "win32":
+    sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding="utf-8", errors="replace")
+
+PROJECT_DIR = Path(__file__).resolve().parent.parent
+DATA_FILE = prompt_store.DATA_FILE
+CHANGESET_FILE = PROJECT_DIR / "data" / "changeset.json"
+
+
+def content_hash(title: str, body: str) -> str:
+    """Stable hash of a prompt's content (the fields the crawler extracts)."""
+    return hashlib.sha256(f"{title}\0{body}".encode("utf-8")).hexdigest()[:16]
+
+
+def record_hash(p: dict) -> str:
+    """Hash of a prompt as the downstream stages see it: content plus categories."""
+    cats = "\0".join(p.get("categories") or [])
+    return hashlib.sha256(f"{p['title']}\0{p['body']}\0{cats}".encode("utf-8")).hexdigest()[:16]
+
+
+def hashes(prompts: list[dict]) -> dict[str, str]:
+    return {p["id"]: record_hash(p) for p in prompts}
+
+
+def for_output(output: Path) -> Path | None:
+    """The manifest tracking `output`: the pipeline's for prompts.json, else none."""
+    return CHANGESET_FILE if output.resolve() == DATA_FILE.resolve() else None
+
+
+def load(path: Path = CHANGESET_FILE) -> dict | None:
+    """The manifest, or None if there is none (callers then process everything)."""
+    if not path.exists():
+        return None
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def changed_ids(manifest: dict) -> set[str]:
+    """IDs that are new or whose content or categories differ (what downstream must redo)."""
+    return set(manifest["added"]) | set(manifest["modified"])
+
+
+def is_empty(manifest: dict) -> bool:
+    return not (manifest["added"] or manifest["modified"] or manifest["removed"])
+
+
+def up_to_date(output: Path, data: Path = DATA_FILE, path: Path = CHANGESET_FILE) -> bool:
+    """True if nothing changed and `output` was built from the current data file."""
+    manifest = load(path)
+    return (
+        manifest is not None
+        and is_empty(manifest)
+        and output.exists()
+        and output.stat().st_mtime >= data.stat().st_mtime
+    )
+
+
+def write(path: Path, base: dict[str, str], prompts: list[dict]) -> dict:
+    """Diff `prompts` against `base` and save the manifest atomically."""
+    current = hashes(prompts)
+    manifest = {
+        "updated_at": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "added": sorted(pid for pid in current if pid not in base),
+        "modified": sorted(pid for pid, h in current.items() if pid in base and base[pid] != h),
+        "removed": sorted(pid for pid in base if pid not in current),
+        "base": base,
+    }
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(f"{path.name}.tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=1)
+    os.replace(tmp, path)
+    return manifest
+
+
+def base_for_run(path: Path, prompts_before: list[dict]) -> dict[str, str]:
+    """Base to diff a run against: the pending one, or the corpus before the run."""
+    manifest = load(path)
+    return manifest["base"] if manifest is not None else hashes(prompts_before)
+
+
+def summary(manifest: dict) -> str:
+    return (
+        f"{len(manifest['added'])} added, {len(manifest['modified'])} modified,"
+        f" {len(manifest['removed'])} removed"
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Show or commit the pending changeset.")
+    parser.add_argument("command", nargs="?", choices=["show", "commit"], default="show")
+    parser.add_argument("--changeset", type=Path, default=CHANGESET_FILE)
+    parser.add_argument("--data", type=Path, default=DATA_FILE, help="prompts JSON file")
+    args = parser.parse_args()
+
+    manifest = load(args.changeset)
+    if args.command == "show":
+        if manifest is None:
+            print(f"No changeset at {args.changeset}")
+            return
+        print(f"Changeset ({manifest['updated_at']}): {summary(manifest)}")
+        for key in ("added", "modified", "removed"):
+            if manifest[key]:
+                print(f"  {key:<9s}: {', '.join(manifest[key])}")
+        return
+
+    prompts = prompt_store.open_store(args.data).load()
+    write(args.changeset, hashes(prompts), prompts)
+    print(f"Committed: {len(prompts)} prompts are the new base"
+          + (f" ({summary(manifest)} consumed)" if manifest else ""))
+
+
+if __name__ == "__main__":
+    main()
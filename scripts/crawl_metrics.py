@@ -0,0 +1,368 @@
+"""
+Crawl Metrics
+=============
+Per-request and per-stage measurements for crawl_prompts.py, exported as a
+JSON summary and a Prometheus textfile (node_exporter textfile collector)
+after each run.
+
+Per request (each attempt, retries included):
+  dns / connect / tls   only when a new connection was opened; 0 if reused
+  ttfb                  request sent -> response headers (minus the above)
+  download              response headers -> body read
+  bytes                 on the wire (compressed) and decoded
+
+DNS, TCP connect and TLS are timed by the connection classes of the
+session's adapter (TimedHTTPAdapter). They report into a thread-local
+slot that fetch_page() opens with begin_request() before each attempt.
+
+Per run: parse time per page, outcomes (new, not modified, missing, ...),
+status-code histogram, retries and wall time per stage (discovery, crawl,
+compaction). LiveReporter logs counters and rewrites the textfile every
+--metrics-interval seconds while the crawl runs.
+"""
+
+import json
+import logging
+import os
+import socket
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from pathlib import Path
+
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+from urllib3.exceptions import ConnectTimeoutError, NewConnectionError
+from urllib3.util.connection import allowed_gai_family, create_connection
+
+SCRIPT_DIR = Path(__file__).resolve().parent
+METRICS_DIR = SCRIPT_DIR / "metrics"
+METRICS_JSON = METRICS_DIR / "crawl_metrics.json"
+METRICS_PROM = METRICS_DIR / "crawl_metrics.prom"
+
+PROM_PREFIX = "prompt_crawler"
+TIMING_FIELDS = ("dns", "connect", "tls", "ttfb", "download", "total")
+
+logger = logging.getLogger(__name__)
+
+# ---------------------------------------------------------------------------
+# Connection timing
+# ---------------------------------------------------------------------------
+
+_local = threading.local()
+
+
+def begin_request() -> dict[str, float]:
+    """Open this thread's slot for the connection timings of the next request."""
+    _local.conn = {}
+    return _local.conn
+
+
+def _conn_timing() -> dict[str, float] | None:
+    return getattr(_local, "conn", None)
+
+
+class TimedHTTPConnection(HTTPConnection):
+    def _new_conn(self) -> socket.socket:
+        timing = _conn_timing()
+        if timing is None:
+            return super()._new_conn()
+        host = self._dns_host.strip("[]")
+        started = time.perf_counter()
+        try:
+            addresses = socket.getaddrinfo(host, self.port, allowed_gai_family(), socket.SOCK_STREAM)
+        except OSError:
+            return super()._new_conn()  # Let urllib3 raise NameResolutionError
+        resolved = time.perf_counter()
+        timing["dns"] = (resolved - started) * 1000
+
+        # Try each resolved address in turn, like urllib3 (an unreachable IPv6
+        # address falls back to IPv4); connecting to the IP literal skips a
+        # second lookup, while Host and SNI still use self.host
+        error: OSError = OSError("getaddrinfo returned no addresses")
+        for *_, sockaddr in addresses:
+            try:
+                sock = create_connection(
+                    (sockaddr[0], self.port), self.timeout,
+                    source_address=self.source_address, socket_options=self.socket_options,
+                )
+            except OSError as e:
+                error = e
+                continue
+            timing["connect"] = (time.perf_counter() - resolved) * 1000
+            sys.audit("http.client.connect", self, self.host, self.port)
+            return sock
+        if isinstance(error, socket.timeout):
+            raise ConnectTimeoutError(
+                self, f"Connection to {self.host} timed out. (connect timeout={self.timeout})"
+            ) from error
+        raise NewConnectionError(self, f"Failed to establish a new connection: {error}") from error
+
+    def connect(self) -> None:
+        started = time.perf_counter()
+        super().connect()
+        timing = _conn_timing()
+        if timing is not None:
+            timing["setup"] = (time.perf_counter() - started) * 1000
+
+
+class TimedHTTPSConnection(TimedHTTPConnection, HTTPSConnection):
+    pass
+
+
+class TimedHTTPConnectionPool(HTTPConnectionPool):
+    ConnectionCls = TimedHTTPConnection
+
+
+class TimedHTTPSConnectionPool(HTTPSConnectionPool):
+    ConnectionCls = TimedHTTPSConnection
+
+
+class TimedHTTPAdapter(HTTPAdapter):
+    """HTTPAdapter whose new connections report DNS / connect / TLS times."""
+
+    def init_poolmanager(self, *args, **kwargs) -> None:
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            "http": TimedHTTPConnectionPool,
+            "https": TimedHTTPSConnectionPool,
+        }
+
+# ---------------------------------------------------------------------------
+# Collection
+# ---------------------------------------------------------------------------
+
+def timed_call(fn, *args):
+    """(fn(*args), elapsed seconds); module-level so it can run in a process pool."""
+    started = time.perf_counter()
+    result = fn(*args)
+    return result, time.perf_counter() - started
+
+
+def _distribution(values: list[float]) -> dict[str, float]:
+    if not values:
+        return {"count": 0}
+    values = sorted(values)
+
+    def q(p: float) -> float:
+        return values[min(len(values) - 1, int(len(values) * p))]
+
+    return {
+        "count": len(values),
+        "sum": sum(values),
+        "mean": sum(values) / len(values),
+        "p50": q(0.50),
+        "p95": q(0.95),
+        "p99": q(0.99),
+        "max": values[-1],
+    }
+
+
+class CrawlMetrics:
+    """Thread-safe collector; fetch threads add requests, the loop the rest."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self.started = time.time()
+        self.requests: list[dict] = []
+        self.parse_ms: list[float] = []
+        self.outcomes: Counter[str] = Counter()
+        self.stages: dict[str, float] = {}
+
+    # --- recording ---------------------------------------------------------
+
+    def add_request(
+        self,
+        prompt_id: str,
+        attempt: int,
+        status: int | None,
+        resp,
+        conn: dict[str, float],
+        elapsed: float,
+        error: str | None = None,
+    ) -> None:
+        """One fetch attempt. `resp` is the requests.Response, or None on error."""
+        total = elapsed * 1000
+        new_conn = "setup" in conn
+        dns = conn.get("dns", 0.0)
+        connect = conn.get("connect", 0.0)
+        tls = max(conn.get("setup", 0.0) - dns - connect, 0.0)
+        ttfb = download = None
+        if resp is not None:
+            headers_at = resp.elapsed.total_seconds() * 1000
+            ttfb = max(headers_at - dns - connect - tls, 0.0)
+            download = max(total - headers_at, 0.0)
+        entry = {
+            "id": prompt_id,
+            "attempt": attempt,
+            "status": status,
+            "error": error,
+            "new_connection": new_conn,
+            "dns_ms": dns,
+            "connect_ms": connect,
+            "tls_ms": tls,
+            "ttfb_ms": ttfb,
+            "download_ms": download,
+            "total_ms": total,
+            "wire_bytes": resp.raw.tell() if resp is not None and resp.raw else None,
+            "body_bytes": len(resp.content) if resp is not None else None,
+            "encoding": resp.headers.get("Content-Encoding") if resp is not None else None,
+        }
+        with self._lock:
+            self.requests.append(entry)
+
+    def add_parse(self, seconds: float) -> None:
+        with self._lock:
+            self.parse_ms.append(seconds * 1000)
+
+    def count(self, outcome: str, n: int = 1) -> None:
+        with self._lock:
+            self.outcomes[outcome] += n
+
+    @contextmanager
+    def stage(self, name: str):
+        """Add the wall time of the block to stage `name`."""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.stages[name] = self.stages.get(name, 0.0) + time.perf_counter() - started
+
+    # --- reporting ---------------------------------------------------------
+
+    def snapshot(self) -> dict:
+        """Counters so far (cheap enough for the live reporter)."""
+        with self._lock:
+            requests = list(self.requests)
+            outcomes = dict(self.outcomes)
+        elapsed = time.time() - self.started
+        pages = sum(1 for e in requests if e["status"] in (200, 304))
+        return {
+            "elapsed_s": elapsed,
+            "requests": len(requests),
+            "pages": pages,
+            "pages_per_s": pages / elapsed if elapsed else 0.0,
+            "retries": sum(1 for e in requests if e["attempt"] > 1),
+            "errors": sum(1 for e in requests if e["status"] is None),
+            "status_counts": dict(Counter(str(e["status"]) for e in requests)),
+            "outcomes": outcomes,
+        }
+
+    def summary(self) -> dict:
+        with self._lock:
+            requests = list(self.requests)
+            parse_ms = list(self.parse_ms)
+        summary = self.snapshot()
+        summary["started"] = time.strftime("%Y-%m-%dT%H:%M:%S%z", time.localtime(self.started))
+        summary["new_connections"] = sum(1 for e in requests if e["new_connection"])
+        summary["bytes"] = {
+            "wire": sum(e["wire_bytes"] or 0 for e in requests),
+            "body": sum(e["body_bytes"] or 0 for e in requests),
+        }
+        timings = {}
+        for field in TIMING_FIELDS:
+            if field in ("dns", "connect", "tls"):
+                values = [e[f"{field}_ms"] for e in requests if e["new_connection"]]
+            else:
+                values = [e[f"{field}_ms"] for e in requests if e[f"{field}_ms"] is not None]
+            timings[field] = _distribution(values)
+        timings["parse"] = _distribution(parse_ms)
+        summary["timings_ms"] = timings
+        summary["stages_s"] = dict(self.stages)
+        return summary
+
+    def write_requests_jsonl(self, path: Path) -> None:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with self._lock:
+            requests = list(self.requests)
+        with open(path, "w", encoding="utf-8") as f:
+            for entry in requests:
+                f.write(json.dumps(entry) + "\n")
+
+    def write_json(self, path: Path) -> None:
+        _write_atomic(path, json.dumps(self.summary(), ensure_ascii=False, indent=2) + "\n")
+
+    def write_prometheus(self, path: Path, live: bool = False) -> None:
+        """Textfile-collector format; written atomically so it is never read half-done."""
+        s = self.summary()
+        p = PROM_PREFIX
+        lines: list[str] = []
+
+        def metric(name: str, kind: str, help_text: str, samples: list[tuple[str, float]]) -> None:
+            lines.append(f"# HELP {p}_{name} {help_text}")
+            lines.append(f"# TYPE {p}_{name} {kind}")
+            for labels, value in samples:
+                lines.append(f"{p}_{name}{labels} {value:.15g}")
+
+        metric("running", "gauge", "1 while a crawl is in progress.", [("", 1 if live else 0)])
+        metric("last_run_timestamp_seconds", "gauge", "Start time of the last crawl.",
+               [("", self.started)])
+        metric("duration_seconds", "gauge", "Wall time of the crawl so far.", [("", s["elapsed_s"])])
+        metric("pages_per_second", "gauge", "Pages (200/304) per second of wall time.",
+               [("", s["pages_per_s"])])
+        metric("requests_total", "counter", "HTTP requests by status (None = no response).",
+               [(f'{{status="{k}"}}', v) for k, v in sorted(s["status_counts"].items())])
+        metric("retries_total", "counter", "Fetch attempts after the first.", [("", s["retries"])])
+        metric("pages_total", "counter", "Pages by crawl outcome.",
+               [(f'{{outcome="{k}"}}', v) for k, v in sorted(s["outcomes"].items())])
+        metric("new_connections_total", "counter", "TCP connections opened.",
+               [("", s["new_connections"])])
+        metric("bytes_total", "counter", "Response bytes (wire = compressed).",
+               [(f'{{kind="{k}"}}', v) for k, v in sorted(s["bytes"].items())])
+        # One summary family: quantile samples plus _sum / _count per phase
+        phases: list[tuple[str, float]] = []
+        for k, d in s["timings_ms"].items():
+            if d["count"]:
+                phases += [(f'{{phase="{k}",quantile="{q}"}}', d[key] / 1000)
+                           for q, key in (("0.5", "p50"), ("0.95", "p95"), ("0.99", "p99"))]
+            phases.append((f'_sum{{phase="{k}"}}', d.get("sum", 0.0) / 1000))
+            phases.append((f'_count{{phase="{k}"}}', d["count"]))
+        metric("phase_seconds", "summary", "Time per request phase and parse, in seconds.", phases)
+        metric("stage_seconds", "gauge", "Wall time per crawl stage.",
+               [(f'{{stage="{k}"}}', v) for k, v in sorted(s["stages_s"].items())])
+        _write_atomic(path, "\n".join(lines) + "\n")
+
+
+def _write_atomic(path: Path, text: str) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix(path.suffix + ".tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(text)
+    os.replace(tmp, path)
+
+# ---------------------------------------------------------------------------
+# Live counters
+# ---------------------------------------------------------------------------
+
+class LiveReporter:
+    """Logs counters and refreshes the textfile every `interval` seconds (0: off)."""
+
+    def __init__(self, metrics: CrawlMetrics, interval: float, prom_path: Path | None = None) -> None:
+        self.metrics = metrics
+        self.interval = interval
+        self.prom_path = prom_path
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="metrics", daemon=True)
+
+    def start(self) -> None:
+        if self.interval > 0:
+            self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread.is_alive():
+            self._thread.join()
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            s = self.metrics.snapshot()
+            logger.info(
+                f"[metrics] {s['elapsed_s']:.0f}s: {s['requests']} requests,"
+                f" {s['pages_per_s']:.2f} pages/s, {s['retries']} retries,"
+                f" {s['errors']} errors, status {s['status_counts']}"
+            )
+            if self.prom_path is not None:
+                self.metrics.write_prometheus(self.prom_path, live=True)
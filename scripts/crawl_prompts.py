@@ -2,26 +2,82 @@
 """
 Prompt Aggregator Crawler
 =========================
-Crawls prompt pages from nanyo-city.jpn.org/prompt/ (001.html ~ 999.html)
-and outputs structured JSON data.
+Crawls prompt pages from nanyo-city.jpn.org/prompt/ (001.html ~ 999.html,
+or the range found by --discover) and outputs structured JSON data.
 
 Features:
-  - Resumable: tracks progress in progress.log
-  - Polite: 1.0s sleep between requests
+  - Resumable: per-ID status, attempts and fetch times in crawl_state.db
+    (SQLite); failed IDs are retried with exponential backoff
+  - Append-only: each parsed page is appended to prompts.jsonl and compacted
+    into the sorted prompts.json once, at the end of the run
+  - Incremental: --refresh also revisits IDs older than --max-age, with
+    If-None-Match / If-Modified-Since, so unchanged pages cost a 304 and
+    no parsing
+  - Cached: raw HTML is kept in cache/html/, and --reparse rebuilds
+    prompts.json from it without any network access
+  - Changeset: data/changeset.json lists the IDs added, modified or removed
+    since the last completed pipeline run, for downstream --changeset (kept
+    only for the default --output; other outputs need an explicit --changeset)
+  - Polite: per-host token bucket, 1 request/s by default (retries included)
+  - Pooled: one keep-alive session, pool sized to --concurrency, gzip/br
+    compression
+  - Instrumented: DNS / connect / TLS / TTFB / download and parse times,
+    bytes, retries and status codes per request, exported after each run
+    to metrics/crawl_metrics.json and a Prometheus textfile; live counters
+    with --metrics-interval, raw per-request JSONL with --timings-out
+  - Concurrent: asyncio engine keeps up to --concurrency requests in flight
+  - Parallel parsing: pages are parsed on a process pool (--parse-workers)
+  - Two extractors: BeautifulSoup (default) or a single-pass html.parser
+    extractor (--extractor stream), checked with --verify-extractor
+  - Discovery: --discover reads the ID list from the index page, or finds
+    the upper bound by exponential + binary probing, instead of trying
+    every ID up to 999; known gaps are skipped as dead ranges
   - Robust: handles 404, timeouts, and errors gracefully
+
+Usage:
+  python crawl_prompts.py                      # new IDs + due retries
+  python crawl_prompts.py --concurrency 8      # more requests in flight
+  python crawl_prompts.py --refresh            # ... + stale IDs, conditionally
+  python crawl_prompts.py --discover           # crawl up to the discovered last ID
+  python crawl_prompts.py --reparse            # re-run parse_page() on cached HTML
+  python crawl_prompts.py --verify-extractor   # compare extractors on cached HTML
+  python crawl_prompts.py --base-url http://127.0.0.1:8000/ \
+      --output /tmp/prompts.json --state-db /tmp/crawl_state.db \
+      --log-file /tmp/crawler.log
+  python crawl_prompts.py --base-url https://127.0.0.1:8443/ --ca-bundle cert.pem \
+      --timings-out /tmp/timings.jsonl [--no-keep-alive]
 """
 
+import argparse
+import asyncio
 import json
 import io
 import os
 import sys
+import threading
 import time
 import logging
+from collections import deque
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
 from pathlib import Path
-from urllib.parse import urljoin
+from typing import Iterable, Iterator
+from urllib.parse import urljoin, urlsplit
 
 import requests
 from bs4 import BeautifulSoup
+from urllib3.util import make_headers
+
+import changeset
+import id_discovery
+import prompt_store
+import stream_extract
+from prompt_record import Prompt
+from crawl_metrics import (
+    METRICS_JSON, METRICS_PROM, CrawlMetrics, LiveReporter, TimedHTTPAdapter,
+    begin_request, timed_call,
+)
+from crawl_state import JOURNAL_MODES, STATE_DB, CrawlState
+from html_cache import CACHE_DIR, HtmlCache
 
 # ---------------------------------------------------------------------------
 # Fix Windows console encoding
@@ -36,70 +92,141 @@ if sys.platform == "win32":
 BASE_URL = "https://nanyo-city.jpn.org/prompt/"
 START_ID = 1
 END_ID = 999
-SLEEP_SECONDS = 1.0
+SLEEP_SECONDS = 1.0      # Minimum interval between requests to one host
+CONCURRENCY = 4          # Requests in flight (still bounded by the rate limit)
+PARSE_WORKERS = os.cpu_count() or 1  # Parser processes (1 = parse inline)
 REQUEST_TIMEOUT = 15
 MAX_RETRIES = 2
+HEADERS = {
+    "User-Agent": "PromptAggregator/1.0 (educational project)",
+    "Accept": "text/html",
+    "Accept-Language": "ja,en;q=0.9",
+    # gzip/deflate, plus br/zstd when the decoder modules are installed
+    "Accept-Encoding": make_headers(accept_encoding=True)["accept-encoding"],
+}
 
 SCRIPT_DIR = Path(__file__).resolve().parent
 PROJECT_DIR = SCRIPT_DIR.parent
 DATA_DIR = PROJECT_DIR / "data"
 OUTPUT_FILE = DATA_DIR / "prompts.json"
+MAX_AGE_HOURS = 20       # --refresh revisits pages fetched longer ago than this
+
+# Legacy resume files, imported into crawl_state.db on first run
 PROGRESS_FILE = SCRIPT_DIR / "progress.log"
+VALIDATORS_FILE = SCRIPT_DIR / "validators.json"
 
 # ---------------------------------------------------------------------------
 # Logging
 # ---------------------------------------------------------------------------
+LOG_FILE = SCRIPT_DIR / "crawler.log"
+
 console_handler = logging.StreamHandler(sys.stdout)
 console_handler.setLevel(logging.INFO)
 
-file_handler = logging.FileHandler(SCRIPT_DIR / "crawler.log", encoding="utf-8")
-file_handler.setLevel(logging.INFO)
-
 logging.basicConfig(
     level=logging.INFO,
     format="%(asctime)s [%(levelname)s] %(message)s",
-    handlers=[console_handler, file_handler],
+    handlers=[console_handler],
 )
 logger = logging.getLogger(__name__)
+file_handler: logging.FileHandler | None = None
+
+
+def log_to_file(path: Path) -> None:
+    """Also log to `path`, replacing the log file of an earlier call."""
+    global file_handler
+    if file_handler is not None:
+        if Path(file_handler.baseFilename) == path.resolve():
+            return
+        logging.getLogger().removeHandler(file_handler)
+        file_handler.close()
+    path.parent.mkdir(parents=True, exist_ok=True)
+    file_handler = logging.FileHandler(path, encoding="utf-8")
+    file_handler.setLevel(logging.INFO)
+    file_handler.setFormatter(console_handler.formatter)
+    logging.getLogger().addHandler(file_handler)
 
 # ---------------------------------------------------------------------------
-# Progress tracking (resume support)
+# Existing data management
 # ---------------------------------------------------------------------------
 
-def load_progress() -> set[str]:
-    """Load set of already-crawled IDs from progress log."""
-    if not PROGRESS_FILE.exists():
-        return set()
-    with open(PROGRESS_FILE, "r", encoding="utf-8") as f:
-        return {line.strip() for line in f if line.strip()}
+def load_existing_data(path: Path = OUTPUT_FILE) -> list[Prompt]:
+    """Load previously saved prompts so we can append incrementally."""
+    try:
+        return prompt_store.open_store(path).load()
+    except json.JSONDecodeError as e:
+        # Never fall back to an empty list: the next save would wipe the data
+        raise SystemExit(
+            f"Corrupted {path} ({e}) - restore it, or delete it and rebuild it from the"
+            " HTML cache with --reparse (a normal run also refetches every page that"
+            " has no record)."
+        )
 
 
-def save_progress(prompt_id: str) -> None:
-    """Append a crawled ID to the progress log."""
-    with open(PROGRESS_FILE, "a", encoding="utf-8") as f:
-        f.write(f"{prompt_id}\n")
+def save_data(prompts: list[Prompt], path: Path = OUTPUT_FILE) -> None:
+    """Persist prompt list to JSON (atomically: readers never see a partial file)."""
+    prompt_store.open_store(path).save(prompts)
 
 # ---------------------------------------------------------------------------
-# Existing data management
+# Record log (append-only JSONL, compacted into the JSON output)
 # ---------------------------------------------------------------------------
 
-def load_existing_data() -> list[dict]:
-    """Load previously saved prompts so we can append incrementally."""
-    if OUTPUT_FILE.exists():
-        with open(OUTPUT_FILE, "r", encoding="utf-8") as f:
+def records_log_path(output: Path) -> Path:
+    """prompts.json -> prompts.jsonl"""
+    return output.with_suffix(".jsonl")
+
+
+def load_records_log(path: Path) -> dict[str, dict]:
+    """Records appended since the last compaction (last one per ID wins)."""
+    records: dict[str, dict] = {}
+    if not path.exists():
+        return records
+    with open(path, "r", encoding="utf-8") as f:
+        for line_no, line in enumerate(f, 1):
+            if not line.strip():
+                continue
             try:
-                return json.load(f)
+                record = json.loads(line)
             except json.JSONDecodeError:
-                logger.warning("Corrupted prompts.json – starting fresh.")
-                return []
-    return []
+                # Only a crash mid-append can leave a torn line; it is the last one
+                logger.warning(f"{path.name}:{line_no}: skipping torn record.")
+                continue
+            records[record["id"]] = record
+    return records
+
 
+def compact_records(output: Path, log_path: Path) -> tuple[list[Prompt], int, int]:
+    """
+    Merge the record log into the JSON output and remove the log.
 
-def save_data(prompts: list[dict]) -> None:
-    """Persist prompt list to JSON."""
-    DATA_DIR.mkdir(parents=True, exist_ok=True)
-    with open(OUTPUT_FILE, "w", encoding="utf-8") as f:
-        json.dump(prompts, f, ensure_ascii=False, indent=2)
+    A logged record replaces the stored one only if its title or body
+    changed, so unchanged prompts keep downstream fields (categories).
+    Returns (prompts, added, updated); the JSON is only rewritten if
+    something changed.
+    """
+    prompts = load_existing_data(output)
+    logged = load_records_log(log_path)
+    by_id = {p.id: p for p in prompts}
+
+    added = 0
+    updated = 0
+    for prompt_id, record in logged.items():
+        old = by_id.get(prompt_id)
+        if old is None:
+            added += 1
+        elif (old.title, old.body) != (record["title"], record["body"]):
+            updated += 1
+        else:
+            continue
+        by_id[prompt_id] = Prompt.from_dict(record)
+
+    prompts = sorted(by_id.values(), key=lambda p: p.id)
+    if added or updated:
+        save_data(prompts, output)
+    # Only after the JSON is safely replaced: a crash before this line
+    # just replays the log on the next run.
+    log_path.unlink(missing_ok=True)
+    return prompts, added, updated
 
 # ---------------------------------------------------------------------------
 # HTML Parsing
@@ -199,7 +326,25 @@ def parse_page(html: str, prompt_id: str) -> dict | None:
             sections.append(body_text)
 
     body = "\n\n".join(sections)
+    return _make_record(prompt_id, title, body)
+
 
+def parse_page_stream(html: str, prompt_id: str) -> dict | None:
+    """
+    Same result as parse_page(), computed in one pass by stream_extract
+    without building a BeautifulSoup tree.
+    """
+    title, body = stream_extract.extract(html)
+    if title is None:
+        logger.warning(f"[{prompt_id}] No title found - skipping.")
+        return None
+    if body is None:
+        logger.warning(f"[{prompt_id}] No extractable content - skipping.")
+        return None
+    return _make_record(prompt_id, title, body)
+
+
+def _make_record(prompt_id: str, title: str, body: str) -> dict | None:
     if not body or len(body) < 10:
         logger.warning(f"[{prompt_id}] Body too short ({len(body)} chars) - skipping.")
         return None
@@ -213,119 +358,716 @@ def parse_page(html: str, prompt_id: str) -> dict | None:
         "url": url,
     }
 
+EXTRACTORS = {
+    "bs4": parse_page,
+    "stream": parse_page_stream,
+}
+
+# ---------------------------------------------------------------------------
+# Parse stage (process pool)
+# ---------------------------------------------------------------------------
+
+def make_parse_executor(workers: int) -> ProcessPoolExecutor | None:
+    """Process pool for parse_page(), or None to parse inline."""
+    if workers <= 1:
+        return None
+    return ProcessPoolExecutor(max_workers=workers)
+
+
+def parse_stream(
+    pages: Iterable[tuple[str, str]],
+    executor: Executor | None = None,
+    window: int = 64,
+    parse=parse_page,
+) -> Iterator[tuple[str, dict | None]]:
+    """
+    Parse (id, html) pairs, yielding (id, result) in input order.
+
+    At most `window` pages are in flight, so a long input (e.g. the whole
+    HTML cache) is streamed through the pool instead of loaded up front.
+    """
+    if executor is None:
+        for prompt_id, html in pages:
+            yield prompt_id, parse(html, prompt_id)
+        return
+
+    pending: deque = deque()
+    for prompt_id, html in pages:
+        pending.append((prompt_id, executor.submit(parse, html, prompt_id)))
+        if len(pending) >= window:
+            done_id, future = pending.popleft()
+            yield done_id, future.result()
+    while pending:
+        done_id, future = pending.popleft()
+        yield done_id, future.result()
+
+# ---------------------------------------------------------------------------
+# Rate limiting (per-host token bucket)
+# ---------------------------------------------------------------------------
+
+class TokenBucket:
+    """
+    Thread-safe token bucket: refills at `rate` tokens/s, holds at most
+    `capacity` tokens. With capacity 1 this is a strict minimum interval.
+    """
+
+    def __init__(self, rate: float, capacity: float = 1.0) -> None:
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self) -> None:
+        """Block until a token is available, then consume it."""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(
+                    self.capacity, self._tokens + (now - self._updated) * self.rate
+                )
+                self._updated = now
+                if self._tokens >= 1.0:
+                    self._tokens -= 1.0
+                    return
+                wait = (1.0 - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+class HostRateLimiter:
+    """One TokenBucket per host, created lazily."""
+
+    def __init__(self, rate: float, capacity: float = 1.0) -> None:
+        self.rate = rate
+        self.capacity = capacity
+        self._buckets: dict[str, TokenBucket] = {}
+        self._lock = threading.Lock()
+
+    def wait(self, url: str) -> None:
+        host = urlsplit(url).netloc
+        with self._lock:
+            bucket = self._buckets.get(host)
+            if bucket is None:
+                bucket = self._buckets[host] = TokenBucket(self.rate, self.capacity)
+        bucket.acquire()
+
+# ---------------------------------------------------------------------------
+# HTTP session
+# ---------------------------------------------------------------------------
+
+def make_session(
+    pool_size: int = CONCURRENCY, ca_bundle: Path | None = None, keep_alive: bool = True
+) -> requests.Session:
+    """
+    Shared session for all fetch threads.
+
+    Each host gets a pool of `pool_size` keep-alive connections; with
+    pool_block a thread waits for a free connection rather than opening a
+    throwaway one, so concurrency N means at most N sockets per host.
+    keep_alive=False sends "Connection: close" (for comparing handshake cost).
+    """
+    session = requests.Session()
+    adapter = TimedHTTPAdapter(pool_connections=4, pool_maxsize=pool_size, pool_block=True)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    session.headers.update(HEADERS)
+    if not keep_alive:
+        session.headers["Connection"] = "close"
+    if ca_bundle is not None:
+        session.verify = str(ca_bundle)
+        # Otherwise REQUESTS_CA_BUNDLE / CURL_CA_BUNDLE take precedence over verify
+        session.trust_env = False
+    return session
+
 # ---------------------------------------------------------------------------
 # Fetching
 # ---------------------------------------------------------------------------
 
-def fetch_page(prompt_id: str) -> str | None:
-    """Fetch a single prompt page. Returns HTML string or None on failure."""
-    url = f"{BASE_URL}{prompt_id}.html"
+def fetch_page(
+    prompt_id: str,
+    base_url: str = BASE_URL,
+    limiter: HostRateLimiter | None = None,
+    validators: CrawlState | None = None,
+    session: requests.Session | None = None,
+    metrics: CrawlMetrics | None = None,
+) -> tuple[int | None, str | None]:
+    """
+    Fetch a single prompt page.
+
+    Returns (HTTP status, HTML). HTML is only set for 200; the status is
+    None if no response arrived (timeout, connection error).
+
+    If a limiter is given, every attempt (including retries) waits for a
+    token first, so the per-host rate holds however many threads fetch.
+
+    If a validator store is given, the request is conditional (304 when
+    unchanged) and new validators are recorded on 200.
+
+    Requests go through `session` (pooled keep-alive connections) when
+    given; `metrics` receives one entry per attempt.
+    """
+    status = None
+    http = session if session is not None else requests
+    headers = {} if session is not None else dict(HEADERS)
+    if validators is not None:
+        headers.update(validators.request_headers(prompt_id))
+    url = f"{base_url}{prompt_id}.html"
 
     for attempt in range(1, MAX_RETRIES + 1):
+        if limiter is not None:
+            limiter.wait(url)
+        started = time.perf_counter()
+        conn = begin_request()
+        resp = None
+        error = None
         try:
-            resp = requests.get(
+            resp = http.get(
                 url,
                 timeout=REQUEST_TIMEOUT,
-                headers={
-                    "User-Agent": "PromptAggregator/1.0 (educational project)",
-                    "Accept": "text/html",
-                    "Accept-Language": "ja,en;q=0.9",
-                },
+                headers=headers,
             )
+            resp.content  # Read the body here so the timing covers the download
+
+            status = resp.status_code
+
+            if resp.status_code == 304:
+                logger.info(f"[{prompt_id}] 304 Not Modified - skipping.")
+                return status, None
 
             if resp.status_code == 404:
                 logger.info(f"[{prompt_id}] 404 Not Found - skipping.")
-                return None
+                return status, None
 
-            if resp.status_code != 200:
-                logger.warning(
-                    f"[{prompt_id}] HTTP {resp.status_code} (attempt {attempt}/{MAX_RETRIES})"
-                )
-                if attempt < MAX_RETRIES:
-                    time.sleep(2)
-                    continue
-                return None
+            if resp.status_code == 200:
+                # Force UTF-8: pages declare <meta charset="UTF-8">
+                resp.encoding = "utf-8"
+                if validators is not None:
+                    validators.update(prompt_id, resp.headers)
+                return status, resp.text
 
-            # Force UTF-8: pages declare <meta charset="UTF-8">
-            resp.encoding = "utf-8"
-            return resp.text
+            logger.warning(
+                f"[{prompt_id}] HTTP {resp.status_code} (attempt {attempt}/{MAX_RETRIES})"
+            )
 
-        except requests.exceptions.Timeout:
+        except requests.exceptions.Timeout as e:
+            status = None
+            error = type(e).__name__
             logger.warning(f"[{prompt_id}] Timeout (attempt {attempt}/{MAX_RETRIES})")
-            if attempt < MAX_RETRIES:
-                time.sleep(2)
         except requests.exceptions.RequestException as e:
+            status = None
+            error = type(e).__name__
             logger.error(f"[{prompt_id}] Request error: {e}")
-            if attempt < MAX_RETRIES:
-                time.sleep(2)
+        finally:
+            if metrics is not None:
+                metrics.add_request(
+                    prompt_id, attempt, status, resp, conn,
+                    time.perf_counter() - started, error,
+                )
+
+        if attempt < MAX_RETRIES:
+            time.sleep(2)
+
+    return status, None
+
+# ---------------------------------------------------------------------------
+# ID range discovery
+# ---------------------------------------------------------------------------
+
+class DiscoveryError(Exception):
+    """A probe got no usable answer, so the upper bound can't be trusted."""
+
+
+def fetch_index(
+    base_url: str,
+    limiter: HostRateLimiter | None = None,
+    session: requests.Session | None = None,
+) -> set[int]:
+    """Prompt IDs linked from the listing page at base_url (empty if none)."""
+    if limiter is not None:
+        limiter.wait(base_url)
+    http = session if session is not None else requests
+    try:
+        resp = http.get(base_url, timeout=REQUEST_TIMEOUT, headers=HEADERS)
+    except requests.exceptions.RequestException as e:
+        logger.warning(f"Index page unavailable: {e}")
+        return set()
+    if resp.status_code != 200:
+        logger.info(f"Index page: HTTP {resp.status_code}")
+        return set()
+    resp.encoding = "utf-8"
+    return id_discovery.ids_from_index(resp.text)
+
+
+def discover_end(
+    base_url: str,
+    limiter: HostRateLimiter,
+    state: CrawlState,
+    probe,
+    start: int = START_ID,
+    session: requests.Session | None = None,
+) -> int:
+    """
+    Last ID worth crawling, recording the dead ranges found on the way.
+
+    probe(n) fetches and handles one ID and returns True if it exists; it
+    raises DiscoveryError when the answer was neither a page nor a 404.
+    """
+    listed = {n for n in fetch_index(base_url, limiter, session) if n >= start}
+    if listed:
+        dead = id_discovery.gaps(listed, start)
+        state.set_dead_ranges(dead, "index")
+        logger.info(
+            f"Index page lists {len(listed)} IDs up to {max(listed):03d}"
+            f" ({len(dead)} gaps skipped)"
+        )
+        return max(listed)
+
+    known_max = max(state.max_live_id(), start - 1)
+    last_alive, first_dead = id_discovery.find_upper_bound(probe, known_max)
+    if last_alive:
+        state.set_dead_ranges([(last_alive + 1, id_discovery.MAX_ID)], "probe")
+    logger.info(
+        f"Probing: last live ID {last_alive:03d} (known {known_max:03d},"
+        f" dead from {first_dead:03d})"
+    )
+    return last_alive
+
+# ---------------------------------------------------------------------------
+# Concurrent crawl engine
+# ---------------------------------------------------------------------------
+
+async def crawl_async(
+    ids: list[str],
+    handle_page,
+    base_url: str = BASE_URL,
+    concurrency: int = CONCURRENCY,
+    limiter: HostRateLimiter | None = None,
+    validators: CrawlState | None = None,
+    parse_executor: Executor | None = None,
+    parse=parse_page,
+    session: requests.Session | None = None,
+    metrics: CrawlMetrics | None = None,
+) -> None:
+    """
+    Fetch `ids` with at most `concurrency` requests in flight.
+
+    Blocking `fetch_page` calls run on a thread pool of the same size, and
+    fetched HTML is handed to `parse_executor` (inline if None) so parsing
+    overlaps with the next requests. `handle_page(prompt_id, status, html,
+    result)` is called on the event loop thread as each page completes, so it needs
+    no locking.
+    """
+    loop = asyncio.get_running_loop()
+    semaphore = asyncio.Semaphore(concurrency)
+    total = len(ids)
+    started = 0
+
+    with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="fetch") as executor:
+
+        async def run_one(prompt_id: str) -> None:
+            nonlocal started
+            async with semaphore:
+                started += 1
+                logger.info(f"[{prompt_id}] Fetching... ({started}/{total})")
+                status, html = await loop.run_in_executor(
+                    executor, fetch_page, prompt_id, base_url, limiter, validators,
+                    session, metrics,
+                )
+            result = None
+            if html is not None:
+                if parse_executor is None:
+                    result, seconds = timed_call(parse, html, prompt_id)
+                else:
+                    result, seconds = await loop.run_in_executor(
+                        parse_executor, timed_call, parse, html, prompt_id
+                    )
+                if metrics is not None:
+                    metrics.add_parse(seconds)
+            handle_page(prompt_id, status, html, result)
 
-    return None
+        await asyncio.gather(*(run_one(pid) for pid in ids))
+
+# ---------------------------------------------------------------------------
+# Re-parse from the HTML cache
+# ---------------------------------------------------------------------------
+
+def reparse_cached(
+    cache: HtmlCache,
+    output: Path,
+    parse_executor: Executor | None = None,
+    parse=parse_page,
+) -> list[Prompt]:
+    """Rebuild the prompts JSON by running parse_page() over cached HTML."""
+    started = time.perf_counter()
+    prompts = load_existing_data(output)
+    by_id = {p.id: p for p in prompts}
+
+    rebuilt: list[Prompt] = []
+    changed = 0
+    dropped = 0
+    for prompt_id, result in parse_stream(cache.items(), parse_executor, parse=parse):
+        if result is None:
+            dropped += prompt_id in by_id
+            continue
+        old = by_id.get(prompt_id)
+        if old and (old.title, old.body) == (result["title"], result["body"]):
+            rebuilt.append(old)  # Unchanged: keep downstream fields such as categories
+        else:
+            changed += 1
+            rebuilt.append(Prompt.from_dict(result))
+
+    # Records crawled before the cache existed cannot be re-parsed; keep them
+    uncached = [p for p in prompts if p.id not in cache]
+    if uncached:
+        logger.warning(f"{len(uncached)} prompts have no cached HTML - kept as-is.")
+
+    rebuilt.extend(uncached)
+    rebuilt.sort(key=lambda p: p.id)
+    save_data(rebuilt, output)
+
+    logger.info(f"Re-parsed {len(cache)} cached pages in {time.perf_counter() - started:.2f}s")
+    logger.info(f"  Changed/new      : {changed}")
+    logger.info(f"  Dropped          : {dropped}")
+    logger.info(f"  Total in JSON    : {len(rebuilt)}")
+    logger.info(f"  Output           : {output}")
+    return rebuilt
+
+
+def verify_extractors(cache: HtmlCache, show: int = 5) -> int:
+    """
+    Run both extractors over every cached page and report differences.
+    Returns the number of pages whose records differ. The same check runs
+    on the checked-in fixtures in tests/test_extractors.py.
+    """
+    timings = {name: 0.0 for name in EXTRACTORS}
+    mismatches: list[tuple[str, dict | None, dict | None]] = []
+
+    logging.disable(logging.WARNING)  # Both extractors warn about the same pages
+    try:
+        for prompt_id, html in cache.items():
+            results = {}
+            for name, parse in EXTRACTORS.items():
+                started = time.perf_counter()
+                results[name] = parse(html, prompt_id)
+                timings[name] += time.perf_counter() - started
+            if results["bs4"] != results["stream"]:
+                mismatches.append((prompt_id, results["bs4"], results["stream"]))
+    finally:
+        logging.disable(logging.NOTSET)
+
+    for prompt_id, expected, got in mismatches[:show]:
+        logger.error(f"[{prompt_id}] Extractors disagree:")
+        logger.error(f"  bs4    : {json.dumps(expected, ensure_ascii=False)[:300]}")
+        logger.error(f"  stream : {json.dumps(got, ensure_ascii=False)[:300]}")
+
+    logger.info(f"Compared {len(cache)} cached pages: {len(mismatches)} mismatches")
+    for name, elapsed in timings.items():
+        logger.info(f"  {name:<7s}: {elapsed:.2f}s")
+    if timings["stream"] > 0:
+        logger.info(f"  speedup: {timings['bs4'] / timings['stream']:.1f}x")
+    return len(mismatches)
 
 # ---------------------------------------------------------------------------
 # Main
 # ---------------------------------------------------------------------------
 
-def main() -> None:
+def parse_args(argv: list[str] | None = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Crawl prompt pages into prompts.json.")
+    parser.add_argument("--start", type=int, default=START_ID, help="first ID to crawl")
+    parser.add_argument("--end", type=int, default=END_ID, help="last ID to crawl")
+    parser.add_argument(
+        "--discover", action="store_true",
+        help="find the last ID from the index page or by probing, instead of --end",
+    )
+    parser.add_argument(
+        "--concurrency", type=int, default=CONCURRENCY,
+        help=f"max requests in flight (default: {CONCURRENCY})",
+    )
+    parser.add_argument(
+        "--rate", type=float, default=1.0 / SLEEP_SECONDS,
+        help="max requests per second per host (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--base-url", default=BASE_URL,
+        help="fetch pages from this URL instead, e.g. a local stand-in server",
+    )
+    parser.add_argument(
+        "--pool-size", type=int, default=None,
+        help="keep-alive connections per host (default: --concurrency)",
+    )
+    parser.add_argument(
+        "--no-keep-alive", dest="keep_alive", action="store_false",
+        help="close the connection after every request (for comparison)",
+    )
+    parser.add_argument(
+        "--ca-bundle", type=Path, default=None,
+        help="CA certificate to trust, e.g. for a local HTTPS stand-in",
+    )
+    parser.add_argument(
+        "--timings-out", type=Path, default=None,
+        help="write per-request timings (JSONL) to this file",
+    )
+    parser.add_argument(
+        "--metrics-json", type=Path, default=METRICS_JSON,
+        help="JSON metrics summary written after the run",
+    )
+    parser.add_argument(
+        "--metrics-prom", type=Path, default=METRICS_PROM,
+        help="Prometheus textfile written after the run (and live)",
+    )
+    parser.add_argument(
+        "--metrics-interval", type=float, default=0,
+        help="log live counters and refresh the textfile every N seconds (0: off)",
+    )
+    parser.add_argument("--output", type=Path, default=OUTPUT_FILE, help="prompts JSON file")
+    parser.add_argument(
+        "--changeset", type=Path, default=None,
+        help="manifest of IDs changed since the last completed pipeline run"
+             " (default: data/changeset.json, only when --output is prompts.json)",
+    )
+    parser.add_argument(
+        "--no-changeset", action="store_true",
+        help="don't update the changeset (e.g. for shard outputs)",
+    )
+    parser.add_argument(
+        "--log-file", type=Path, default=LOG_FILE,
+        help=f"append the log to this file (default: {LOG_FILE.relative_to(PROJECT_DIR)})",
+    )
+    parser.add_argument(
+        "--state-db", type=Path, default=STATE_DB,
+        help="SQLite crawl state (status, retries, validators per ID)",
+    )
+    parser.add_argument(
+        "--state-journal", choices=JOURNAL_MODES, default="wal",
+        help="journal mode of --state-db; delete for a network filesystem (default: wal)",
+    )
+    parser.add_argument(
+        "--refresh", action="store_true",
+        help="also revisit IDs fetched more than --max-age hours ago, conditionally",
+    )
+    parser.add_argument(
+        "--max-age", type=float, default=MAX_AGE_HOURS,
+        help="hours after which --refresh revisits a page (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--cache-dir", type=Path, default=CACHE_DIR,
+        help="content-addressed store of fetched HTML",
+    )
+    parser.add_argument(
+        "--parse-workers", type=int, default=PARSE_WORKERS,
+        help="parser processes; 1 parses inline (default: CPU count)",
+    )
+    parser.add_argument(
+        "--extractor", choices=sorted(EXTRACTORS), default="bs4",
+        help="HTML extractor: BeautifulSoup tree or single-pass stream parser",
+    )
+    parser.add_argument(
+        "--verify-extractor", action="store_true",
+        help="check that both extractors agree on every cached page, then exit",
+    )
+    parser.add_argument(
+        "--reparse", action="store_true",
+        help="rebuild the output from cached HTML only (no network)",
+    )
+    args = parser.parse_args(argv)
+    if args.concurrency < 1:
+        parser.error("--concurrency must be at least 1")
+    if args.rate <= 0:
+        parser.error("--rate must be positive")
+    if args.pool_size is None:
+        args.pool_size = args.concurrency
+    if not args.base_url.endswith("/"):
+        args.base_url += "/"
+    if args.no_changeset:
+        args.changeset = None
+    elif args.changeset is None:
+        args.changeset = changeset.for_output(args.output)
+    return args
+
+
+def main(argv: list[str] | None = None) -> None:
+    args = parse_args(argv)
+    log_to_file(args.log_file)
+    cache = HtmlCache(args.cache_dir)
+    parse = EXTRACTORS[args.extractor]
+
+    if args.verify_extractor:
+        if verify_extractors(cache):
+            sys.exit(1)
+        return
+
+    base_hashes = None
+    if args.changeset is not None:
+        base_hashes = changeset.base_for_run(args.changeset, load_existing_data(args.output))
+
+    def write_changeset(prompts: list[Prompt]) -> None:
+        if base_hashes is not None:
+            manifest = changeset.write(args.changeset, base_hashes, prompts)
+            logger.info(f"Changeset: {changeset.summary(manifest)} -> {args.changeset}")
+
+    # Apply records left behind by an interrupted run before anything else
+    log_path = records_log_path(args.output)
+    if log_path.exists():
+        prompts, added, updated = compact_records(args.output, log_path)
+        logger.info(f"Recovered record log: {added} new, {updated} updated")
+        write_changeset(prompts)
+
+    if args.reparse:
+        parse_executor = make_parse_executor(args.parse_workers)
+        try:
+            prompts = reparse_cached(cache, args.output, parse_executor, parse)
+        finally:
+            if parse_executor:
+                parse_executor.shutdown()
+        write_changeset(prompts)
+        return
+
     logger.info("=" * 60)
     logger.info("Prompt Aggregator Crawler – Starting")
-    logger.info(f"Range: {START_ID:03d} ~ {END_ID:03d}")
+    logger.info(f"Range: {args.start:03d} ~ {'discover' if args.discover else f'{args.end:03d}'}")
+    logger.info(f"Concurrency: {args.concurrency}, rate limit: {args.rate:g} req/s per host")
     logger.info("=" * 60)
 
-    done = load_progress()
-    prompts = load_existing_data()
-    existing_ids = {p["id"] for p in prompts}
+    state = CrawlState(args.state_db, args.state_journal)
+    known_ids = {p.id for p in load_existing_data(args.output)}
+    if not len(state) and PROGRESS_FILE.exists():
+        imported = state.import_legacy(PROGRESS_FILE, VALIDATORS_FILE, known_ids)
+        logger.info(f"Imported {imported} IDs from {PROGRESS_FILE.name} into {args.state_db.name}")
 
-    total = END_ID - START_ID + 1
-    skipped = 0
-    fetched = 0
-    errors = 0
+    # A 304 only means "keep the stored record": where that record is gone
+    # (e.g. prompts.json was deleted), fetch the page in full instead
+    lost = [pid for pid, row in state.rows.items() if row["status"] == "ok" and pid not in known_ids]
+    if lost:
+        state.drop_validators(lost)
+        logger.warning(f"{len(lost)} IDs have no record in {args.output.name} - fetching them unconditionally")
 
-    for i in range(START_ID, END_ID + 1):
-        prompt_id = f"{i:03d}"
+    metrics = CrawlMetrics()
 
-        if prompt_id in done:
-            skipped += 1
-            continue
-
-        logger.info(f"[{prompt_id}] Fetching... ({i}/{total})")
+    def handle_page(
+        prompt_id: str, status: int | None, html: str | None, result: dict | None
+    ) -> None:
+        if status == 304:
+            # Short-circuit: the stored record is still current
+            metrics.count("not_modified")
+            state.record(prompt_id, "ok", status)
+            return
 
-        html = fetch_page(prompt_id)
+        if status == 404:
+            metrics.count("missing")
+            state.record(prompt_id, "missing", status)
+            return
 
         if html is None:
-            errors += 1
-            save_progress(prompt_id)  # Mark as processed to skip on resume
-            time.sleep(SLEEP_SECONDS)
-            continue
+            metrics.count("error")
+            state.record(prompt_id, "error", status)  # Retried after a backoff
+            return
+
+        cache.put(prompt_id, html)
 
-        result = parse_page(html, prompt_id)
+        if result:
+            # O(1) checkpoint: the record is durable before the state moves on
+            records_log.write(json.dumps(result, ensure_ascii=False) + "\n")
+            records_log.flush()
+            metrics.count("fetched")
+        else:
+            metrics.count("empty")
+
+        state.record(prompt_id, "ok" if result else "empty", status)
 
-        if result and result["id"] not in existing_ids:
-            prompts.append(result)
-            existing_ids.add(result["id"])
-            fetched += 1
+    def probe(n: int) -> bool:
+        prompt_id = f"{n:03d}"
+        status, html = fetch_page(prompt_id, args.base_url, limiter, state, session, metrics)
+        if status not in (200, 304, 404):
+            handle_page(prompt_id, status, None, None)
+            raise DiscoveryError(f"[{prompt_id}] no usable answer (HTTP {status})")
+        result = None
+        if html is not None:
+            result, seconds = timed_call(parse, html, prompt_id)
+            metrics.add_parse(seconds)
+        handle_page(prompt_id, status, html, result)
+        return status != 404
 
-        save_progress(prompt_id)
+    limiter = HostRateLimiter(args.rate)
+    session = make_session(args.pool_size, args.ca_bundle, args.keep_alive)
+    parse_executor = make_parse_executor(args.parse_workers)
+    records_log = open(log_path, "a", encoding="utf-8")
+    live = LiveReporter(metrics, args.metrics_interval, args.metrics_prom)
+    live.start()
+    try:
+        end = args.end
+        if args.discover:
+            with metrics.stage("discovery"):
+                try:
+                    end = discover_end(
+                        args.base_url, limiter, state, probe, args.start, session
+                    )
+                except DiscoveryError as e:
+                    logger.warning(f"Discovery aborted, crawling up to --end: {e}")
 
-        # Save incrementally every 50 pages
-        if fetched > 0 and fetched % 50 == 0:
-            save_data(prompts)
-            logger.info(f"  >> Checkpoint saved ({len(prompts)} total prompts)")
+        ids = [f"{i:03d}" for i in range(args.start, end + 1)]
+        todo = state.due_ids(ids, refresh=args.refresh, max_age=args.max_age * 3600,
+                             have=known_ids)
+        total = len(ids)
+        skipped = total - len(todo)
+        metrics.count("skipped", skipped)
 
-        time.sleep(SLEEP_SECONDS)
+        with metrics.stage("crawl"):
+            asyncio.run(
+                crawl_async(
+                    todo, handle_page, args.base_url, args.concurrency, limiter,
+                    state, parse_executor, parse, session, metrics,
+                )
+            )
+    finally:
+        live.stop()
+        if parse_executor:
+            parse_executor.shutdown()
+        session.close()
+        records_log.close()
+        # Compact into the sorted JSON (also on Ctrl+C)
+        with metrics.stage("compact"):
+            prompts, added, updated = compact_records(args.output, log_path)
+        metrics.count("new", added)
+        metrics.count("updated", updated)
+        status_counts = state.summary()
+        state.close()
+        write_changeset(prompts)
 
-    # Final save
-    # Sort by ID
-    prompts.sort(key=lambda p: p["id"])
-    save_data(prompts)
+        if args.timings_out:
+            metrics.write_requests_jsonl(args.timings_out)
+        metrics.write_json(args.metrics_json)
+        metrics.write_prometheus(args.metrics_prom)
 
     logger.info("=" * 60)
     logger.info("Crawl complete!")
     logger.info(f"  Total processed : {total}")
-    logger.info(f"  Skipped (resume): {skipped}")
-    logger.info(f"  Fetched          : {fetched}")
-    logger.info(f"  Errors/404       : {errors}")
+    logger.info(f"  Skipped (not due): {skipped}")
+    logger.info(f"  Fetched          : {metrics.outcomes['fetched']}")
+    logger.info(f"  New              : {added}")
+    logger.info(f"  Updated          : {updated}")
+    logger.info(f"  Not modified     : {metrics.outcomes['not_modified']}")
+    logger.info(f"  Missing (404)    : {metrics.outcomes['missing']}")
+    logger.info(f"  Errors (retry)   : {metrics.outcomes['error']}")
     logger.info(f"  Total in JSON    : {len(prompts)}")
-    logger.info(f"  Output           : {OUTPUT_FILE}")
+    logger.info(f"  Output           : {args.output}")
+    m = metrics.summary()
+    if m["requests"]:
+        total_ms, parse_ms = m["timings_ms"]["total"], m["timings_ms"]["parse"]
+        logger.info(
+            f"  Requests         : {m['requests']} ({m['retries']} retries,"
+            f" {m['new_connections']} new connections), {m['pages_per_s']:.2f} pages/s"
+        )
+        logger.info(
+            f"  Fetch time       : mean {total_ms['mean']:.1f} ms, p50 {total_ms['p50']:.1f} ms,"
+            f" p99 {total_ms['p99']:.1f} ms; parse mean"
+            f" {parse_ms.get('mean', 0.0):.2f} ms"
+        )
+        logger.info(
+            f"  Bytes            : {m['bytes']['wire']:,} on the wire /"
+            f" {m['bytes']['body']:,} decoded"
+        )
+    logger.info(f"  Metrics          : {args.metrics_json}, {args.metrics_prom}")
+    logger.info("  State            : " + ", ".join(f"{k}={v}" for k, v in sorted(status_counts.items())))
     logger.info("=" * 60)
 
 
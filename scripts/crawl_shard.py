@@ -0,0 +1,411 @@
+#!/usr/bin/env python3
+"""
+Sharded Crawl
+=============
+Splits the ID range into shards that several crawl_prompts.py workers
+claim through lease files in a shared directory, so the crawl can be
+spread over processes or machines without any ID being fetched twice.
+
+Layout of --shard-dir:
+  plan.json                 range, shard size, worker count, global rate
+  leases/001-050.lease      claimed shard: worker, token, expiry
+  done/001-050.done         finished shard
+  out/001-050.json          shard output (prompts.json format)
+  state/001-050.db          shard crawl state (resumed by the next owner;
+                            rollback journal, as WAL needs local disk)
+  metrics/001-050.{json,prom}
+
+Leases are created with O_EXCL, so exactly one worker wins a shard. The
+owner renews its lease every --lease-ttl / 3 seconds; an expired lease (a
+dead worker) is broken by renaming it away, which only one contender can
+do, and the shard is re-claimed and resumed from its state DB. A worker
+that finds its lease taken over stops its crawl. Expiry uses wall-clock
+time, so machines sharing the directory need roughly synchronised clocks.
+
+Each worker runs with --rate / workers, keeping the plan's global rate.
+`merge` feeds the shard outputs, in ID order, through the crawler's
+record-log compaction into prompts.json, so the result does not depend on
+which worker crawled what.
+
+Usage:
+  python crawl_shard.py plan --start 1 --end 999 --shard-size 50 --workers 4
+  python crawl_shard.py work                    # on each worker, in parallel
+  python crawl_shard.py work --merge -- --refresh
+  python crawl_shard.py status
+  python crawl_shard.py merge
+"""
+
+import _thread
+import argparse
+import json
+import os
+import socket
+import sys
+import threading
+import time
+import uuid
+from pathlib import Path
+
+import changeset
+import crawl_prompts
+from crawl_prompts import (
+    END_ID, OUTPUT_FILE, SLEEP_SECONDS, START_ID,
+    compact_records, load_existing_data, logger, records_log_path,
+)
+
+SCRIPT_DIR = Path(__file__).resolve().parent
+SHARD_DIR = SCRIPT_DIR / "shards"
+SHARD_SIZE = 50
+LEASE_TTL_SECONDS = 300
+
+# ---------------------------------------------------------------------------
+# Plan
+# ---------------------------------------------------------------------------
+
+def shard_name(first: int, last: int) -> str:
+    return f"{first:03d}-{last:03d}"
+
+
+def make_plan(start: int, end: int, shard_size: int, workers: int, rate: float) -> dict:
+    shards = [
+        [first, min(first + shard_size - 1, end)]
+        for first in range(start, end + 1, shard_size)
+    ]
+    return {
+        "start": start,
+        "end": end,
+        "shard_size": shard_size,
+        "workers": workers,
+        "rate": rate,
+        "round": time.strftime("%Y%m%dT%H%M%S"),
+        "shards": shards,
+    }
+
+
+def _write_json_atomic(path: Path, data: dict) -> None:
+    tmp = path.with_name(f"{path.name}.tmp{os.getpid()}")
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False, indent=2)
+    os.replace(tmp, path)
+
+
+def _read_json(path: Path) -> dict | None:
+    """Contents of a small JSON file, or None if missing or half-written."""
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+
+
+class ShardDir:
+    def __init__(self, root: Path = SHARD_DIR) -> None:
+        self.root = root
+        self.plan_file = root / "plan.json"
+        self.leases = root / "leases"
+        self.done = root / "done"
+        self.out = root / "out"
+        self.state = root / "state"
+        self.metrics = root / "metrics"
+
+    def write_plan(self, plan: dict) -> None:
+        """Start a new round: outputs and state are kept, leases and done markers reset."""
+        for d in (self.leases, self.done, self.out, self.state, self.metrics):
+            d.mkdir(parents=True, exist_ok=True)
+        for d in (self.leases, self.done):
+            for path in d.iterdir():
+                path.unlink(missing_ok=True)
+        _write_json_atomic(self.plan_file, plan)
+
+    def load_plan(self) -> dict:
+        plan = _read_json(self.plan_file)
+        if plan is None:
+            raise SystemExit(f"No plan in {self.root} - run `crawl_shard.py plan` first.")
+        return plan
+
+    def shards(self) -> list[tuple[str, int, int]]:
+        return [(shard_name(a, b), a, b) for a, b in self.load_plan()["shards"]]
+
+    def is_done(self, name: str) -> bool:
+        return (self.done / f"{name}.done").exists()
+
+    def lease_info(self, name: str) -> dict | None:
+        return _read_json(self.leases / f"{name}.lease")
+
+# ---------------------------------------------------------------------------
+# Leases
+# ---------------------------------------------------------------------------
+
+class Lease:
+    """An exclusive, expiring claim on one shard."""
+
+    def __init__(self, shards: ShardDir, name: str, worker: str, ttl: float) -> None:
+        self.path = shards.leases / f"{name}.lease"
+        self.name = name
+        self.worker = worker
+        self.ttl = ttl
+        self.token = uuid.uuid4().hex
+        self.lost = threading.Event()
+        self._stop = threading.Event()
+        self._heartbeat: threading.Thread | None = None
+
+    def _content(self) -> dict:
+        return {"worker": self.worker, "token": self.token, "expires": time.time() + self.ttl}
+
+    def acquire(self) -> bool:
+        """Create the lease file, breaking it first if its owner let it expire."""
+        for _ in range(2):
+            try:
+                fd = os.open(self.path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+            except FileExistsError:
+                if not self._break_expired():
+                    return False
+                continue
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(self._content(), f)
+            return True
+        return False
+
+    def _break_expired(self) -> bool:
+        info = _read_json(self.path)
+        now = time.time()
+        if info is not None:
+            if info.get("expires", 0) > now:
+                return False
+        else:
+            # Being written right now, or its writer died mid-write
+            try:
+                if self.path.stat().st_mtime + self.ttl > now:
+                    return False
+            except FileNotFoundError:
+                return True
+        stale = self.path.with_name(f"{self.path.name}.stale-{self.token}")
+        try:
+            os.rename(self.path, stale)  # Only one contender can move it
+        except FileNotFoundError:
+            return False
+        stale.unlink(missing_ok=True)
+        logger.warning(f"[{self.name}] Broke expired lease of {info and info.get('worker')}")
+        return True
+
+    def renew(self) -> bool:
+        info = _read_json(self.path)
+        if info is None or info.get("token") != self.token:
+            return False
+        _write_json_atomic(self.path, self._content())
+        return True
+
+    def start_heartbeat(self, on_lost) -> None:
+        def beat() -> None:
+            while not self._stop.wait(self.ttl / 3):
+                if not self.renew():
+                    logger.error(f"[{self.name}] Lease lost to another worker - stopping.")
+                    self.lost.set()
+                    on_lost()
+                    return
+
+        self._heartbeat = threading.Thread(target=beat, name=f"lease-{self.name}", daemon=True)
+        self._heartbeat.start()
+
+    def release(self) -> None:
+        self._stop.set()
+        if self._heartbeat is not None:
+            self._heartbeat.join()
+        info = _read_json(self.path)
+        if info is not None and info.get("token") == self.token:
+            self.path.unlink(missing_ok=True)
+
+# ---------------------------------------------------------------------------
+# Worker
+# ---------------------------------------------------------------------------
+
+def crawl_shard(shards: ShardDir, name: str, first: int, last: int, rate: float,
+                extra_args: list[str]) -> None:
+    """Run crawl_prompts on one shard with its own output, state and metrics."""
+    crawl_prompts.main([
+        "--start", str(first),
+        "--end", str(last),
+        "--rate", str(rate),
+        "--output", str(shards.out / f"{name}.json"),
+        "--state-db", str(shards.state / f"{name}.db"),
+        "--state-journal", "delete",  # WAL does not work on a network share
+        "--metrics-json", str(shards.metrics / f"{name}.json"),
+        "--metrics-prom", str(shards.metrics / f"{name}.prom"),
+        "--no-changeset",  # merge() records the changes to the real output
+        *extra_args,
+    ])
+
+
+def work(shards: ShardDir, worker: str, ttl: float, extra_args: list[str]) -> int:
+    """Claim and crawl shards until none is left. Returns the number crawled."""
+    plan = shards.load_plan()
+    rate = plan["rate"] / max(plan["workers"], 1)
+    logger.info(f"Worker {worker}: round {plan['round']}, {rate:g} req/s")
+
+    crawled = 0
+    for name, first, last in shards.shards():
+        if shards.is_done(name):
+            continue
+        lease = Lease(shards, name, worker, ttl)
+        if not lease.acquire():
+            continue
+
+        # A lease claimed from a finished worker that had not released yet
+        if shards.is_done(name):
+            lease.release()
+            continue
+
+        logger.info(f"[{name}] Claimed by {worker}")
+        lease.start_heartbeat(_thread.interrupt_main)
+        try:
+            crawl_shard(shards, name, first, last, rate, extra_args)
+        except KeyboardInterrupt:
+            if not lease.lost.is_set():
+                raise  # A real Ctrl+C, not the heartbeat stopping us
+        finally:
+            lease.release()
+
+        if lease.lost.is_set():
+            continue
+        _write_json_atomic(
+            shards.done / f"{name}.done",
+            {"worker": worker, "finished": time.time(), "round": plan["round"]},
+        )
+        crawled += 1
+    return crawled
+
+
+def merge(
+    shards: ShardDir,
+    output: Path,
+    require_complete: bool = False,
+    changeset_path: Path | None = changeset.CHANGESET_FILE,
+) -> None:
+    """Compact every finished shard's records into `output`, in ID order."""
+    pending = [name for name, _, _ in shards.shards() if not shards.is_done(name)]
+    if pending:
+        if require_complete:
+            raise SystemExit(f"{len(pending)} shards not done: {', '.join(pending[:10])}")
+        logger.warning(f"Merging without {len(pending)} unfinished shards")
+
+    base = None
+    if changeset_path is not None:
+        base = changeset.base_for_run(changeset_path, load_existing_data(output))
+
+    log_path = records_log_path(output)
+    output.parent.mkdir(parents=True, exist_ok=True)
+    with open(log_path, "a", encoding="utf-8") as log:
+        for name, _, _ in shards.shards():
+            if name in pending:
+                continue
+            for record in load_existing_data(shards.out / f"{name}.json"):
+                log.write(json.dumps(record.to_dict(), ensure_ascii=False) + "\n")
+    prompts, added, updated = compact_records(output, log_path)
+    logger.info(f"Merged into {output}: {added} new, {updated} updated, {len(prompts)} total")
+    if base is not None:
+        manifest = changeset.write(changeset_path, base, prompts)
+        logger.info(f"Changeset: {changeset.summary(manifest)} -> {changeset_path}")
+
+
+def try_merge(shards: ShardDir, output: Path, changeset_path: Path | None) -> None:
+    """Merge once every shard is done; the first worker to get here does it."""
+    if not all(shards.is_done(name) for name, _, _ in shards.shards()):
+        logger.info("Other shards still running - leaving the merge to the last worker.")
+        return
+    marker = shards.done / "merged"
+    try:
+        os.close(os.open(marker, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+    except FileExistsError:
+        return
+    merge(shards, output, require_complete=True, changeset_path=changeset_path)
+
+
+def status(shards: ShardDir) -> None:
+    now = time.time()
+    counts = {"done": 0, "leased": 0, "pending": 0}
+    for name, _, _ in shards.shards():
+        if shards.is_done(name):
+            counts["done"] += 1
+            continue
+        info = shards.lease_info(name)
+        if info is not None and info.get("expires", 0) > now:
+            counts["leased"] += 1
+            print(f"  {name}  {info['worker']}  (expires in {info['expires'] - now:.0f}s)")
+        else:
+            counts["pending"] += 1
+    print(", ".join(f"{k}: {v}" for k, v in counts.items()))
+
+# ---------------------------------------------------------------------------
+# Main
+# ---------------------------------------------------------------------------
+
+def parse_args(argv: list[str] | None = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Sharded multi-worker crawl.")
+    parser.add_argument("--shard-dir", type=Path, default=SHARD_DIR, help="shared directory")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("plan", help="split the range into shards and start a new round")
+    p.add_argument("--start", type=int, default=START_ID)
+    p.add_argument("--end", type=int, default=END_ID)
+    p.add_argument("--shard-size", type=int, default=SHARD_SIZE)
+    p.add_argument("--workers", type=int, default=1, help="workers sharing the rate budget")
+    p.add_argument(
+        "--rate", type=float, default=1.0 / SLEEP_SECONDS,
+        help="global requests per second, split across workers (default: %(default)s)",
+    )
+
+    p = sub.add_parser("work", help="claim and crawl shards until none is left",
+                       epilog="Arguments after -- are passed to crawl_prompts.py.")
+    p.add_argument("--worker-id", default=f"{socket.gethostname()}:{os.getpid()}")
+    p.add_argument("--lease-ttl", type=float, default=LEASE_TTL_SECONDS)
+    p.add_argument("--merge", action="store_true", help="merge when the last shard is done")
+    p.add_argument("--output", type=Path, default=OUTPUT_FILE)
+    p.add_argument("--changeset", type=Path, default=None,
+                   help="default: data/changeset.json when --output is prompts.json")
+
+    sub.add_parser("status", help="show done / leased / pending shards")
+
+    p = sub.add_parser("merge", help="merge finished shard outputs into prompts.json")
+    p.add_argument("--output", type=Path, default=OUTPUT_FILE)
+    p.add_argument("--changeset", type=Path, default=None,
+                   help="default: data/changeset.json when --output is prompts.json")
+    p.add_argument("--require-complete", action="store_true")
+
+    argv = sys.argv[1:] if argv is None else argv
+    extra = []
+    if "--" in argv:
+        split = argv.index("--")
+        argv, extra = argv[:split], argv[split + 1:]
+    args = parser.parse_args(argv)
+    args.crawler_args = extra
+    if getattr(args, "output", None) is not None and args.changeset is None:
+        args.changeset = changeset.for_output(args.output)
+    return args
+
+
+def main(argv: list[str] | None = None) -> None:
+    args = parse_args(argv)
+    crawl_prompts.log_to_file(crawl_prompts.LOG_FILE)
+    shards = ShardDir(args.shard_dir)
+
+    if args.command == "plan":
+        plan = make_plan(args.start, args.end, args.shard_size, args.workers, args.rate)
+        shards.write_plan(plan)
+        logger.info(
+            f"Planned {len(plan['shards'])} shards of {args.shard_size} IDs"
+            f" ({args.start:03d} ~ {args.end:03d}) for {args.workers} workers,"
+            f" {args.rate:g} req/s in total"
+        )
+    elif args.command == "work":
+        crawled = work(shards, args.worker_id, args.lease_ttl, args.crawler_args)
+        logger.info(f"Worker {args.worker_id}: {crawled} shards crawled, none left to claim")
+        if args.merge:
+            try_merge(shards, args.output, args.changeset)
+    elif args.command == "status":
+        status(shards)
+    elif args.command == "merge":
+        merge(shards, args.output, args.require_complete, args.changeset)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,275 @@
+"""
+Crawl State Store
+=================
+SQLite record of every ID the crawler has tried, replacing progress.log
+and validators.json.
+
+Each row holds the last outcome (status + HTTP code), attempt counters,
+fetch times and the page's ETag / Last-Modified. Failed IDs are retried
+with exponential backoff; with --refresh, IDs whose last successful fetch
+is older than --max-age are revisited too. An "ok" ID whose record is no
+longer in the output (e.g. prompts.json was deleted) is always due.
+
+Statuses:
+  ok       200 with a prompt, or 304 Not Modified
+  empty    200 but parse_page() found no prompt
+  missing  404 (rechecked on refresh after MISSING_RECHECK_SECONDS)
+  error    timeout, connection error or other HTTP status (retried)
+
+Dead ranges are runs of IDs believed not to exist without fetching each
+one (gaps in the index page, the space above the discovered upper bound).
+Unfetched IDs inside an unexpired dead range are skipped.
+
+The database runs in WAL mode by default. WAL needs shared memory between
+the processes using the file, which network filesystems do not provide, so
+a state DB kept on a shared directory (crawl_shard.py) uses journal_mode
+DELETE instead.
+"""
+
+import json
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Iterable
+
+SCRIPT_DIR = Path(__file__).resolve().parent
+STATE_DB = SCRIPT_DIR / "crawl_state.db"
+
+JOURNAL_MODES = ("wal", "delete")
+
+RETRY_BASE_SECONDS = 600             # First retry after 10 min, then 20, 40, ...
+RETRY_MAX_SECONDS = 24 * 3600
+MISSING_RECHECK_SECONDS = 7 * 24 * 3600
+DEAD_RANGE_RECHECK_SECONDS = 7 * 24 * 3600
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS pages (
+    id            TEXT PRIMARY KEY,
+    status        TEXT NOT NULL,
+    http_status   INTEGER,
+    attempts      INTEGER NOT NULL DEFAULT 0,  -- all fetches of this ID
+    failures      INTEGER NOT NULL DEFAULT 0,  -- consecutive errors (backoff)
+    last_fetch    REAL,
+    last_success  REAL,
+    next_eligible REAL,
+    etag          TEXT,
+    last_modified TEXT
+);
+CREATE TABLE IF NOT EXISTS dead_ranges (
+    first_id   INTEGER NOT NULL,
+    last_id    INTEGER NOT NULL,
+    source     TEXT NOT NULL,               -- "index" or "probe"
+    checked_at REAL NOT NULL,
+    PRIMARY KEY (first_id, last_id)
+);
+"""
+
+
+def retry_delay(failures: int) -> float:
+    """Exponential backoff after `failures` consecutive errors."""
+    return min(RETRY_BASE_SECONDS * 2 ** (failures - 1), RETRY_MAX_SECONDS)
+
+
+class CrawlState:
+    def __init__(self, path: Path = STATE_DB, journal_mode: str = "wal") -> None:
+        if journal_mode not in JOURNAL_MODES:
+            raise ValueError(f"journal_mode must be one of {JOURNAL_MODES}, not {journal_mode!r}")
+        self.path = path
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self.conn = sqlite3.connect(path)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute(f"PRAGMA journal_mode={journal_mode}")
+        # NORMAL is crash-safe with WAL; a rollback journal needs FULL
+        self.conn.execute(f"PRAGMA synchronous={'NORMAL' if journal_mode == 'wal' else 'FULL'}")
+        self.conn.executescript(SCHEMA)
+        self._lock = threading.Lock()
+        self._load()
+
+    def _load(self) -> None:
+        self.rows: dict[str, sqlite3.Row] = {
+            row["id"]: row for row in self.conn.execute("SELECT * FROM pages")
+        }
+        # Validators are read/written from fetch threads; rows only on the loop thread
+        self._validators: dict[str, dict[str, str]] = {
+            pid: {k: v for k, v in (("etag", row["etag"]), ("last_modified", row["last_modified"])) if v}
+            for pid, row in self.rows.items()
+        }
+        self.dead: list[tuple[int, int, float]] = [
+            (row["first_id"], row["last_id"], row["checked_at"])
+            for row in self.conn.execute("SELECT * FROM dead_ranges ORDER BY first_id")
+        ]
+
+    def close(self) -> None:
+        self.conn.close()
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+    # --- migration ---------------------------------------------------------
+
+    def import_legacy(
+        self, progress_file: Path, validators_file: Path, known_ids: set[str]
+    ) -> int:
+        """
+        One-time import of progress.log / validators.json into an empty store.
+
+        progress.log recorded failures like successes, so only IDs that made
+        it into prompts.json count as ok; the rest are queued for a retry.
+        """
+        if self.rows or not progress_file.exists():
+            return 0
+        with open(progress_file, "r", encoding="utf-8") as f:
+            ids = {line.strip() for line in f if line.strip()}
+        validators = {}
+        if validators_file.exists():
+            with open(validators_file, "r", encoding="utf-8") as f:
+                try:
+                    validators = json.load(f)
+                except json.JSONDecodeError:
+                    pass
+
+        mtime = progress_file.stat().st_mtime
+        with self.conn:
+            for pid in sorted(ids):
+                ok = pid in known_ids
+                v = validators.get(pid, {}) if ok else {}
+                self.conn.execute(
+                    "INSERT INTO pages (id, status, attempts, last_fetch, last_success,"
+                    " next_eligible, etag, last_modified) VALUES (?, ?, 1, ?, ?, ?, ?, ?)",
+                    (pid, "ok" if ok else "error", mtime, mtime if ok else None,
+                     None if ok else 0.0, v.get("etag"), v.get("last_modified")),
+                )
+        self._load()
+        return len(ids)
+
+    # --- scheduling --------------------------------------------------------
+
+    def in_dead_range(self, prompt_id: str, now: float) -> bool:
+        if not prompt_id.isdigit():
+            return False
+        n = int(prompt_id)
+        return any(
+            first <= n <= last and checked_at + DEAD_RANGE_RECHECK_SECONDS > now
+            for first, last, checked_at in self.dead
+        )
+
+    def is_due(
+        self, prompt_id: str, now: float, refresh: bool, max_age: float,
+        have: set[str] | None = None,
+    ) -> bool:
+        """Should this ID be fetched in the current run?
+
+        `have` is the set of IDs in the output; an "ok" ID missing from it
+        lost its record and is due regardless of age.
+        """
+        row = self.rows.get(prompt_id)
+        if row is None:
+            return not self.in_dead_range(prompt_id, now)
+        if row["status"] == "error":
+            return (row["next_eligible"] or 0.0) <= now
+        if row["status"] == "ok" and have is not None and prompt_id not in have:
+            return True
+        if not refresh:
+            return False
+        if row["status"] == "missing":
+            return (row["next_eligible"] or 0.0) <= now
+        return (row["last_success"] or 0.0) <= now - max_age
+
+    def due_ids(
+        self, ids: list[str], refresh: bool = False, max_age: float = 0.0,
+        have: set[str] | None = None,
+    ) -> list[str]:
+        now = time.time()
+        return [pid for pid in ids if self.is_due(pid, now, refresh, max_age, have)]
+
+    def max_live_id(self) -> int:
+        """Highest numeric ID that has answered 200/304, or 0."""
+        live = [int(pid) for pid, row in self.rows.items()
+                if pid.isdigit() and row["status"] in ("ok", "empty")]
+        return max(live, default=0)
+
+    # --- dead ranges -------------------------------------------------------
+
+    def set_dead_ranges(self, ranges: list[tuple[int, int]], source: str) -> None:
+        """Replace the dead ranges from one discovery source."""
+        now = time.time()
+        with self.conn:
+            self.conn.execute("DELETE FROM dead_ranges WHERE source = ?", (source,))
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO dead_ranges (first_id, last_id, source, checked_at)"
+                " VALUES (?, ?, ?, ?)",
+                [(first, last, source, now) for first, last in ranges],
+            )
+        self._load()
+
+    # --- validators (fetch_page interface) ---------------------------------
+
+    def request_headers(self, prompt_id: str) -> dict[str, str]:
+        """Conditional request headers for a page we have seen before."""
+        with self._lock:
+            entry = self._validators.get(prompt_id, {})
+        headers = {}
+        if "etag" in entry:
+            headers["If-None-Match"] = entry["etag"]
+        if "last_modified" in entry:
+            headers["If-Modified-Since"] = entry["last_modified"]
+        return headers
+
+    def drop_validators(self, ids: Iterable[str]) -> None:
+        """Send the next request for `ids` unconditionally (their record was lost)."""
+        with self._lock:
+            for prompt_id in ids:
+                self._validators.pop(prompt_id, None)
+
+    def update(self, prompt_id: str, response_headers) -> None:
+        """Remember the validators of a 200 response (saved by record())."""
+        entry = {}
+        if response_headers.get("ETag"):
+            entry["etag"] = response_headers["ETag"]
+        if response_headers.get("Last-Modified"):
+            entry["last_modified"] = response_headers["Last-Modified"]
+        with self._lock:
+            self._validators[prompt_id] = entry
+
+    # --- outcomes ----------------------------------------------------------
+
+    def record(self, prompt_id: str, status: str, http_status: int | None) -> None:
+        """Persist the outcome of one fetch."""
+        now = time.time()
+        old = self.rows.get(prompt_id)
+        if http_status == 304 and old is not None and old["status"] == "empty":
+            status = "empty"  # Not Modified keeps what the page was
+        attempts = (old["attempts"] if old else 0) + 1
+        failures = (old["failures"] if old else 0) + 1 if status == "error" else 0
+        last_success = now if status in ("ok", "empty") else (old["last_success"] if old else None)
+
+        if status == "error":
+            next_eligible = now + retry_delay(failures)
+        elif status == "missing":
+            next_eligible = now + MISSING_RECHECK_SECONDS
+        else:
+            next_eligible = None
+
+        with self._lock:
+            if status in ("ok", "empty"):
+                entry = self._validators.get(prompt_id, {})
+            else:
+                entry = {}
+                self._validators.pop(prompt_id, None)
+
+        with self.conn:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO pages (id, status, http_status, attempts, failures,"
+                " last_fetch, last_success, next_eligible, etag, last_modified)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (prompt_id, status, http_status, attempts, failures, now, last_success,
+                 next_eligible, entry.get("etag"), entry.get("last_modified")),
+            )
+        self.rows[prompt_id] = self.conn.execute(
+            "SELECT * FROM pages WHERE id = ?", (prompt_id,)
+        ).fetchone()
+
+    def summary(self) -> dict[str, int]:
+        """Number of IDs per status."""
+        return dict(self.conn.execute("SELECT status, COUNT(*) FROM pages GROUP BY status"))
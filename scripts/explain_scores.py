@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+"""
+Explain Category Scores
+=======================
+Answers "why did this prompt get these tags?" from the score matrix written
+by `categorize_prompts.py --explain` (or `category_engine.py --explain`),
+without re-running the classifier.
+
+Usage:
+  python explain_scores.py show 123              # scores and keyword hits for a prompt
+  python explain_scores.py near [--margin 0.1]   # just below the secondary threshold
+  python explain_scores.py keyword 要約          # prompts a keyword matched
+  python explain_scores.py close [--gap 1]       # primary category nearly tied
+
+Requires numpy.
+"""
+
+import argparse
+import io
+import json
+import sys
+from pathlib import Path
+
+import numpy as np
+
+if sys.platform == "win32":
+    sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding="utf-8", errors="replace")
+
+PROJECT_DIR = Path(__file__).resolve().parent.parent
+EXPLAIN_FILE = PROJECT_DIR / "data" / "category_scores.npz"
+SECONDARY_RATIO = 0.6
+
+
+class Explain:
+    """The arrays of one --explain run."""
+
+    def __init__(self, path: Path) -> None:
+        with np.load(path, allow_pickle=False) as data:
+            self.__dict__.update({name: data[name] for name in data.files})
+        self.meta = json.loads(str(self.meta))
+        self.row = {pid: i for i, pid in enumerate(self.ids.tolist())}
+        self.ratio = self.meta["weights"].get("ratio", SECONDARY_RATIO)
+
+    def hits(self, i: int) -> tuple[np.ndarray, np.ndarray]:
+        lo, hi = self.indptr[i], self.indptr[i + 1]
+        return self.keyword[lo:hi], self.in_title[lo:hi]
+
+    def tags(self, i: int) -> list[str]:
+        row = self.scores[i]
+        top = row.max()
+        order = np.argsort(-row, kind="stable")
+        return [str(self.categories[c]) for c in order if row[c] > 0 and row[c] >= top * self.ratio]
+
+
+def cmd_show(ex: Explain, args: argparse.Namespace) -> None:
+    if args.id not in ex.row:
+        sys.exit(f"No prompt {args.id} in the explain data")
+    i = ex.row[args.id]
+    row = ex.scores[i]
+    print(f"{args.id}: {ex.titles[i]}")
+    print(f"  tags: {', '.join(ex.tags(i)) or '(fallback)'}")
+    top = row.max()
+    for c in np.argsort(-row, kind="stable"):
+        if row[c] <= 0:
+            continue
+        marker = "*" if row[c] >= top * ex.ratio else " "
+        print(f"  {marker} {ex.categories[c]:<20s} {row[c]:>5.1f}  ({row[c] / top:.0%} of top)")
+        contributions = []
+        n_kw = len(ex.keywords)
+        for k, title in zip(*ex.hits(i)):
+            w = ex.keyword_weights[k + n_kw * title, c]
+            if w:
+                contributions.append(f"{ex.keywords[k]}{'(title)' if title else ''} +{w:g}")
+        print(f"      {', '.join(contributions)}")
+
+
+def cmd_near(ex: Explain, args: argparse.Namespace) -> None:
+    """Categories scoring within `margin` below the secondary threshold."""
+    top = ex.scores.max(axis=1, keepdims=True)
+    rel = np.divide(ex.scores, top, out=np.zeros_like(ex.scores), where=top > 0)
+    rows, cats = np.nonzero((rel < ex.ratio) & (rel >= ex.ratio - args.margin) & (ex.scores > 0))
+    order = np.argsort(-rel[rows, cats], kind="stable")
+    print(f"{len(rows)} prompt/category pairs within {args.margin:.0%} below the"
+          f" {ex.ratio:.0%} threshold")
+    for j in order[: args.limit]:
+        i, c = rows[j], cats[j]
+        print(f"  {ex.ids[i]}  {ex.categories[c]:<20s} {ex.scores[i, c]:>5.1f} / {top[i, 0]:<5.1f}"
+              f" ({rel[i, c]:.0%})  {ex.titles[i][:40]}")
+
+
+def cmd_keyword(ex: Explain, args: argparse.Namespace) -> None:
+    matches = np.nonzero(ex.keywords == args.keyword.lower())[0]
+    if not len(matches):
+        sys.exit(f"{args.keyword!r} is not a rule keyword")
+    k = matches[0]
+    rows = np.searchsorted(ex.indptr, np.nonzero(ex.keyword == k)[0], side="right") - 1
+    in_title = ex.in_title[ex.keyword == k]
+    print(f"{args.keyword!r} matched {len(rows)} prompts ({int(in_title.sum())} in the title)")
+    for i, title in list(zip(rows, in_title))[: args.limit]:
+        print(f"  {ex.ids[i]}  {'title' if title else 'body ':<5s}  {ex.titles[i][:50]}")
+
+
+def cmd_close(ex: Explain, args: argparse.Namespace) -> None:
+    """Prompts whose two best categories are within `gap` points."""
+    ranked = -np.sort(-ex.scores, axis=1)
+    gap = ranked[:, 0] - ranked[:, 1]
+    rows = np.nonzero((ranked[:, 1] > 0) & (gap <= args.gap))[0]
+    print(f"{len(rows)} prompts with the top two categories within {args.gap:g} points")
+    for i in rows[: args.limit]:
+        print(f"  {ex.ids[i]}  {', '.join(ex.tags(i)[:2]):<40s} gap {gap[i]:g}  {ex.titles[i][:30]}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Query category scores saved by --explain.")
+    parser.add_argument("--file", type=Path, default=EXPLAIN_FILE)
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument("--limit", type=int, default=30, help="rows to print")
+    sub = parser.add_subparsers(dest="command", required=True)
+    show = sub.add_parser("show", help="scores and contributing keywords of one prompt")
+    show.add_argument("id")
+    near = sub.add_parser("near", parents=[common], help="categories just below the secondary threshold")
+    near.add_argument("--margin", type=float, default=0.1, help="fraction of the top score")
+    keyword = sub.add_parser("keyword", parents=[common], help="prompts a keyword matched")
+    keyword.add_argument("keyword")
+    close = sub.add_parser("close", parents=[common], help="prompts whose primary category is nearly tied")
+    close.add_argument("--gap", type=float, default=1.0, help="score difference")
+    args = parser.parse_args()
+
+    ex = Explain(args.file)
+    {"show": cmd_show, "near": cmd_near, "keyword": cmd_keyword, "close": cmd_close}[args.command](ex, args)
+
+
+if __name__ == "__main__":
+    main()
@@ -7,19 +7,26 @@ prompts.json を Dify Knowledge Base 用の個別テキストファイルに変
   dify/knowledge_base/prompt_001.txt ~ prompt_XXX.txt
   dify/batches/batch_01.zip ~ batch_XX.zip  (20ファイルずつ)
   dify/knowledge_base_all.zip              (全件一括)
+
+--changeset を付けると、追加・更新されたプロンプトのテキストだけを書き直し、
+削除されたものを消し、中身が変わったバッチ ZIP だけを作り直す。
 """
 
+import argparse
 import io
-import json
 import os
 import sys
 import zipfile
+from pathlib import Path
+
+import changeset
+import prompt_store
 
 sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding="utf-8", errors="replace")
 
 SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
 PROJECT_DIR = os.path.dirname(SCRIPT_DIR)
-DATA_PATH = os.path.join(PROJECT_DIR, "data", "prompts.json")
+DATA_PATH = str(prompt_store.DATA_FILE)
 KB_DIR = os.path.join(PROJECT_DIR, "dify", "knowledge_base")
 BATCH_DIR = os.path.join(PROJECT_DIR, "dify", "batches")
 ALL_ZIP_PATH = os.path.join(PROJECT_DIR, "dify", "knowledge_base_all.zip")
@@ -28,8 +35,7 @@ BATCH_SIZE = 20  # Dify の 1回アップロード上限
 
 
 def load_prompts():
-    with open(DATA_PATH, "r", encoding="utf-8") as f:
-        return json.load(f)
+    return prompt_store.open_store(DATA_PATH).load()
 
 
 def format_prompt(p):
@@ -49,32 +55,64 @@ def format_prompt(p):
 """.strip()
 
 
-def export_text_files(prompts):
-    """個別テキストファイルとして出力"""
+def export_text_files(prompts, only=None):
+    """個別テキストファイルとして出力 (only を指定するとその ID だけ書き直す)"""
     os.makedirs(KB_DIR, exist_ok=True)
     paths = []
+    written = set()
     for p in prompts:
         filename = f"prompt_{p['id']}.txt"
         filepath = os.path.join(KB_DIR, filename)
-        content = format_prompt(p)
-        with open(filepath, "w", encoding="utf-8") as f:
-            f.write(content)
+        if only is None or p["id"] in only or not os.path.exists(filepath):
+            content = format_prompt(p)
+            with open(filepath, "w", encoding="utf-8") as f:
+                f.write(content)
+            written.add(filename)
         paths.append((filename, filepath))
-    return paths
+    return paths, written
+
+
+def remove_text_files(prompt_ids):
+    """削除されたプロンプトのテキストファイルを消す"""
+    for pid in prompt_ids:
+        filepath = os.path.join(KB_DIR, f"prompt_{pid}.txt")
+        if os.path.exists(filepath):
+            os.remove(filepath)
+
 
+def _zip_names(zip_path):
+    try:
+        with zipfile.ZipFile(zip_path) as zf:
+            return zf.namelist()
+    except (FileNotFoundError, zipfile.BadZipFile):
+        return None
 
-def create_batch_zips(file_paths):
-    """20ファイルずつの ZIP バッチを作成"""
+
+def create_batch_zips(file_paths, changed=None):
+    """20ファイルずつの ZIP バッチを作成 (changed 指定時は変わったバッチだけ)"""
     os.makedirs(BATCH_DIR, exist_ok=True)
     batch_count = 0
     for i in range(0, len(file_paths), BATCH_SIZE):
         batch_count += 1
         batch = file_paths[i : i + BATCH_SIZE]
         zip_path = os.path.join(BATCH_DIR, f"batch_{batch_count:02d}.zip")
+        names = [filename for filename, _ in batch]
+        if (
+            changed is not None
+            and _zip_names(zip_path) == names
+            and not changed.intersection(names)
+        ):
+            continue
         with zipfile.ZipFile(zip_path, "w", zipfile.ZIP_DEFLATED) as zf:
             for filename, filepath in batch:
                 zf.write(filepath, filename)
         print(f"  batch_{batch_count:02d}.zip ({len(batch)} files)")
+
+    # 件数が減ったときに残る古いバッチを削除
+    extra = batch_count + 1
+    while os.path.exists(os.path.join(BATCH_DIR, f"batch_{extra:02d}.zip")):
+        os.remove(os.path.join(BATCH_DIR, f"batch_{extra:02d}.zip"))
+        extra += 1
     return batch_count
 
 
@@ -86,20 +124,41 @@ def create_all_zip(file_paths):
 
 
 def main():
+    parser = argparse.ArgumentParser(description="prompts.json を Dify 用にエクスポート")
+    parser.add_argument(
+        "--changeset", nargs="?", type=Path, const=changeset.CHANGESET_FILE, default=None,
+        help="変更のあったプロンプトだけを書き出す",
+    )
+    args = parser.parse_args()
+
     print("=== Dify Knowledge Base エクスポート ===\n")
 
     # 1. データ読み込み
     prompts = load_prompts()
     print(f"読み込み: {len(prompts)} 件\n")
 
+    only = None
+    if args.changeset is not None:
+        manifest = changeset.load(args.changeset)
+        if manifest is None:
+            print(f"changeset がありません ({args.changeset}) - 全件を出力します\n")
+        else:
+            only = changeset.changed_ids(manifest)
+            print(f"changeset: {changeset.summary(manifest)}\n")
+            remove_text_files(manifest["removed"])
+
     # 2. 個別テキストファイル生成
     print("個別テキストファイルを生成中...")
-    file_paths = export_text_files(prompts)
-    print(f"  -> {len(file_paths)} ファイル生成完了: dify/knowledge_base/\n")
+    file_paths, written = export_text_files(prompts, only)
+    print(f"  -> {len(written)} / {len(file_paths)} ファイル生成完了: dify/knowledge_base/\n")
+
+    if only is not None and not written and not manifest["removed"] and os.path.exists(ALL_ZIP_PATH):
+        print("変更なし - ZIP はそのままです")
+        return
 
     # 3. バッチ ZIP 作成
     print(f"バッチ ZIP 作成中 ({BATCH_SIZE} ファイル/バッチ)...")
-    batch_count = create_batch_zips(file_paths)
+    batch_count = create_batch_zips(file_paths, written if only is not None else None)
     print(f"  -> {batch_count} バッチ生成完了: dify/batches/\n")
 
     # 4. 全件一括 ZIP 作成
@@ -1,12 +1,17 @@
+import argparse
 import json
 import os
 import sys
 from pathlib import Path
 
+import category_rules
+import changeset
+import prompt_store
+
 # Configuration
 SCRIPT_DIR = Path(__file__).resolve().parent
 PROJECT_DIR = SCRIPT_DIR.parent
-DATA_FILE = PROJECT_DIR / "data" / "prompts.json"
+DATA_FILE = prompt_store.DATA_FILE
 OUTPUT_HTML = PROJECT_DIR / "prompt-aggregator.html"
 
 # HTML Template
@@ -231,7 +236,7 @@ HTML_TEMPLATE = """
         // Rendering
         function renderCategories() {
             // Extract all unique categories
-            const allCats = ["#文章作成・要約", "#文書校正・編集", "#アイデア創出・企画", "#業務改善", "#情報収集・分析", "#コミュニケーション支援", "#プログラミング", "#意識改革・スキルアップ"];
+            const allCats = {{CATEGORY_TAGS_JSON}};
             
             let html = '';
             allCats.forEach(cat => {
@@ -365,7 +370,7 @@ HTML_TEMPLATE = """
 </html>
 """
 
-def generate():
+def generate(changeset_path: Path | None = None):
     print(f"Reading data from {DATA_FILE}...")
     
     if not DATA_FILE.exists():
@@ -373,20 +378,26 @@ def generate():
         print("Please run crawl_prompts.py first.")
         return
 
+    if changeset_path is not None and changeset.up_to_date(OUTPUT_HTML, DATA_FILE, changeset_path):
+        print(f"No prompts changed and {OUTPUT_HTML.name} is current - skipping.")
+        return
+
     try:
-        with open(DATA_FILE, "r", encoding="utf-8") as f:
-            data = json.load(f)
+        data = prompt_store.open_store(DATA_FILE).load()
     except Exception as e:
         print(f"Error reading JSON: {e}")
         return
 
     # Serialize data to JSON string for injection
-    json_str = json.dumps(data, ensure_ascii=False)
+    json_str = json.dumps([p.to_dict() for p in data], ensure_ascii=False)
 
     # Inject into template
     html_content = HTML_TEMPLATE.replace("{{PROMPT_DATA}}", json_str)
     # Replace PROMPTS_JSON with pure array if I made a mistake in template variable naming
     html_content = html_content.replace("{{PROMPTS_JSON}}", json_str)
+    # Category filter buttons, in rule-file order
+    tags_json = json.dumps(category_rules.load().tags, ensure_ascii=False)
+    html_content = html_content.replace("{{CATEGORY_TAGS_JSON}}", tags_json)
 
     # Write output
     print(f"Writing HTML to {OUTPUT_HTML}...")
@@ -396,4 +407,9 @@ def generate():
     print("Success! prompt-aggregator.html has been generated.")
 
 if __name__ == "__main__":
-    generate()
+    parser = argparse.ArgumentParser(description="Generate the single-file HTML app.")
+    parser.add_argument(
+        "--changeset", nargs="?", type=Path, const=changeset.CHANGESET_FILE, default=None,
+        help="skip when the changeset is empty and the HTML is already current",
+    )
+    generate(parser.parse_args().changeset)
@@ -1,14 +1,19 @@
+import argparse
 import json
 import os
 import sys
 from pathlib import Path
 from datetime import datetime
 
+import category_rules
+import changeset
+import prompt_store
+
 
 # Configuration
 SCRIPT_DIR = Path(__file__).resolve().parent
 PROJECT_DIR = SCRIPT_DIR.parent
-DATA_FILE = PROJECT_DIR / "data" / "prompts.json"
+DATA_FILE = prompt_store.DATA_FILE
 OUTPUT_HTML = PROJECT_DIR / "prompt-aggregator-neo.html"
 
 # HTML Template with Neo Design
@@ -288,6 +293,7 @@ HTML_TEMPLATE = """
     <!-- Data Injection -->
     <script>
         const PROMPTS = {{PROMPTS_JSON}};
+        const CATEGORY_ORDER = {{CATEGORY_TAGS_JSON}};
     </script>
 
     <!-- Application Logic -->
@@ -340,7 +346,10 @@ HTML_TEMPLATE = """
             // Extract categories
             const categories = new Set();
             PROMPTS.forEach(p => (p.categories || []).forEach(c => categories.add(c)));
-            renderCategoryFilters(Array.from(categories));
+            renderCategoryFilters([
+                ...CATEGORY_ORDER.filter(c => categories.has(c)),
+                ...Array.from(categories).filter(c => !CATEGORY_ORDER.includes(c)),
+            ]);
             
             // Initial render
             updateUI();
@@ -592,22 +601,25 @@ HTML_TEMPLATE = """
 </html>
 """
 
-def generate():
+def generate(changeset_path: Path | None = None):
     print(f"Reading data from {DATA_FILE}...")
     
     if not DATA_FILE.exists():
         print(f"Error: Data file not found at {DATA_FILE}")
         return
 
+    if changeset_path is not None and changeset.up_to_date(OUTPUT_HTML, DATA_FILE, changeset_path):
+        print(f"No prompts changed and {OUTPUT_HTML.name} is current - skipping.")
+        return
+
     try:
-        with open(DATA_FILE, "r", encoding="utf-8") as f:
-            data = json.load(f)
+        data = prompt_store.open_store(DATA_FILE).load()
     except Exception as e:
         print(f"Error reading JSON: {e}")
         return
 
     # Serialize data to JSON string for injection
-    json_str = json.dumps(data, ensure_ascii=False)
+    json_str = json.dumps([p.to_dict() for p in data], ensure_ascii=False)
     
     # Get current date
     gen_date = datetime.now().strftime("%Y-%m-%d %H:%M")
@@ -615,6 +627,9 @@ def generate():
     # Inject into template
     html_content = HTML_TEMPLATE.replace("{{PROMPTS_JSON}}", json_str)
     html_content = html_content.replace("{{GENERATION_DATE}}", gen_date)
+    # Category chips in rule-file order
+    tags_json = json.dumps(category_rules.load().tags, ensure_ascii=False)
+    html_content = html_content.replace("{{CATEGORY_TAGS_JSON}}", tags_json)
 
     # Write output
     print(f"Writing HTML to {OUTPUT_HTML}...")
@@ -624,4 +639,9 @@ def generate():
     print("Success! prompt-aggregator-neo.html has been generated.")
 
 if __name__ == "__main__":
-    generate()
+    parser = argparse.ArgumentParser(description="Generate the Neo single-file HTML app.")
+    parser.add_argument(
+        "--changeset", nargs="?", type=Path, const=changeset.CHANGESET_FILE, default=None,
+        help="skip when the changeset is empty and the HTML is already current",
+    )
+    generate(parser.parse_args().changeset)
@@ -0,0 +1,87 @@
+"""
+Raw HTML Cache
+==============
+Content-addressed, gzip-compressed store of fetched pages, so parse_page()
+can be re-run over the whole corpus without touching the network.
+
+Layout:
+  cache/html/objects/ab/abcdef....html.gz   (sha256 of the UTF-8 HTML)
+  cache/html/index.tsv                      ("<id>\\t<sha256>" per line)
+
+index.tsv is append-only: a page is re-recorded only when its hash
+changes, and the last line for an ID wins. Identical pages share one
+object.
+"""
+
+import gzip
+import hashlib
+import os
+from pathlib import Path
+from typing import Iterator
+
+SCRIPT_DIR = Path(__file__).resolve().parent
+CACHE_DIR = SCRIPT_DIR / "cache" / "html"
+
+
+class HtmlCache:
+    def __init__(self, root: Path = CACHE_DIR) -> None:
+        self.root = root
+        self.objects_dir = root / "objects"
+        self.index_file = root / "index.tsv"
+        self._index: dict[str, str] = {}
+        if self.index_file.exists():
+            with open(self.index_file, "r", encoding="utf-8") as f:
+                for line in f:
+                    parts = line.rstrip("\n").split("\t")
+                    if len(parts) == 2:  # tolerate a torn last line
+                        self._index[parts[0]] = parts[1]
+
+    def __len__(self) -> int:
+        return len(self._index)
+
+    def __contains__(self, prompt_id: str) -> bool:
+        return prompt_id in self._index
+
+    def _object_path(self, digest: str) -> Path:
+        return self.objects_dir / digest[:2] / f"{digest}.html.gz"
+
+    def put(self, prompt_id: str, html: str) -> str:
+        """Store a page and point its ID at it. Returns the content hash."""
+        data = html.encode("utf-8")
+        digest = hashlib.sha256(data).hexdigest()
+
+        path = self._object_path(digest)
+        if not path.exists():
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = path.with_suffix(f".tmp{os.getpid()}")
+            with open(tmp, "wb") as f:
+                f.write(gzip.compress(data, mtime=0))
+            os.replace(tmp, path)
+
+        if self._index.get(prompt_id) != digest:
+            self.root.mkdir(parents=True, exist_ok=True)
+            with open(self.index_file, "a", encoding="utf-8") as f:
+                f.write(f"{prompt_id}\t{digest}\n")
+            self._index[prompt_id] = digest
+        return digest
+
+    def get(self, prompt_id: str) -> str | None:
+        """Cached HTML for an ID, or None if it was never stored."""
+        digest = self._index.get(prompt_id)
+        if digest is None:
+            return None
+        try:
+            with open(self._object_path(digest), "rb") as f:
+                return gzip.decompress(f.read()).decode("utf-8")
+        except FileNotFoundError:
+            return None
+
+    def ids(self) -> list[str]:
+        return sorted(self._index)
+
+    def items(self) -> Iterator[tuple[str, str]]:
+        """(id, html) for every cached page, in ID order."""
+        for prompt_id in self.ids():
+            html = self.get(prompt_id)
+            if html is not None:
+                yield prompt_id, html
@@ -0,0 +1,91 @@
+"""
+ID Range Discovery
+==================
+Finds the live prompt ID space instead of probing a fixed 001-999 range.
+
+1. Index page: if the listing at BASE_URL links to NNN.html pages, those
+   IDs are the live set and the gaps between them are known dead.
+2. Otherwise, probing: starting from the highest ID known to be live,
+   probe exponentially growing offsets until one comes back dead, then
+   binary-search between the last live and first dead probe.
+
+Prompt IDs have gaps, so a single 404 proves nothing. A probe at n looks
+at n .. n+window-1 and counts as live if any of them is; gaps shorter than
+`window` therefore never stop the search.
+"""
+
+import re
+from typing import Callable
+
+PROBE_WINDOW = 5
+MAX_ID = 99999
+
+_LINK_RE = re.compile(r"""href\s*=\s*["']?(?:[^"'\s>]*/)?(\d{3,})\.html""", re.IGNORECASE)
+
+
+def ids_from_index(html: str) -> set[int]:
+    """Prompt IDs linked from a listing page (href="123.html" or ".../123.html")."""
+    return {int(m.group(1)) for m in _LINK_RE.finditer(html)}
+
+
+def gaps(ids: set[int], start: int = 1) -> list[tuple[int, int]]:
+    """Inclusive (first, last) runs of IDs missing between start and max(ids)."""
+    result = []
+    expected = start
+    for n in sorted(ids):
+        if n > expected:
+            result.append((expected, n - 1))
+        expected = max(expected, n + 1)
+    return result
+
+
+def find_upper_bound(
+    alive: Callable[[int], bool],
+    known_max: int = 0,
+    window: int = PROBE_WINDOW,
+    limit: int = MAX_ID,
+) -> tuple[int, int]:
+    """
+    Exponential + binary search for the highest live ID above known_max.
+
+    alive(n) fetches one ID and reports whether it exists; each ID is
+    fetched at most once. Returns (last_alive, first_dead): the highest
+    live ID found, and the lowest probed point above it from which a whole
+    window came back dead.
+    """
+    seen: dict[int, bool] = {}
+
+    def is_alive(n: int) -> bool:
+        if n not in seen:
+            seen[n] = alive(n)
+        return seen[n]
+
+    def probe(n: int, below: int) -> int | None:
+        """First live ID in n .. n+window-1 (and < below), or None."""
+        for k in range(n, min(n + window, below)):
+            if is_alive(k):
+                return k
+        return None
+
+    lo = known_max
+    step = 1
+    while True:
+        n = lo + step
+        if n > limit:
+            hi = limit + 1
+            break
+        hit = probe(n, limit + 1)
+        if hit is None:
+            hi = n
+            break
+        lo = hit
+        step *= 2
+
+    while hi - lo > 1:
+        mid = (lo + hi) // 2
+        hit = probe(mid, hi)
+        if hit is None:
+            hi = mid
+        else:
+            lo = hit
+    return lo, hi
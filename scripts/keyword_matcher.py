@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+"""
+Keyword Matcher
+===============
+Aho-Corasick automaton over a fixed keyword list: one pass over a text
+reports every keyword that occurs in it, so the cost depends on the text
+length rather than on the number of keywords.
+
+Matching is exact; callers lower-case both keywords and text themselves.
+"""
+
+from collections import deque
+
+
+class KeywordMatcher:
+    """Finds which of `keywords` occur in a text. Hits are keyword indices."""
+
+    def __init__(self, keywords: list[str]):
+        self.keywords = list(keywords)
+        goto: list[dict[str, int]] = [{}]
+        out: list[tuple[int, ...]] = [()]
+
+        # Trie of all keywords
+        for index, kw in enumerate(self.keywords):
+            state = 0
+            for ch in kw:
+                nxt = goto[state].get(ch)
+                if nxt is None:
+                    nxt = len(goto)
+                    goto[state][ch] = nxt
+                    goto.append({})
+                    out.append(())
+                state = nxt
+            out[state] += (index,)
+
+        # Failure links, breadth first; each state's output also carries the
+        # keywords that end at its failure state (the suffixes it contains)
+        fail = [0] * len(goto)
+        queue = deque(goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for ch, nxt in goto[state].items():
+                queue.append(nxt)
+                f = fail[state]
+                while f and ch not in goto[f]:
+                    f = fail[f]
+                fail[nxt] = goto[f].get(ch, 0) if goto[f].get(ch) != nxt else 0
+                out[nxt] += out[fail[nxt]]
+
+        self._goto = goto
+        self._fail = fail
+        self._out = out
+
+    def find(self, *parts: str) -> list[set[int]]:
+        """Scan the concatenation of `parts` once.
+
+        Returns one set per part: the keywords found in the text up to and
+        including that part (so the last set covers the whole text).
+        """
+        goto, fail, out = self._goto, self._fail, self._out
+        state = 0
+        found = set(out[0])  # empty keywords occur everywhere
+        result = []
+        for text in parts:
+            for ch in text:
+                while True:
+                    nxt = goto[state].get(ch)
+                    if nxt is not None:
+                        state = nxt
+                        break
+                    if not state:
+                        break
+                    state = fail[state]
+                if out[state]:
+                    found.update(out[state])
+            result.append(set(found))
+        return result
@@ -0,0 +1,253 @@
+#!/usr/bin/env python3
+"""
+Prompt Search Database
+======================
+Builds data/prompts.db from prompts.json: an SQLite database with an FTS5
+index using the trigram tokenizer, so Japanese text (no spaces between
+words) is searchable by any substring of three or more characters, and the
+category tags from classify() in a side table.
+
+  prompts     (rowid, id, title, body, url)
+  prompt_fts  FTS5(title, body), external content on prompts, trigram
+  categories  (prompt_id, tag, position)   position 0 = primary category
+  meta        (key, value)                 corpus hash of the last build
+
+search() matches like the HTML app's filter - every whitespace-separated
+term must occur in the title or body, case-insensitively - but terms of
+three or more characters are answered from the index, ranked by bm25
+(title hits weigh more) and shown with a snippet marking the hits «so».
+One- and two-character terms are below the trigram size and fall back to
+a scan.
+
+The build is skipped when the prompts and their categories are unchanged;
+otherwise the database is rebuilt into a temp file and swapped in.
+
+Usage:
+  python prompt_db.py build [--force]
+  python prompt_db.py search 要約する [--category "#業務改善"] [--limit 20]
+"""
+
+import argparse
+import hashlib
+import io
+import os
+import sqlite3
+import sys
+import time
+from contextlib import closing
+from dataclasses import dataclass
+from pathlib import Path
+
+import changeset
+import prompt_store
+
+if sys.platform == "win32":
+    sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding="utf-8", errors="replace")
+
+DB_FILE = prompt_store.DATA_FILE.with_name("prompts.db")
+TRIGRAM = 3             # Shortest term the trigram index can answer
+TITLE_WEIGHT = 10.0     # bm25 weight of a title hit relative to the body
+SNIPPET_TOKENS = 48     # Characters, as every trigram token is one character
+
+SCHEMA = """
+CREATE TABLE prompts (
+    rowid INTEGER PRIMARY KEY,
+    id    TEXT NOT NULL UNIQUE,
+    title TEXT NOT NULL,
+    body  TEXT NOT NULL,
+    url   TEXT
+);
+CREATE VIRTUAL TABLE prompt_fts USING fts5(
+    title, body, content='prompts', content_rowid='rowid', tokenize='trigram'
+);
+CREATE TABLE categories (
+    prompt_id TEXT NOT NULL,
+    tag       TEXT NOT NULL,
+    position  INTEGER NOT NULL,
+    PRIMARY KEY (prompt_id, tag)
+);
+CREATE INDEX categories_tag ON categories (tag, prompt_id);
+CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+"""
+
+# ---------------------------------------------------------------------------
+# Build
+# ---------------------------------------------------------------------------
+
+def corpus_hash(prompts: list[dict]) -> str:
+    """Changes whenever a prompt's content or categories change."""
+    h = hashlib.sha256()
+    for p in prompts:
+        h.update(f"{p['id']}\0{changeset.content_hash(p['title'], p['body'])}\0".encode())
+        h.update("\0".join(p.get("categories", [])).encode("utf-8") + b"\n")
+    return h.hexdigest()[:16]
+
+
+def built_hash(path: Path) -> str | None:
+    if not path.exists():
+        return None
+    try:
+        with closing(sqlite3.connect(path)) as db:
+            row = db.execute("SELECT value FROM meta WHERE key = 'corpus'").fetchone()
+    except sqlite3.DatabaseError:
+        return None
+    return row[0] if row else None
+
+
+def build(prompts: list[dict], path: Path = DB_FILE, force: bool = False) -> bool:
+    """(Re)build the database; False if it was already up to date."""
+    digest = corpus_hash(prompts)
+    if not force and built_hash(path) == digest:
+        return False
+
+    tmp = path.with_name(f"{path.name}.tmp")
+    tmp.unlink(missing_ok=True)
+    db = sqlite3.connect(tmp)
+    # The temp file is only swapped in once complete, so no journal is needed
+    db.execute("PRAGMA journal_mode = OFF")
+    db.execute("PRAGMA synchronous = OFF")
+    try:
+        try:
+            db.executescript(SCHEMA)
+        except sqlite3.OperationalError as e:
+            raise SystemExit(f"SQLite {sqlite3.sqlite_version} lacks FTS5 trigram support ({e}); "
+                             "3.34 or newer is needed.")
+        with db:
+            db.executemany(
+                "INSERT INTO prompts (id, title, body, url) VALUES (?, ?, ?, ?)",
+                ((p["id"], p["title"], p["body"], p.get("url")) for p in prompts),
+            )
+            db.executemany(
+                "INSERT INTO categories (prompt_id, tag, position) VALUES (?, ?, ?)",
+                ((p["id"], tag, i) for p in prompts for i, tag in enumerate(p.get("categories", []))),
+            )
+            db.execute("INSERT INTO prompt_fts (prompt_fts) VALUES ('rebuild')")
+            db.execute("INSERT INTO prompt_fts (prompt_fts) VALUES ('optimize')")
+            db.execute("INSERT INTO meta VALUES ('corpus', ?)", (digest,))
+            db.execute("INSERT INTO meta VALUES ('built_at', ?)", (time.strftime("%Y-%m-%dT%H:%M:%S%z"),))
+    finally:
+        db.close()
+    os.replace(tmp, path)
+    return True
+
+# ---------------------------------------------------------------------------
+# Search
+# ---------------------------------------------------------------------------
+
+@dataclass
+class SearchHit:
+    id: str
+    title: str
+    snippet: str
+    score: float          # bm25: lower is better (0.0 for scan-only queries)
+    categories: list[str]
+
+
+def _fts_phrase(term: str) -> str:
+    return '"' + term.replace('"', '""') + '"'
+
+
+def _like(term: str) -> str:
+    escaped = term.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    return f"%{escaped}%"
+
+
+def _scan_snippet(body: str, terms: list[str], width: int = 40) -> str:
+    lower = body.lower()
+    at = min((i for i in (lower.find(t.lower()) for t in terms) if i >= 0), default=0)
+    start = max(0, at - width // 2)
+    text = body[start:start + width]
+    return ("…" if start else "") + text + ("…" if start + width < len(body) else "")
+
+
+def _read_only_uri(path: Path) -> str:
+    # as_uri() percent-encodes ?, # and % and handles Windows drive paths
+    return f"{path.resolve().as_uri()}?mode=ro"
+
+
+def search(
+    query: str,
+    category: str | None = None,
+    limit: int = 20,
+    path: Path = DB_FILE,
+) -> list[SearchHit]:
+    """Prompts containing every term of `query`, best matches first."""
+    terms = query.split()
+    indexed = [t for t in terms if len(t) >= TRIGRAM]
+    scanned = [t for t in terms if len(t) < TRIGRAM]
+
+    where, params = [], []
+    if indexed:
+        where.append("prompt_fts MATCH ?")
+        params.append(" AND ".join(_fts_phrase(t) for t in indexed))
+    for term in scanned:
+        where.append("(p.title LIKE ? ESCAPE '\\' OR p.body LIKE ? ESCAPE '\\')")
+        params += [_like(term), _like(term)]
+    if category:
+        where.append("p.id IN (SELECT prompt_id FROM categories WHERE tag = ?)")
+        params.append(category)
+
+    if indexed:
+        sql = (
+            "SELECT p.id, p.title, p.body,"
+            f" snippet(prompt_fts, -1, '«', '»', '…', {SNIPPET_TOKENS}),"
+            f" bm25(prompt_fts, {TITLE_WEIGHT}, 1.0) AS score"
+            " FROM prompt_fts JOIN prompts p ON p.rowid = prompt_fts.rowid"
+        )
+        order = "score, p.id"
+    else:
+        sql = "SELECT p.id, p.title, p.body, NULL, 0.0 FROM prompts p"
+        order = "p.id"
+    if where:
+        sql += " WHERE " + " AND ".join(where)
+    sql += f" ORDER BY {order} LIMIT ?"
+    params.append(limit)
+
+    with closing(sqlite3.connect(_read_only_uri(path), uri=True)) as db:
+        rows = db.execute(sql, params).fetchall()
+        hits = []
+        for pid, title, body, snippet, score in rows:
+            tags = [tag for (tag,) in db.execute(
+                "SELECT tag FROM categories WHERE prompt_id = ? ORDER BY position", (pid,)
+            )]
+            if snippet is None:
+                snippet = _scan_snippet(body, terms)
+            hits.append(SearchHit(pid, title, snippet.replace("\n", " "), score, tags))
+    return hits
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Build or query the prompt search database.")
+    parser.add_argument("--db", type=Path, default=DB_FILE)
+    sub = parser.add_subparsers(dest="command", required=True)
+    p = sub.add_parser("build", help="(re)build from prompts.json")
+    p.add_argument("--data", type=Path, default=prompt_store.DATA_FILE)
+    p.add_argument("--force", action="store_true", help="rebuild even if unchanged")
+    p = sub.add_parser("search", help="full-text search")
+    p.add_argument("query")
+    p.add_argument("--category", default=None, help="only prompts with this tag")
+    p.add_argument("--limit", type=int, default=20)
+    args = parser.parse_args()
+
+    if args.command == "build":
+        prompts = prompt_store.open_store(args.data).load()
+        started = time.perf_counter()
+        if build(prompts, args.db, args.force):
+            print(f"Built {args.db} ({len(prompts)} prompts) in {time.perf_counter() - started:.2f}s")
+        else:
+            print(f"{args.db} is up to date")
+        return
+
+    if not args.db.exists():
+        sys.exit(f"No database at {args.db} - run `prompt_db.py build` first")
+    started = time.perf_counter()
+    hits = search(args.query, args.category, args.limit, args.db)
+    elapsed = (time.perf_counter() - started) * 1000
+    print(f"{len(hits)} hits for {args.query!r} ({elapsed:.1f} ms)")
+    for hit in hits:
+        print(f"  {hit.id}  {hit.title}  [{', '.join(hit.categories)}]")
+        print(f"         {hit.snippet}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,301 @@
+#!/usr/bin/env python3
+"""
+Packed Prompt Corpus
+====================
+data/prompts.pack holds the corpus in a binary layout that is read through
+mmap, so one prompt can be sliced out by ID without parsing the others:
+a lookup hashes the ID into a fixed-width slot table and decodes only that
+record's bytes. Processes opening the same file share the OS page cache,
+and only the pages a reader touches are loaded.
+
+  header   <4sHHIIQQ   magic, version, tag count, record count, slot count,
+                        offset of the slot table, offset of the data region
+  tags     JSON array   category tags; bit i of a mask is tags[i]
+  order    u32 x count  slot of each record, in corpus order
+  slots    SLOT x slots open-addressing hash table on the ID (crc32, linear
+                        probing; an all-zero ID marks an empty slot)
+  data     per record: title, body, then the remaining fields as JSON
+                        (url, ordered categories, ...), all UTF-8
+
+Each slot is (ID, data offset, title / body / extra byte lengths, category
+bitmask), so category filters run on the slot table alone.
+
+The pack is derived from prompts.json and rewritten whole (atomically) by
+`prompt_pack.py build`. Importing this module registers PackBackend for
+".pack" paths with prompt_store, whose get() then uses the hash table.
+
+Usage:
+  python prompt_pack.py build              # data/prompts.json -> data/prompts.pack
+  python prompt_pack.py get 123            # one prompt as JSON
+  python prompt_pack.py ids --category "#業務改善"
+"""
+
+import argparse
+import io
+import json
+import mmap
+import os
+import struct
+import sys
+import time
+import zlib
+from pathlib import Path
+from typing import Iterator
+
+import prompt_store
+from prompt_record import Prompt
+
+if sys.platform == "win32":
+    sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding="utf-8", errors="replace")
+
+PACK_FILE = prompt_store.DATA_FILE.with_suffix(".pack")
+MAGIC = b"PRPK"
+VERSION = 1
+HEADER = struct.Struct("<4sHHIIQQ")
+SLOT = struct.Struct("<16sQIIIQ4x")  # id, offset, title_len, body_len, extra_len, mask
+ORDER = struct.Struct("<I")
+ID_BYTES = 16
+MAX_TAGS = 64
+
+# ---------------------------------------------------------------------------
+# Writing
+# ---------------------------------------------------------------------------
+
+def _slot_of(key: bytes, slots: int) -> int:
+    return zlib.crc32(key) & (slots - 1)
+
+
+def pack(prompts: list[Prompt | dict]) -> bytes:
+    """The .pack image of `prompts`."""
+    prompts = [prompt_store.as_dict(p) for p in prompts]
+    tags: list[str] = []
+    for p in prompts:
+        for tag in p.get("categories", []):
+            if tag not in tags:
+                tags.append(tag)
+    if len(tags) > MAX_TAGS:
+        raise ValueError(f"{len(tags)} category tags; the bitmask holds {MAX_TAGS}")
+    bit = {tag: 1 << i for i, tag in enumerate(tags)}
+
+    slots = 8
+    while slots < 2 * len(prompts):
+        slots *= 2
+    table: list[tuple | None] = [None] * slots
+    order = []
+    data = io.BytesIO()
+    for p in prompts:
+        key = p["id"].encode("utf-8")
+        if not key or len(key) > ID_BYTES:
+            raise ValueError(f"Prompt ID {p['id']!r} must be 1-{ID_BYTES} bytes")
+        s = _slot_of(key, slots)
+        while table[s] is not None:
+            if table[s][0] == key:
+                raise ValueError(f"Duplicate prompt ID {p['id']!r}")
+            s = (s + 1) & (slots - 1)
+
+        title = p["title"].encode("utf-8")
+        body = p["body"].encode("utf-8")
+        rest = {k: v for k, v in p.items() if k not in ("id", "title", "body")}
+        extra = json.dumps(rest, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+        mask = 0
+        for tag in p.get("categories", []):
+            mask |= bit[tag]
+        table[s] = (key, data.tell(), len(title), len(body), len(extra), mask)
+        data.write(title + body + extra)
+        order.append(s)
+
+    tag_block = json.dumps(tags, ensure_ascii=False).encode("utf-8")
+    slots_at = HEADER.size + len(tag_block) + ORDER.size * len(order)
+    data_at = slots_at + SLOT.size * slots
+    out = io.BytesIO()
+    out.write(HEADER.pack(MAGIC, VERSION, len(tags), len(prompts), slots, slots_at, data_at))
+    out.write(tag_block)
+    out.write(b"".join(ORDER.pack(s) for s in order))
+    empty = SLOT.pack(b"", 0, 0, 0, 0, 0)
+    out.write(b"".join(SLOT.pack(*entry) if entry else empty for entry in table))
+    out.write(data.getbuffer())
+    return out.getvalue()
+
+
+def write(path: Path, prompts: list[Prompt | dict]) -> None:
+    """Atomically replace `path` with the pack of `prompts`."""
+    image = pack(prompts)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(f"{path.name}.tmp")
+    tmp.write_bytes(image)
+    os.replace(tmp, path)
+
+# ---------------------------------------------------------------------------
+# Reading
+# ---------------------------------------------------------------------------
+
+class PackedCorpus:
+    """Read-only, memory-mapped view of a .pack file."""
+
+    def __init__(self, path: Path) -> None:
+        self.path = Path(path)
+        with open(self.path, "rb") as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, n_tags, self._count, self._slots, self._slots_at, self._data_at = (
+            HEADER.unpack_from(self._mm, 0)
+        )
+        if magic != MAGIC or version != VERSION:
+            self._mm.close()
+            raise ValueError(f"{self.path} is not a version {VERSION} prompt pack")
+        order_at = self._slots_at - ORDER.size * self._count
+        self.tags: list[str] = json.loads(self._mm[HEADER.size:order_at].decode("utf-8"))
+        self._order = memoryview(self._mm)[order_at:self._slots_at].cast("I")
+
+    def close(self) -> None:
+        self._order.release()
+        self._mm.close()
+
+    def __enter__(self) -> "PackedCorpus":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def __len__(self) -> int:
+        return self._count
+
+    def _slot(self, s: int) -> tuple:
+        return SLOT.unpack_from(self._mm, self._slots_at + SLOT.size * s)
+
+    def _find(self, prompt_id: str) -> tuple | None:
+        key = prompt_id.encode("utf-8")
+        if not key or len(key) > ID_BYTES:
+            return None
+        key = key.ljust(ID_BYTES, b"\0")
+        s = _slot_of(key.rstrip(b"\0"), self._slots)
+        while True:
+            entry = self._slot(s)
+            if entry[0] == key:
+                return entry
+            if entry[0][0] == 0:
+                return None
+            s = (s + 1) & (self._slots - 1)
+
+    def _record(self, entry: tuple) -> Prompt:
+        key, offset, title_len, body_len, extra_len, _mask = entry
+        at = self._data_at + offset
+        title_end = at + title_len
+        body_end = title_end + body_len
+        mm = self._mm
+        return Prompt(
+            key.rstrip(b"\0").decode("utf-8"),
+            mm[at:title_end].decode("utf-8"),
+            mm[title_end:body_end].decode("utf-8"),
+            **json.loads(mm[body_end:body_end + extra_len]),
+        )
+
+    def __contains__(self, prompt_id: str) -> bool:
+        return self._find(prompt_id) is not None
+
+    def get(self, prompt_id: str) -> Prompt | None:
+        entry = self._find(prompt_id)
+        return self._record(entry) if entry else None
+
+    def title(self, prompt_id: str) -> str | None:
+        entry = self._find(prompt_id)
+        if entry is None:
+            return None
+        at = self._data_at + entry[1]
+        return self._mm[at:at + entry[2]].decode("utf-8")
+
+    def __iter__(self) -> Iterator[Prompt]:
+        for s in self._order:
+            yield self._record(self._slot(s))
+
+    def ids(self, category: str | None = None) -> list[str]:
+        """IDs in corpus order, optionally only those tagged `category`."""
+        if category is None:
+            want = 0
+        elif category in self.tags:
+            want = 1 << self.tags.index(category)
+        else:
+            return []
+        found = []
+        for s in self._order:
+            key, _, _, _, _, mask = self._slot(s)
+            if mask & want == want:
+                found.append(key.rstrip(b"\0").decode("utf-8"))
+        return found
+
+# ---------------------------------------------------------------------------
+# prompt_store backend
+# ---------------------------------------------------------------------------
+
+class PackBackend:
+    """prompt_store backend for .pack files, with an O(1) get()."""
+
+    def __init__(self) -> None:
+        self._open: dict[Path, tuple[tuple[int, int], PackedCorpus]] = {}
+
+    def corpus(self, path: Path) -> PackedCorpus:
+        """The mapped pack at `path`, remapped if the file was replaced."""
+        st = path.stat()
+        stamp = (st.st_mtime_ns, st.st_size)
+        cached = self._open.get(path)
+        if cached and cached[0] == stamp:
+            return cached[1]
+        if cached:
+            cached[1].close()
+        corpus = PackedCorpus(path)
+        self._open[path] = (stamp, corpus)
+        return corpus
+
+    def iter(self, path: Path) -> Iterator[Prompt]:
+        return iter(self.corpus(path))
+
+    def load(self, path: Path) -> list[Prompt]:
+        return list(self.corpus(path))
+
+    def get(self, path: Path, prompt_id: str) -> Prompt | None:
+        return self.corpus(path).get(prompt_id)
+
+    def save(self, path: Path, prompts: list[Prompt | dict]) -> None:
+        cached = self._open.pop(path, None)
+        if cached:
+            # Windows cannot replace a file that is still mapped
+            cached[1].close()
+        write(path, prompts)
+
+
+prompt_store.register_backend(".pack", PackBackend())
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Build or read the packed prompt corpus.")
+    parser.add_argument("--pack", type=Path, default=PACK_FILE)
+    sub = parser.add_subparsers(dest="command", required=True)
+    p = sub.add_parser("build", help="write the pack from prompts.json")
+    p.add_argument("--data", type=Path, default=prompt_store.DATA_FILE)
+    p = sub.add_parser("get", help="print one prompt as JSON")
+    p.add_argument("id")
+    p = sub.add_parser("ids", help="list IDs in corpus order")
+    p.add_argument("--category", default=None, help="only prompts with this tag")
+    args = parser.parse_args()
+
+    if args.command == "build":
+        prompts = prompt_store.open_store(args.data).load()
+        started = time.perf_counter()
+        prompt_store.open_store(args.pack).save(prompts)
+        print(f"Wrote {args.pack} ({len(prompts)} prompts, "
+              f"{args.pack.stat().st_size / 1e6:.1f} MB) in {time.perf_counter() - started:.2f}s")
+        return
+
+    if not args.pack.exists():
+        sys.exit(f"No pack at {args.pack} - run `prompt_pack.py build` first")
+    with PackedCorpus(args.pack) as corpus:
+        if args.command == "get":
+            record = corpus.get(args.id)
+            if record is None:
+                sys.exit(f"No prompt {args.id}")
+            print(json.dumps(record.to_dict(), ensure_ascii=False, indent=2))
+        else:
+            print("\n".join(corpus.ids(args.category)))
+
+
+if __name__ == "__main__":
+    main()
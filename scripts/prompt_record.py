@@ -0,0 +1,198 @@
+#!/usr/bin/env python3
+"""
+Prompt Record
+=============
+The in-memory form of one prompt. prompt_store loads the corpus as Prompt
+objects rather than dicts: a slotted object has no per-record key table, and
+the categories are one small int instead of a list of strings.
+
+Category tags are interned once per process. A record's categories are an
+index into the table of distinct ordered tag lists - the order is kept, as
+the first tag is the primary category - and `mask` gives the same set as a
+bitmask over the interned tags (bit i = TAGS[i]) for cheap filtering:
+
+  p.categories             ["#業務改善", "#文章作成・要約"]  (a fresh list)
+  p.categories = tags      interns the list
+  p.mask & tag_bit(tag)    membership without touching any strings
+  p.has_category(tag)
+
+Dicts exist only at the JSON boundary: Prompt.from_dict() / to_dict() (the
+key order of prompts.json; "categories" is omitted while unset). For code
+written against dicts, p["title"], p.get("categories", []), "categories" in
+p and p["categories"] = tags work as before.
+
+Usage:
+  python prompt_record.py [PATH]     # per-record memory, dicts vs Prompt
+"""
+
+import io
+import sys
+from pathlib import Path
+from typing import Any
+
+if sys.platform == "win32":
+    sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding="utf-8", errors="replace")
+
+PROJECT_DIR = Path(__file__).resolve().parent.parent
+
+TAGS: list[str] = []                      # bit i of a mask is TAGS[i]
+_TAG_BITS: dict[str, int] = {}
+_TAG_SETS: list[tuple[str, ...]] = []     # distinct ordered category lists
+_TAG_SET_INDEX: dict[tuple[str, ...], int] = {}
+_TAG_SET_MASKS: list[int] = []
+
+FIELDS = ("id", "title", "body", "url")
+KEYS = frozenset(FIELDS + ("categories",))
+
+
+def tag_bit(tag: str) -> int:
+    """The mask bit of `tag`, interning it on first use."""
+    bit = _TAG_BITS.get(tag)
+    if bit is None:
+        bit = 1 << len(TAGS)
+        TAGS.append(sys.intern(tag))
+        _TAG_BITS[tag] = bit
+    return bit
+
+
+def intern_categories(tags: list[str] | tuple[str, ...]) -> int:
+    """Index of the ordered tag list `tags` in the interned table."""
+    key = tuple(tags)
+    code = _TAG_SET_INDEX.get(key)
+    if code is None:
+        bits = [tag_bit(tag) for tag in key]
+        mask = 0
+        for bit in bits:
+            mask |= bit
+        code = len(_TAG_SETS)
+        _TAG_SETS.append(tuple(TAGS[bit.bit_length() - 1] for bit in bits))
+        _TAG_SET_MASKS.append(mask)
+        _TAG_SET_INDEX[key] = code
+    return code
+
+
+class Prompt:
+    """One prompt: id, title, body, url and its (interned) categories."""
+
+    __slots__ = ("id", "title", "body", "url", "_cats")
+
+    def __init__(
+        self,
+        id: str,
+        title: str,
+        body: str,
+        url: str | None = None,
+        categories: list[str] | None = None,
+    ) -> None:
+        self.id = id
+        self.title = title
+        self.body = body
+        self.url = url
+        self._cats = None if categories is None else intern_categories(categories)
+
+    @classmethod
+    def from_dict(cls, d: dict) -> "Prompt":
+        if not d.keys() <= KEYS:
+            raise ValueError(f"Prompt {d.get('id')!r} has unknown fields: {sorted(d.keys() - KEYS)}")
+        return cls(d["id"], d["title"], d["body"], d.get("url"), d.get("categories"))
+
+    def to_dict(self) -> dict:
+        d = {"id": self.id, "title": self.title, "body": self.body}
+        if self.url is not None:
+            d["url"] = self.url
+        if self._cats is not None:
+            d["categories"] = list(_TAG_SETS[self._cats])
+        return d
+
+    # Pickle through the dict form: interned indexes are per process
+    def __reduce__(self):
+        return (Prompt.from_dict, (self.to_dict(),))
+
+    @property
+    def categories(self) -> list[str] | None:
+        return None if self._cats is None else list(_TAG_SETS[self._cats])
+
+    @categories.setter
+    def categories(self, tags: list[str] | None) -> None:
+        self._cats = None if tags is None else intern_categories(tags)
+
+    @property
+    def mask(self) -> int:
+        return 0 if self._cats is None else _TAG_SET_MASKS[self._cats]
+
+    def has_category(self, tag: str) -> bool:
+        bit = _TAG_BITS.get(tag)
+        return bit is not None and bool(self.mask & bit)
+
+    def __eq__(self, other: object) -> bool:
+        if isinstance(other, Prompt):
+            return (self.id, self.title, self.body, self.url, self._cats) == (
+                other.id, other.title, other.body, other.url, other._cats
+            )
+        if isinstance(other, dict):
+            return self.to_dict() == other
+        return NotImplemented
+
+    def __repr__(self) -> str:
+        return f"Prompt({self.id!r}, {self.title!r}, categories={self.categories!r})"
+
+    # -- dict-style access ---------------------------------------------------
+
+    def __getitem__(self, key: str) -> Any:
+        if key == "categories":
+            if self._cats is None:
+                raise KeyError(key)
+            return self.categories
+        if key not in FIELDS or (key == "url" and self.url is None):
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def __setitem__(self, key: str, value: Any) -> None:
+        if key == "categories":
+            self.categories = value
+        elif key in FIELDS:
+            setattr(self, key, value)
+        else:
+            raise KeyError(key)
+
+    def __contains__(self, key: str) -> bool:
+        try:
+            self[key]
+        except KeyError:
+            return False
+        return True
+
+    def get(self, key: str, default: Any = None) -> Any:
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+
+def main() -> None:
+    import json
+    import tracemalloc
+
+    path = Path(sys.argv[1]) if len(sys.argv) > 1 else PROJECT_DIR / "data" / "prompts.json"
+    text = path.read_text(encoding="utf-8")
+
+    def traced(build) -> tuple[int, int]:
+        tracemalloc.start()
+        records = build()
+        size, _ = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        return len(records), size
+
+    n, as_dicts = traced(lambda: json.loads(text))
+    _, as_prompts = traced(lambda: json.loads(text, object_hook=Prompt.from_dict))
+    strings = sum(
+        sys.getsizeof(p["id"]) + sys.getsizeof(p["title"]) + sys.getsizeof(p["body"])
+        + sys.getsizeof(p.get("url", "")) for p in json.loads(text)
+    )
+    print(f"{path} ({n} prompts, {len(TAGS)} distinct tags, {len(_TAG_SETS)} tag lists)")
+    print(f"  dicts   : {as_dicts / n:>7.0f} bytes/record ({(as_dicts - strings) / n:.0f} excluding field strings)")
+    print(f"  Prompt  : {as_prompts / n:>7.0f} bytes/record ({(as_prompts - strings) / n:.0f} excluding field strings)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,438 @@
+#!/usr/bin/env python3
+"""
+Prompt Snapshots
+================
+Versioned history of the prompt corpus: immutable base files plus one small
+delta segment per version, so recording a version writes only the prompts
+that changed, and any earlier version can be read back, diffed or made
+current again.
+
+  data/prompts.snap             manifest (JSON): versions, their parents, head
+  data/prompts.snap.d/
+    base-000001.jsonl           the whole corpus at a version, one prompt per line
+    delta-000002.jsonl          changes on top of the parent version:
+                                  {"op": "put", "record": {...}}   add / modify
+                                  {"op": "del", "id": "123"}
+                                  {"op": "order", "ids": [...]}    only if the
+                                  order differs from applying the rest
+
+A version is materialized from the nearest base among its ancestors plus the
+deltas after it. Rolling back only moves the head to an earlier version (the
+later ones stay, so rolling forward works too); the next commit branches
+from there. Once the head is more than COMPACT_AFTER deltas from its base, a
+background thread writes a new base for it, so reads stay short; `prune`
+deletes the files no kept version needs.
+
+Importing this module registers SnapshotBackend for ".snap" with
+prompt_store: a store opened on data/prompts.snap loads the head and save()
+commits a new version. The pipeline itself keeps prompts.json (the HTML
+generators and the Next.js app read it) and records each run's result with
+`commit`; `rollback` makes an old version current and writes it back to
+prompts.json, updating data/changeset.json as a crawl would, so the
+--changeset stages of update_app.cmd redo the reverted prompts.
+
+One writer at a time, as with prompts.json.
+
+Usage:
+  python prompt_snapshots.py commit [--note "..."]    # prompts.json -> new version
+  python prompt_snapshots.py log
+  python prompt_snapshots.py diff 12 [14]             # default: against the head
+  python prompt_snapshots.py checkout 12 --out old.json
+  python prompt_snapshots.py rollback 12              # head = 12, rewrite prompts.json
+  python prompt_snapshots.py compact
+  python prompt_snapshots.py prune --keep 20
+"""
+
+import argparse
+import io
+import json
+import os
+import sys
+import threading
+import time
+from pathlib import Path
+from typing import Iterator
+
+import changeset
+import prompt_store
+from prompt_record import Prompt
+
+if sys.platform == "win32":
+    sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding="utf-8", errors="replace")
+
+SNAP_FILE = prompt_store.DATA_FILE.with_suffix(".snap")
+FORMAT = 1
+COMPACT_AFTER = 16  # Deltas between the head and its base before a new base
+
+
+def _write_atomic(path: Path, text: str) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(f"{path.name}.tmp")
+    tmp.write_text(text, encoding="utf-8")
+    os.replace(tmp, path)
+
+
+def _jsonl(items: list[dict]) -> str:
+    return "".join(json.dumps(item, ensure_ascii=False) + "\n" for item in items)
+
+
+def _read_jsonl(path: Path) -> Iterator[dict]:
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+def diff_states(
+    old: tuple[list[str], dict[str, dict]], new: tuple[list[str], dict[str, dict]]
+) -> dict[str, list[str]]:
+    """{"added", "modified", "removed"} IDs between two (order, by_id) states."""
+    (old_order, old_by_id), (new_order, new_by_id) = old, new
+    return {
+        "added": [i for i in new_order if i not in old_by_id],
+        "modified": [i for i in new_order if i in old_by_id and old_by_id[i] != new_by_id[i]],
+        "removed": [i for i in old_order if i not in new_by_id],
+    }
+
+# ---------------------------------------------------------------------------
+# Snapshot store
+# ---------------------------------------------------------------------------
+
+class Snapshots:
+    """The versions recorded under one manifest."""
+
+    def __init__(self, path: Path = SNAP_FILE) -> None:
+        self.path = Path(path)
+        self.dir = self.path.with_name(f"{self.path.name}.d")
+        self._lock = threading.RLock()
+        self._stamp: tuple[int, int] | None = None
+        self._state: tuple[int, list[str], dict[str, dict]] | None = None
+        self._compactor: threading.Thread | None = None
+        self.manifest: dict = {}
+        self._reload()
+
+    # -- manifest ------------------------------------------------------------
+
+    def _reload(self) -> None:
+        """Re-read the manifest if another process changed it."""
+        try:
+            st = self.path.stat()
+        except FileNotFoundError:
+            self.manifest = {"format": FORMAT, "head": None, "next": 1, "versions": {}}
+            self._stamp = None
+            return
+        stamp = (st.st_mtime_ns, st.st_size)
+        if stamp == self._stamp:
+            return
+        manifest = json.loads(self.path.read_text(encoding="utf-8"))
+        if manifest.get("format") != FORMAT:
+            raise ValueError(f"{self.path}: unsupported snapshot format {manifest.get('format')!r}")
+        self.manifest = manifest
+        self._stamp = stamp
+
+    def _save_manifest(self) -> None:
+        _write_atomic(self.path, json.dumps(self.manifest, ensure_ascii=False, indent=1))
+        st = self.path.stat()
+        self._stamp = (st.st_mtime_ns, st.st_size)
+
+    @property
+    def head(self) -> int | None:
+        return self.manifest["head"]
+
+    def versions(self) -> list[int]:
+        return sorted(int(v) for v in self.manifest["versions"])
+
+    def entry(self, version: int) -> dict:
+        try:
+            return self.manifest["versions"][str(version)]
+        except KeyError:
+            raise KeyError(f"No snapshot version {version}") from None
+
+    def _file(self, kind: str, version: int) -> Path:
+        return self.dir / f"{kind}-{version:06d}.jsonl"
+
+    # -- reading -------------------------------------------------------------
+
+    def chain(self, version: int) -> list[int]:
+        """[base version, ..., version]: what materializing `version` reads."""
+        chain = []
+        v: int | None = version
+        while True:
+            if v is None:
+                raise ValueError(f"Snapshot {version} has no base among its ancestors")
+            entry = self.entry(v)
+            chain.append(v)
+            if entry["base"]:
+                return chain[::-1]
+            v = entry["parent"]
+
+    def state(self, version: int) -> tuple[list[str], dict[str, dict]]:
+        """(IDs in order, records by ID) at `version`; treat as read-only."""
+        with self._lock:
+            if self._state and self._state[0] == version:
+                return self._state[1], self._state[2]
+            chain = self.chain(version)
+            order: list[str] = []
+            by_id: dict[str, dict] = {}
+            for record in _read_jsonl(self._file("base", chain[0])):
+                order.append(record["id"])
+                by_id[record["id"]] = record
+            for v in chain[1:]:
+                for op in _read_jsonl(self._file("delta", v)):
+                    if op["op"] == "put":
+                        if op["record"]["id"] not in by_id:
+                            order.append(op["record"]["id"])
+                        by_id[op["record"]["id"]] = op["record"]
+                    elif op["op"] == "del":
+                        by_id.pop(op["id"], None)
+                    elif op["op"] == "order":
+                        order = op["ids"]
+                order = [i for i in order if i in by_id]
+            self._state = (version, order, by_id)
+            return order, by_id
+
+    def materialize(self, version: int | None = None) -> list[Prompt]:
+        """The prompts at `version` (default: the head) as fresh records."""
+        with self._lock:
+            self._reload()
+            version = self.head if version is None else version
+            if version is None:
+                return []
+            order, by_id = self.state(version)
+            return [Prompt.from_dict(by_id[i]) for i in order]
+
+    def diff(self, old: int, new: int | None = None) -> dict[str, list[str]]:
+        with self._lock:
+            self._reload()
+            new = self.head if new is None else new
+            return diff_states(self.state(old), self.state(new))
+
+    # -- writing -------------------------------------------------------------
+
+    def commit(self, prompts: list[Prompt | dict], note: str = "") -> int | None:
+        """Record `prompts` as a new version; None if nothing changed."""
+        records = [dict(prompt_store.as_dict(p)) for p in prompts]
+        order = [r["id"] for r in records]
+        by_id = {r["id"]: r for r in records}
+        if len(by_id) != len(records):
+            raise ValueError("Duplicate prompt IDs")
+
+        with self._lock:
+            self._reload()
+            parent = self.head
+            version = self.manifest["next"]
+            entry = {
+                "parent": parent,
+                "created_at": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+                "note": note,
+                "count": len(records),
+                "base": parent is None,
+            }
+            if parent is None:
+                _write_atomic(self._file("base", version), _jsonl(records))
+                entry.update(added=len(records), modified=0, removed=0)
+            else:
+                old_order, old_by_id = self.state(parent)
+                changes = diff_states((old_order, old_by_id), (order, by_id))
+                ops = [{"op": "put", "record": by_id[i]} for i in changes["added"] + changes["modified"]]
+                ops += [{"op": "del", "id": i} for i in changes["removed"]]
+                removed = set(changes["removed"])
+                applied = [i for i in old_order if i not in removed] + changes["added"]
+                if applied != order:
+                    ops.append({"op": "order", "ids": order})
+                if not ops:
+                    return None
+                _write_atomic(self._file("delta", version), _jsonl(ops))
+                entry.update({k: len(ids) for k, ids in changes.items()})
+
+            self.manifest["versions"][str(version)] = entry
+            self.manifest["head"] = version
+            self.manifest["next"] = version + 1
+            self._save_manifest()
+            self._state = (version, order, by_id)
+
+            if len(self.chain(version)) - 1 > COMPACT_AFTER:
+                self.compact_in_background(version)
+            return version
+
+    def rollback(self, version: int) -> None:
+        """Make `version` the head (instant: nothing is rewritten)."""
+        with self._lock:
+            self._reload()
+            self.chain(version)  # Must still be materializable
+            self.manifest["head"] = version
+            self._save_manifest()
+
+    def compact(self, version: int | None = None) -> bool:
+        """Write a base for `version` (default: head); False if it has one."""
+        with self._lock:
+            self._reload()
+            version = self.head if version is None else version
+            if version is None or self.entry(version)["base"]:
+                return False
+            order, by_id = self.state(version)
+            records = [by_id[i] for i in order]
+        # Slow part outside the lock: commits can go on meanwhile
+        _write_atomic(self._file("base", version), _jsonl(records))
+        with self._lock:
+            self._reload()
+            self.entry(version)["base"] = True
+            self._save_manifest()
+        return True
+
+    def compact_in_background(self, version: int) -> None:
+        """compact(version) on a thread; the process waits for it at exit."""
+        if self._compactor and self._compactor.is_alive():
+            return
+        self._compactor = threading.Thread(
+            target=self.compact, args=(version,), name="snapshot-compact"
+        )
+        self._compactor.start()
+
+    def wait(self) -> None:
+        if self._compactor:
+            self._compactor.join()
+
+    def prune(self, keep: int) -> tuple[int, int]:
+        """Drop versions outside the newest `keep` (and the head) and every
+        file none of the kept ones needs. Returns (versions, bytes) removed."""
+        self.wait()
+        with self._lock:
+            self._reload()
+            kept = set(self.versions()[-keep:]) if keep > 0 else set()
+            if self.head is not None:
+                kept.add(self.head)
+            needed: set[Path] = set()
+            for v in kept:
+                chain = self.chain(v)
+                needed.add(self._file("base", chain[0]))
+                needed.update(self._file("delta", d) for d in chain[1:])
+
+            dropped = 0
+            for v in self.versions():
+                entry = self.entry(v)
+                entry["base"] = self._file("base", v) in needed
+                if v not in kept and not entry["base"] and self._file("delta", v) not in needed:
+                    del self.manifest["versions"][str(v)]
+                    dropped += 1
+            self._save_manifest()
+            self._state = None
+
+        freed = 0
+        for path in self.dir.glob("*.jsonl"):
+            if path not in needed:
+                freed += path.stat().st_size
+                path.unlink()
+        return dropped, freed
+
+# ---------------------------------------------------------------------------
+# prompt_store backend
+# ---------------------------------------------------------------------------
+
+class SnapshotBackend:
+    """prompt_store backend for .snap manifests: load the head, save = commit."""
+
+    def __init__(self) -> None:
+        self._open: dict[Path, Snapshots] = {}
+
+    def snapshots(self, path: Path) -> Snapshots:
+        key = Path(path).resolve()
+        if key not in self._open:
+            self._open[key] = Snapshots(path)
+        return self._open[key]
+
+    def iter(self, path: Path) -> Iterator[Prompt]:
+        return iter(self.load(path))
+
+    def load(self, path: Path) -> list[Prompt]:
+        return self.snapshots(path).materialize()
+
+    def save(self, path: Path, prompts: list[Prompt | dict]) -> None:
+        self.snapshots(path).commit(prompts, note="prompt_store")
+
+
+prompt_store.register_backend(".snap", SnapshotBackend())
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Versioned snapshots of the prompt corpus.")
+    parser.add_argument("--snap", type=Path, default=SNAP_FILE, help="snapshot manifest")
+    sub = parser.add_subparsers(dest="command", required=True)
+    p = sub.add_parser("commit", help="record prompts.json as a new version")
+    p.add_argument("--data", type=Path, default=prompt_store.DATA_FILE)
+    p.add_argument("--note", default="")
+    p = sub.add_parser("log", help="list versions")
+    p.add_argument("--limit", type=int, default=30)
+    p = sub.add_parser("diff", help="prompts added / modified / removed between versions")
+    p.add_argument("old", type=int)
+    p.add_argument("new", type=int, nargs="?", default=None)
+    p = sub.add_parser("checkout", help="write a version to a file")
+    p.add_argument("version", type=int)
+    p.add_argument("--out", type=Path, required=True)
+    p = sub.add_parser("rollback", help="make a version the head and write it to prompts.json")
+    p.add_argument("version", type=int)
+    p.add_argument("--data", type=Path, default=prompt_store.DATA_FILE)
+    p.add_argument("--no-checkout", action="store_true", help="only move the head")
+    p = sub.add_parser("compact", help="write a base for the head")
+    p = sub.add_parser("prune", help="delete versions and files beyond the newest N")
+    p.add_argument("--keep", type=int, required=True)
+    args = parser.parse_args()
+
+    snaps = Snapshots(args.snap)
+
+    if args.command == "commit":
+        prompts = prompt_store.open_store(args.data).load()
+        version = snaps.commit(prompts, args.note)
+        snaps.wait()
+        if version is None:
+            print(f"No changes since version {snaps.head}")
+        else:
+            e = snaps.entry(version)
+            print(f"Version {version}: {e['count']} prompts "
+                  f"(+{e['added']} ~{e['modified']} -{e['removed']})")
+        return
+
+    if snaps.head is None:
+        sys.exit(f"No snapshots at {args.snap} - run `prompt_snapshots.py commit` first")
+
+    if args.command == "log":
+        for v in snaps.versions()[::-1][: args.limit]:
+            e = snaps.entry(v)
+            marker = "*" if v == snaps.head else " "
+            kind = "base" if e["base"] else "    "
+            print(f" {marker} {v:>5d}  {e['created_at'][:16].replace('T', ' ')}  {e['count']:>6d} prompts"
+                  f"  +{e['added']:<4d} ~{e['modified']:<4d} -{e['removed']:<4d} {kind}  {e['note']}")
+    elif args.command == "diff":
+        changes = snaps.diff(args.old, args.new)
+        new = snaps.head if args.new is None else args.new
+        print(f"{args.old} -> {new}: {len(changes['added'])} added, "
+              f"{len(changes['modified'])} modified, {len(changes['removed'])} removed")
+        for kind, ids in changes.items():
+            if ids:
+                print(f"  {kind:<9s} {', '.join(ids[:50])}{' ...' if len(ids) > 50 else ''}")
+    elif args.command == "checkout":
+        prompts = snaps.materialize(args.version)
+        prompt_store.open_store(args.out).save(prompts)
+        print(f"Wrote version {args.version} ({len(prompts)} prompts) to {args.out}")
+    elif args.command == "rollback":
+        snaps.rollback(args.version)
+        print(f"Head is now version {args.version}")
+        if not args.no_checkout:
+            prompts = snaps.materialize()
+            prompt_store.open_store(args.data).save(prompts)
+            print(f"Wrote {len(prompts)} prompts to {args.data}")
+            # As after a crawl: the --changeset stages must redo the reverted prompts
+            manifest_path = changeset.for_output(args.data)
+            manifest = changeset.load(manifest_path) if manifest_path else None
+            if manifest is not None:
+                manifest = changeset.write(manifest_path, manifest["base"], prompts)
+                print(f"Changeset: {changeset.summary(manifest)}")
+    elif args.command == "compact":
+        print(f"Wrote a base for version {snaps.head}" if snaps.compact() else "Head already has a base")
+    elif args.command == "prune":
+        dropped, freed = snaps.prune(args.keep)
+        print(f"Dropped {dropped} versions, freed {freed / 1e6:.1f} MB")
+
+
+if __name__ == "__main__":
+    main()
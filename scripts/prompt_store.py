@@ -0,0 +1,270 @@
+#!/usr/bin/env python3
+"""
+Prompt Store
+============
+The one place that reads and writes the prompt corpus (data/prompts.json),
+used by the crawler, the categorizer, the HTML / Dify generators and the
+data/*.py tools.
+
+  store = prompt_store.open_store()   # data/prompts.json unless told otherwise
+  store.load()         all prompts; parsed once per process and reused until
+                       the file's mtime or size changes
+  for p in store: ...  prompts one at a time, parsed only as far as the
+                       caller reads (or straight from the cache if loaded)
+  store.get("123")     one prompt by ID, without parsing the rest when the
+                       corpus is not loaded yet
+  store.save(prompts)  atomic write; the saved list becomes the cached copy
+
+Records are prompt_record.Prompt objects (slotted, categories interned);
+save() also takes plain dicts, e.g. fresh records from the crawler. load()
+hands out the cached records, shared by every caller in the process: treat
+them as read-only unless you save() what you changed.
+
+The file format comes from the path's suffix via BACKENDS - ".json" (a JSON
+array, the default) and ".jsonl" (one record per line). register_backend()
+adds more, so a faster format reaches every script at once; a backend with
+a get(path, id) method serves get() directly (prompt_pack.py's ".pack").
+
+Usage:
+  python prompt_store.py [PATH]     # summarize a store
+"""
+
+import io
+import json
+import os
+import re
+import sys
+from pathlib import Path
+from typing import Iterator, Protocol
+
+from prompt_record import Prompt
+
+if sys.platform == "win32":
+    sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding="utf-8", errors="replace")
+
+PROJECT_DIR = Path(__file__).resolve().parent.parent
+DATA_FILE = PROJECT_DIR / "data" / "prompts.json"
+
+# ---------------------------------------------------------------------------
+# Backends
+# ---------------------------------------------------------------------------
+
+class Backend(Protocol):
+    def iter(self, path: Path) -> Iterator[Prompt]: ...
+    def load(self, path: Path) -> list[Prompt]: ...
+    def save(self, path: Path, prompts: list[Prompt | dict]) -> None: ...
+
+
+def as_prompt(p: Prompt | dict) -> Prompt:
+    return p if isinstance(p, Prompt) else Prompt.from_dict(p)
+
+
+def as_dict(p: Prompt | dict) -> dict:
+    return p.to_dict() if isinstance(p, Prompt) else p
+
+
+def _replace_atomic(path: Path, write) -> None:
+    """Write via a temp file and rename, so readers never see a partial file."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(f"{path.name}.tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        write(f)
+    os.replace(tmp, path)
+
+
+class JsonBackend:
+    """A JSON array of prompt objects (the format of prompts.json)."""
+
+    _WS = re.compile(r"[ \t\n\r]*")
+    CHUNK_CHARS = 1 << 16
+
+    def __init__(self, indent: int | None = 2) -> None:
+        self.indent = indent
+
+    def iter(self, path: Path) -> Iterator[Prompt]:
+        # Read in chunks and decode one array element at a time, so a caller
+        # that stops early (e.g. get()) reads only the start of the file
+        decoder = json.JSONDecoder()
+        ws = self._WS.match
+        with open(path, "r", encoding="utf-8") as f:
+            buf, pos, eof = "", 0, False
+
+            def more() -> None:
+                nonlocal buf, pos, eof
+                chunk = f.read(self.CHUNK_CHARS)
+                eof = not chunk
+                buf, pos = buf[pos:] + chunk, 0
+
+            def peek() -> str:
+                """Next non-whitespace character ("" at the end of the file)."""
+                nonlocal pos
+                while True:
+                    pos = ws(buf, pos).end()
+                    if pos < len(buf) or eof:
+                        return buf[pos:pos + 1]
+                    more()
+
+            if peek() != "[":
+                raise json.JSONDecodeError("Expected a JSON array", buf, pos)
+            pos += 1
+            if peek() == "]":
+                return
+            while True:
+                while True:
+                    try:
+                        record, end = decoder.raw_decode(buf, pos)
+                        # A value ending exactly at the buffer end may be cut short
+                        if end < len(buf) or eof:
+                            break
+                    except json.JSONDecodeError:
+                        if eof:
+                            raise
+                    more()
+                pos = end
+                yield Prompt.from_dict(record)
+                sep = peek()
+                if sep == "]":
+                    return
+                if sep != ",":
+                    raise json.JSONDecodeError("Expected ',' or ']'", buf, pos)
+                pos += 1
+                peek()
+
+    def load(self, path: Path) -> list[Prompt]:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f, object_hook=Prompt.from_dict)
+
+    def save(self, path: Path, prompts: list[Prompt | dict]) -> None:
+        _replace_atomic(path, lambda f: json.dump(
+            prompts, f, ensure_ascii=False, indent=self.indent, default=Prompt.to_dict
+        ))
+
+
+class JsonlBackend:
+    """One prompt object per line."""
+
+    def iter(self, path: Path) -> Iterator[Prompt]:
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    yield Prompt.from_dict(json.loads(line))
+
+    def load(self, path: Path) -> list[Prompt]:
+        return list(self.iter(path))
+
+    def save(self, path: Path, prompts: list[Prompt | dict]) -> None:
+        def write(f):
+            for p in prompts:
+                f.write(json.dumps(as_dict(p), ensure_ascii=False) + "\n")
+        _replace_atomic(path, write)
+
+
+BACKENDS: dict[str, Backend] = {
+    ".json": JsonBackend(),
+    ".jsonl": JsonlBackend(),
+}
+
+
+def register_backend(suffix: str, backend: Backend) -> None:
+    """Use `backend` for every store whose path ends in `suffix`."""
+    BACKENDS[suffix] = backend
+
+# ---------------------------------------------------------------------------
+# Store
+# ---------------------------------------------------------------------------
+
+class PromptStore:
+    """One prompt file, with its parsed contents cached per process."""
+
+    def __init__(self, path: Path, backend: Backend | None = None) -> None:
+        self.path = Path(path)
+        self.backend = backend or BACKENDS.get(self.path.suffix, BACKENDS[".json"])
+        self._stamp: tuple[int, int] | None = None
+        self._prompts: list[Prompt] = []
+        self._by_id: dict[str, Prompt] | None = None
+
+    def exists(self) -> bool:
+        return self.path.exists()
+
+    def _current_stamp(self) -> tuple[int, int] | None:
+        try:
+            st = self.path.stat()
+        except FileNotFoundError:
+            return None
+        return st.st_mtime_ns, st.st_size
+
+    def _fresh(self) -> bool:
+        return self._stamp is not None and self._stamp == self._current_stamp()
+
+    def load(self) -> list[Prompt]:
+        """All prompts ([] if the file does not exist), cached until it changes."""
+        if self._fresh():
+            return self._prompts
+        stamp = self._current_stamp()
+        if stamp is None:
+            return []
+        self._prompts = self.backend.load(self.path)
+        self._by_id = None
+        self._stamp = stamp
+        return self._prompts
+
+    def __iter__(self) -> Iterator[Prompt]:
+        if self._fresh():
+            return iter(self._prompts)
+        if not self.exists():
+            return iter(())
+        return self.backend.iter(self.path)
+
+    def get(self, prompt_id: str) -> Prompt | None:
+        if self._fresh():
+            if self._by_id is None:
+                self._by_id = {p.id: p for p in self._prompts}
+            return self._by_id.get(prompt_id)
+        if not self.exists():
+            return None
+        if hasattr(self.backend, "get"):
+            return self.backend.get(self.path, prompt_id)
+        return next((p for p in self if p.id == prompt_id), None)
+
+    def ids(self) -> list[str]:
+        return [p.id for p in self]
+
+    def save(self, prompts: list[Prompt | dict]) -> None:
+        self.backend.save(self.path, prompts)
+        self._prompts = [as_prompt(p) for p in prompts]
+        self._by_id = None
+        self._stamp = self._current_stamp()
+
+
+_STORES: dict[tuple[Path, int], PromptStore] = {}
+
+
+def open_store(path: Path = DATA_FILE, backend: Backend | None = None) -> PromptStore:
+    """The process-wide store for `path` (one parsed copy however many callers)."""
+    key = (Path(path).resolve(), id(backend))
+    if key not in _STORES:
+        _STORES[key] = PromptStore(path, backend)
+    return _STORES[key]
+
+
+def main() -> None:
+    # These register themselves with the imported prompt_store, not __main__
+    import prompt_pack
+    import prompt_snapshots
+    register_backend(".pack", prompt_pack.PackBackend())
+    register_backend(".snap", prompt_snapshots.SnapshotBackend())
+
+    path = Path(sys.argv[1]) if len(sys.argv) > 1 else DATA_FILE
+    store = open_store(path)
+    if not store.exists():
+        sys.exit(f"No prompt store at {path}")
+    prompts = store.load()
+    categorized = sum(1 for p in prompts if p.mask)
+    print(f"{path} ({type(store.backend).__name__}, {path.stat().st_size / 1e6:.1f} MB)")
+    print(f"  {len(prompts)} prompts, {categorized} categorized")
+    if prompts:
+        print(f"  IDs {prompts[0].id} .. {prompts[-1].id}")
+
+
+if __name__ == "__main__":
+    main()
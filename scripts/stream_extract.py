@@ -0,0 +1,315 @@
+"""
+Streaming Extractor
+===================
+Single-pass alternative to the BeautifulSoup path of parse_page(), built on
+html.parser callbacks. No tree is materialised: the parser keeps a stack of
+open elements plus a few text "captures" for the parts parse_page() reads
+(first .box-title / <title> / <h1>, every .box-bun and its direct children,
+and the .form-content / <body> fallbacks).
+
+To give identical output it reproduces the rules of BeautifulSoup's
+"html.parser" tree builder that affect get_text(strip=True):
+  - void elements close immediately, and a later </br> etc. is swallowed
+  - an end tag pops back to the most recent open element of that name,
+    or is ignored if there is none; unclosed elements close at EOF
+  - text is split into strings at tags, comments and declarations
+  - only plain text and CDATA count as text; inside <script>, <style>,
+    <template>, <rt> and <rp> strings take that element's type, so only
+    get_text() on that same kind of element sees them
+
+Check it against the BeautifulSoup path with:
+  python crawl_prompts.py --verify-extractor
+"""
+
+import re
+from html.entities import html5
+from html.parser import HTMLParser
+
+# BeautifulSoup's HTMLTreeBuilder.DEFAULT_EMPTY_ELEMENT_TAGS
+VOID_ELEMENTS = frozenset({
+    "area", "base", "basefont", "bgsound", "br", "col", "command", "embed",
+    "frame", "hr", "image", "img", "input", "isindex", "keygen", "link",
+    "menuitem", "meta", "nextid", "param", "source", "spacer", "track", "wbr",
+})
+
+# Elements whose strings BeautifulSoup stores with a special string class
+STRING_CONTAINERS = frozenset({"rt", "rp", "style", "script", "template"})
+
+TEXT = "text"
+CDATA = "cdata"
+MAIN_TYPES = frozenset({TEXT, CDATA})
+
+# Direct children of .box-bun that parse_page() leaves out of the content
+BOX_SKIP_TAGS = frozenset({"h2", "script", "style", "button", "input", "select", "br"})
+
+# Tags decomposed from .form-content before the fallback get_text()
+FALLBACK_EXCLUDED = frozenset({"script", "style", "input", "textarea", "select", "button"})
+
+_DEC_PREFIX = re.compile("^([0-9]+)(.*)")
+_HEX_PREFIX = re.compile("^([0-9a-f]+)(.*)")
+
+
+def _charref(name: str) -> str:
+    """Numeric character reference, resolved the way BeautifulSoup does."""
+    base, digits, prefix = (16, name[1:], _HEX_PREFIX) if name[:1] in "xX" else (10, name, _DEC_PREFIX)
+    extra = ""
+    try:
+        num = int(digits, base)
+    except ValueError:
+        m = prefix.match(digits)
+        if m is None:
+            return digits
+        num, extra = int(m.group(1), base), m.group(2)
+
+    if num == 0 or num > 0x10FFFF or 0xD800 <= num <= 0xDFFF:
+        return "\ufffd" + extra
+    if 0x80 <= num <= 0x9F:
+        try:
+            return bytes([num]).decode("cp1252") + extra
+        except UnicodeDecodeError:
+            pass
+    return chr(num) + extra
+
+
+class _Capture:
+    """Stripped strings of one element, as Tag.get_text(strip=True) sees them."""
+
+    __slots__ = ("types", "excluded", "blocked", "parts")
+
+    def __init__(self, name: str, excluded: frozenset = frozenset()) -> None:
+        self.types = frozenset({name}) if name in STRING_CONTAINERS else MAIN_TYPES
+        self.excluded = excluded
+        self.blocked = 0  # > 0 while inside an excluded descendant
+        self.parts: list[str] = []
+
+
+class _Box:
+    """One .box-bun section being assembled."""
+
+    __slots__ = ("index", "heading", "parts")
+
+    def __init__(self, index: int) -> None:
+        self.index = index
+        self.heading: _Capture | None = None
+        self.parts: list[str] = []
+
+
+class _Frame:
+    """An open element."""
+
+    __slots__ = ("name", "captures", "blocks", "box", "child")
+
+    def __init__(self, name: str) -> None:
+        self.name = name
+        self.captures: list[_Capture] = []
+        self.blocks: list[_Capture] = []
+        self.box: _Box | None = None
+        self.child: tuple[_Box, _Capture] | None = None
+
+
+class StreamExtractor(HTMLParser):
+    def __init__(self) -> None:
+        super().__init__(convert_charrefs=False)
+        self._stack: list[_Frame] = []
+        self._open: dict[str, int] = {}
+        self._containers: list[str] = []
+        self._active: list[_Capture] = []
+        self._already_closed: list[str] = []
+        self._data: list[str] = []
+        self._open_boxes: list[_Box] = []
+
+        self.sections: list[str | None] = []
+        self.box_title: _Capture | None = None
+        self.title: _Capture | None = None
+        self.h1: _Capture | None = None
+        self.form_content: _Capture | None = None
+        self.body: _Capture | None = None
+
+    # --- strings -----------------------------------------------------------
+
+    def _flush(self, kind: str | None = None) -> None:
+        if not self._data:
+            return
+        text = "".join(self._data).strip()
+        self._data = []
+        if not text:
+            return  # Every consumer strips and drops empty strings
+        if kind is None:
+            kind = self._containers[-1] if self._containers else TEXT
+
+        for capture in self._active:
+            if not capture.blocked and kind in capture.types:
+                capture.parts.append(text)
+
+        # A bare string directly inside a box is one of its children
+        top = self._stack[-1] if self._stack else None
+        if top is not None and top.box is not None and kind in MAIN_TYPES:
+            top.box.parts.append(text)
+
+    def handle_data(self, data: str) -> None:
+        self._data.append(data)
+
+    def handle_charref(self, name: str) -> None:
+        self._data.append(_charref(name))
+
+    def handle_entityref(self, name: str) -> None:
+        char = html5.get(name + ";") or html5.get(name)
+        self._data.append(char if char is not None else f"&{name}")
+
+    def _special(self, data: str, kind: str) -> None:
+        self._flush()
+        self._data.append(data)
+        self._flush(kind)
+
+    def handle_comment(self, data: str) -> None:
+        self._special(data, "comment")
+
+    def handle_decl(self, decl: str) -> None:
+        self._special(decl, "declaration")
+
+    def handle_pi(self, data: str) -> None:
+        self._special(data, "pi")
+
+    def unknown_decl(self, data: str) -> None:
+        if data.upper().startswith("CDATA["):
+            self._special(data[len("CDATA["):], CDATA)
+        else:
+            self._special(data, "declaration")
+
+    # --- elements ----------------------------------------------------------
+
+    def _open_capture(self, frame: _Frame, capture: _Capture) -> _Capture:
+        frame.captures.append(capture)
+        self._active.append(capture)
+        return capture
+
+    def _push(self, tag: str, attrs: list[tuple[str, str | None]]) -> None:
+        self._flush()
+
+        class_value = None
+        for key, value in attrs:
+            if key == "class":
+                class_value = value  # Duplicate attributes: last one wins
+        classes = class_value.split() if class_value else []
+
+        parent = self._stack[-1] if self._stack else None
+        frame = _Frame(tag)
+
+        # Entering an excluded subtree of an active capture (decompose())
+        for capture in self._active:
+            if tag in capture.excluded:
+                capture.blocked += 1
+                frame.blocks.append(capture)
+
+        if parent is not None and parent.box is not None:
+            if not (tag in BOX_SKIP_TAGS or (tag == "div" and "box-title" in classes)):
+                frame.child = (parent.box, self._open_capture(frame, _Capture(tag)))
+
+        if "box-title" in classes and self.box_title is None:
+            self.box_title = self._open_capture(frame, _Capture(tag))
+        if tag == "title" and self.title is None:
+            self.title = self._open_capture(frame, _Capture(tag))
+        if tag == "h1" and self.h1 is None:
+            self.h1 = self._open_capture(frame, _Capture(tag))
+        if tag == "h2":
+            waiting = [box for box in self._open_boxes if box.heading is None]
+            if waiting:
+                heading = self._open_capture(frame, _Capture(tag))
+                for box in waiting:
+                    box.heading = heading
+        if "box-bun" in classes:
+            frame.box = _Box(len(self.sections))
+            self.sections.append(None)
+            self._open_boxes.append(frame.box)
+        if "form-content" in classes and self.form_content is None:
+            self.form_content = self._open_capture(frame, _Capture(tag, FALLBACK_EXCLUDED))
+        if tag == "body" and self.body is None:
+            self.body = self._open_capture(frame, _Capture(tag))
+
+        self._stack.append(frame)
+        self._open[tag] = self._open.get(tag, 0) + 1
+        if tag in STRING_CONTAINERS:
+            self._containers.append(tag)
+
+    def _pop(self) -> None:
+        frame = self._stack.pop()
+        self._open[frame.name] -= 1
+        if frame.name in STRING_CONTAINERS:
+            self._containers.pop()
+        for capture in frame.blocks:
+            capture.blocked -= 1
+        if frame.captures:
+            del self._active[-len(frame.captures):]
+
+        if frame.child is not None:
+            box, capture = frame.child
+            value = "".join(capture.parts)
+            if value:
+                box.parts.append(value)
+
+        if frame.box is not None:
+            box = self._open_boxes.pop()
+            section_title = "".join(box.heading.parts) if box.heading else ""
+            content = "\n".join(box.parts)
+            if section_title and content:
+                self.sections[box.index] = f"[{section_title}]\n{content}"
+            elif section_title:
+                self.sections[box.index] = f"[{section_title}]"
+            elif content:
+                self.sections[box.index] = content
+
+    def _end(self, tag: str) -> None:
+        self._flush()
+        if not self._open.get(tag):
+            return
+        while self._stack:
+            name = self._stack[-1].name
+            self._pop()
+            if name == tag:
+                break
+
+    def handle_starttag(self, tag: str, attrs: list[tuple[str, str | None]]) -> None:
+        self._push(tag, attrs)
+        if tag in VOID_ELEMENTS:
+            self._end(tag)
+            self._already_closed.append(tag)
+
+    def handle_startendtag(self, tag: str, attrs: list[tuple[str, str | None]]) -> None:
+        self._push(tag, attrs)
+        self._end(tag)
+
+    def handle_endtag(self, tag: str) -> None:
+        if tag in self._already_closed:
+            self._already_closed.remove(tag)
+        else:
+            self._end(tag)
+
+    def close(self) -> None:
+        super().close()
+        self._flush()
+        while self._stack:
+            self._pop()
+
+
+def extract(html: str) -> tuple[str | None, str | None]:
+    """
+    Return (title, body) exactly as parse_page()'s BeautifulSoup path builds
+    them. title is None if the page has no title element; body is None if
+    it has no .box-bun, no .form-content and no body text.
+    """
+    parser = StreamExtractor()
+    parser.feed(html)
+    parser.close()
+
+    title_capture = parser.box_title or parser.title or parser.h1
+    title = "".join(title_capture.parts) if title_capture else None
+
+    if parser.sections:
+        body = "\n\n".join(s for s in parser.sections if s is not None)
+    elif parser.form_content is not None:
+        body = "\n".join(parser.form_content.parts)
+    else:
+        body = "\n".join(parser.body.parts) if parser.body else ""
+        if not body:
+            body = None
+    return title, body
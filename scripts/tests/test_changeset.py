@@ -0,0 +1,53 @@
+"""changeset: record hashes, manifest diffing and which outputs have one."""
+
+import changeset
+
+
+def prompt(pid: str, body: str = "body text", categories: list[str] | None = None) -> dict:
+    p = {"id": pid, "title": f"Title {pid}", "body": body}
+    if categories is not None:
+        p["categories"] = categories
+    return p
+
+
+def test_record_hash_covers_content_and_categories() -> None:
+    base = prompt("001", categories=["#a"])
+    assert changeset.record_hash(base) == changeset.record_hash(dict(base))
+    assert changeset.record_hash(base) != changeset.record_hash(prompt("001", "edited", ["#a"]))
+    assert changeset.record_hash(base) != changeset.record_hash(prompt("001", categories=["#b"]))
+    # Order matters: the first tag is the primary category
+    assert changeset.record_hash(prompt("001", categories=["#a", "#b"])) != changeset.record_hash(
+        prompt("001", categories=["#b", "#a"])
+    )
+
+
+def test_write_diffs_against_base(tmp_path) -> None:
+    path = tmp_path / "changeset.json"
+    before = [prompt("001"), prompt("002"), prompt("003")]
+    after = [prompt("001"), prompt("002", "edited"), prompt("004")]
+    manifest = changeset.write(path, changeset.hashes(before), after)
+
+    assert (manifest["added"], manifest["modified"], manifest["removed"]) == (["004"], ["002"], ["003"])
+    assert changeset.load(path) == manifest
+    assert changeset.changed_ids(manifest) == {"002", "004"}
+    assert not changeset.is_empty(manifest)
+    assert changeset.summary(manifest) == "1 added, 1 modified, 1 removed"
+
+
+def test_runs_accumulate_against_the_pending_base(tmp_path) -> None:
+    path = tmp_path / "changeset.json"
+    before = [prompt("001"), prompt("002")]
+    first = [prompt("001", "edited"), prompt("002")]
+    changeset.write(path, changeset.base_for_run(path, before), first)
+    second = [prompt("001", "edited"), prompt("002", "edited too")]
+    manifest = changeset.write(path, changeset.base_for_run(path, first), second)
+    assert manifest["modified"] == ["001", "002"]
+
+    # Committing makes the current corpus the base and empties the lists
+    manifest = changeset.write(path, changeset.hashes(second), second)
+    assert changeset.is_empty(manifest)
+
+
+def test_only_the_pipeline_output_has_a_changeset(tmp_path) -> None:
+    assert changeset.for_output(changeset.DATA_FILE) == changeset.CHANGESET_FILE
+    assert changeset.for_output(tmp_path / "prompts.json") is None
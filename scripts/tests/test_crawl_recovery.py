@@ -0,0 +1,91 @@
+"""
+Regression: when prompts.json is lost, the next crawl must rebuild every
+record even though the state DB still marks the pages ok and the server
+answers conditional requests with 304.
+"""
+
+import json
+import shutil
+import threading
+from functools import partial
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+import pytest
+
+import crawl_prompts
+import prompt_store
+
+FIXTURES = Path(__file__).parent / "fixtures" / "html"
+PAGES = ["001-site.html", "002-site.html", "003-rendered.html"]
+
+
+class QuietHandler(SimpleHTTPRequestHandler):
+    # Serves Last-Modified and answers If-Modified-Since with 304
+    def log_message(self, *args) -> None:
+        pass
+
+
+@pytest.fixture
+def site(tmp_path):
+    root = tmp_path / "site"
+    root.mkdir()
+    for i, name in enumerate(PAGES, 1):
+        shutil.copy(FIXTURES / name, root / f"{i:03d}.html")
+    server = ThreadingHTTPServer(("127.0.0.1", 0), partial(QuietHandler, directory=str(root)))
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_address[1]}/"
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def crawl(tmp_path, site):
+    output = tmp_path / "prompts.json"
+
+    def run(*extra: str) -> list[str]:
+        crawl_prompts.main([
+            "--base-url", site, "--start", "1", "--end", str(len(PAGES)),
+            "--rate", "1000", "--concurrency", "1", "--parse-workers", "1",
+            "--output", str(output),
+            "--state-db", str(tmp_path / "crawl_state.db"),
+            "--cache-dir", str(tmp_path / "cache"),
+            "--log-file", str(tmp_path / "crawler.log"),
+            "--metrics-json", str(tmp_path / "metrics.json"),
+            "--metrics-prom", str(tmp_path / "metrics.prom"),
+            *extra,
+        ])
+        return [p.id for p in prompt_store.open_store(output).load()] if output.exists() else []
+
+    run.output = output
+    return run
+
+
+def outcomes(tmp_path) -> dict[str, int]:
+    return json.loads((tmp_path / "metrics.json").read_text(encoding="utf-8"))["outcomes"]
+
+
+def test_refresh_still_gets_304_for_intact_output(crawl, tmp_path) -> None:
+    assert crawl() == ["001", "002", "003"]
+    assert crawl("--refresh", "--max-age", "0") == ["001", "002", "003"]
+    assert outcomes(tmp_path)["not_modified"] == 3
+
+
+def test_refresh_rebuilds_a_lost_output(crawl, tmp_path) -> None:
+    crawl()
+    crawl.output.unlink()
+    assert crawl("--refresh", "--max-age", "0") == ["001", "002", "003"]
+    assert outcomes(tmp_path).get("not_modified", 0) == 0
+
+
+def test_plain_run_rebuilds_a_lost_output(crawl) -> None:
+    crawl()
+    crawl.output.unlink()
+    assert crawl() == ["001", "002", "003"]
+
+
+def test_reparse_rebuilds_from_the_cache(crawl, site) -> None:
+    crawl()
+    crawl.output.unlink()
+    assert crawl("--reparse") == ["001", "002", "003"]
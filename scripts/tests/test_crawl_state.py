@@ -0,0 +1,97 @@
+"""CrawlState scheduling: retries with backoff, validators, dead ranges."""
+
+import time
+
+import pytest
+
+import crawl_state
+from crawl_state import CrawlState, retry_delay
+
+
+@pytest.fixture
+def state(tmp_path):
+    s = CrawlState(tmp_path / "crawl_state.db")
+    yield s
+    s.close()
+
+
+def test_retry_delay_doubles_up_to_the_cap() -> None:
+    base = crawl_state.RETRY_BASE_SECONDS
+    assert [retry_delay(n) for n in (1, 2, 3)] == [base, 2 * base, 4 * base]
+    assert retry_delay(50) == crawl_state.RETRY_MAX_SECONDS
+
+
+def test_errors_back_off_and_success_resets(state) -> None:
+    now = time.time()
+    state.record("001", "error", None)
+    state.record("001", "error", 500)
+    row = state.rows["001"]
+    assert (row["attempts"], row["failures"]) == (2, 2)
+    assert row["next_eligible"] == pytest.approx(now + retry_delay(2), abs=5)
+    assert not state.is_due("001", now, refresh=False, max_age=0)
+    assert state.is_due("001", now + retry_delay(2) + 5, refresh=False, max_age=0)
+
+    state.record("001", "ok", 200)
+    assert state.rows["001"]["failures"] == 0
+    assert state.due_ids(["001", "002"]) == ["002"]  # ok: not due; never seen: due
+
+
+def test_refresh_revisits_stale_pages(state) -> None:
+    state.record("001", "ok", 200)
+    state.record("002", "missing", 404)
+    now = time.time()
+    assert state.due_ids(["001", "002"], refresh=True, max_age=3600) == []
+    assert state.is_due("001", now + 7200, refresh=True, max_age=3600)
+    assert state.is_due("002", now + crawl_state.MISSING_RECHECK_SECONDS + 5, refresh=True, max_age=0)
+
+
+def test_ok_pages_without_a_record_are_due(state) -> None:
+    state.record("001", "ok", 200)
+    state.record("002", "ok", 200)
+    state.record("003", "empty", 200)
+    assert state.due_ids(["001", "002", "003"], have={"001"}) == ["002"]
+
+
+def test_validators_round_trip(tmp_path, state) -> None:
+    state.update("001", {"ETag": '"v1"', "Last-Modified": "Sat, 01 Jan 2026 00:00:00 GMT"})
+    state.record("001", "ok", 200)
+    expected = {"If-None-Match": '"v1"', "If-Modified-Since": "Sat, 01 Jan 2026 00:00:00 GMT"}
+    assert state.request_headers("001") == expected
+
+    reopened = CrawlState(tmp_path / "crawl_state.db")
+    assert reopened.request_headers("001") == expected
+    reopened.drop_validators(["001"])
+    assert reopened.request_headers("001") == {}
+    reopened.close()
+
+    state.record("001", "error", None)  # A failed fetch forgets them
+    assert state.request_headers("001") == {}
+
+
+def test_not_modified_keeps_an_empty_page_empty(state) -> None:
+    state.record("001", "empty", 200)
+    state.record("001", "ok", 304)
+    assert state.rows["001"]["status"] == "empty"
+
+
+def test_dead_ranges_skip_unfetched_ids_until_rechecked(state) -> None:
+    state.set_dead_ranges([(5, 9)], "index")
+    now = time.time()
+    assert state.due_ids(["004", "005", "009", "010"]) == ["004", "010"]
+    later = now + crawl_state.DEAD_RANGE_RECHECK_SECONDS + 5
+    assert state.is_due("007", later, refresh=False, max_age=0)
+
+    state.set_dead_ranges([], "index")  # Replaces that source's ranges
+    assert state.due_ids(["007"]) == ["007"]
+
+
+def test_max_live_id(state) -> None:
+    state.record("003", "ok", 200)
+    state.record("010", "empty", 200)
+    state.record("020", "missing", 404)
+    assert state.max_live_id() == 10
+
+
+def test_rejects_unknown_journal_mode(tmp_path) -> None:
+    with pytest.raises(ValueError):
+        CrawlState(tmp_path / "s.db", journal_mode="memory")
@@ -0,0 +1,45 @@
+"""
+parse_page() and parse_page_stream() must return the same record for every
+page. `crawl_prompts.py --verify-extractor` checks this on the local HTML
+cache; these fixtures make the check runnable on a fresh checkout:
+
+  fixtures/html/00x-*.html   well-formed pages in the site's layout
+  fixtures/html/01x-*.html   malformed: truncated, lost end tags, junk
+  fixtures/html/02x-*.html   fallback layouts (no .box-bun, h1 title, ...)
+  fixtures/html/03x-*.html   pages that hold no prompt
+
+Usage:
+  python -m pytest scripts/tests -q
+"""
+
+import logging
+from pathlib import Path
+
+import pytest
+
+from crawl_prompts import parse_page, parse_page_stream
+
+FIXTURES = sorted((Path(__file__).parent / "fixtures" / "html").glob("*.html"))
+
+
+@pytest.fixture(autouse=True)
+def quiet_extractors():
+    # Both extractors warn about the same pages
+    logging.disable(logging.WARNING)
+    yield
+    logging.disable(logging.NOTSET)
+
+
+@pytest.mark.parametrize("path", FIXTURES, ids=lambda p: p.stem)
+def test_extractors_agree(path: Path) -> None:
+    html = path.read_text(encoding="utf-8")
+    assert parse_page(html, "001") == parse_page_stream(html, "001")
+
+
+@pytest.mark.parametrize("path", FIXTURES, ids=lambda p: p.stem)
+def test_fixture_outcome(path: Path) -> None:
+    record = parse_page(path.read_text(encoding="utf-8"), "001")
+    if path.name.startswith("03"):
+        assert record is None
+    else:
+        assert record is not None and record["title"] and record["body"]
@@ -0,0 +1,41 @@
+"""id_discovery: index parsing, gaps and the upper-bound search."""
+
+import pytest
+
+from id_discovery import find_upper_bound, gaps, ids_from_index
+
+
+def test_ids_from_index() -> None:
+    html = (
+        '<a href="001.html">1</a> <a href=\'/prompt/012.html\'>12</a>'
+        ' <a HREF=https://example.jp/prompt/1234.html>x</a>'
+        ' <a href="style.css"></a> <a href="12.html">too short</a>'
+    )
+    assert ids_from_index(html) == {1, 12, 1234}
+
+
+def test_gaps() -> None:
+    assert gaps({1, 2, 5, 6, 9}) == [(3, 4), (7, 8)]
+    assert gaps({3, 4}, start=1) == [(1, 2)]
+    assert gaps(set()) == []
+
+
+@pytest.mark.parametrize("known_max", [0, 1, 40, 97])
+def test_find_upper_bound_steps_over_short_gaps(known_max: int) -> None:
+    live = set(range(1, 101)) - {10, 11, 12, 50, 51, 52, 53}  # Gaps shorter than the window
+    calls: list[int] = []
+
+    def alive(n: int) -> bool:
+        calls.append(n)
+        return n in live
+
+    last, first_dead = find_upper_bound(alive, known_max=known_max, window=5)
+    assert last == 100
+    assert first_dead > last
+    assert len(calls) == len(set(calls))  # Each ID is fetched at most once
+    assert len(calls) < 60
+
+
+def test_find_upper_bound_respects_limit() -> None:
+    assert find_upper_bound(lambda n: True, limit=50) == (50, 51)
+    assert find_upper_bound(lambda n: False) == (0, 1)
@@ -0,0 +1,39 @@
+"""KeywordMatcher must report exactly the keywords a substring search finds."""
+
+import random
+
+import pytest
+
+from keyword_matcher import KeywordMatcher
+
+
+def naive(keywords: list[str], text: str) -> set[int]:
+    return {i for i, kw in enumerate(keywords) if kw in text}
+
+
+@pytest.mark.parametrize("keywords, text", [
+    (["he", "she", "his", "hers"], "ushers"),
+    (["a", "ab", "bab", "bc", "bca", "c", "caa"], "abccab"),
+    (["要約", "要点", "まとめ", "文章作成"], "文章作成の要点をまとめる"),
+    (["abc"], ""),
+    (["x", "x"], "xx"),  # Duplicate keywords are reported under both indices
+])
+def test_matches_substring_search(keywords: list[str], text: str) -> None:
+    assert KeywordMatcher(keywords).find(text)[-1] == naive(keywords, text)
+
+
+def test_random_texts() -> None:
+    rng = random.Random(0)
+    alphabet = "abc"
+    for _ in range(200):
+        keywords = ["".join(rng.choices(alphabet, k=rng.randint(1, 4))) for _ in range(rng.randint(1, 8))]
+        text = "".join(rng.choices(alphabet, k=rng.randint(0, 30)))
+        assert KeywordMatcher(keywords).find(text)[-1] == naive(keywords, text)
+
+
+def test_parts_report_cumulative_hits() -> None:
+    keywords = ["title", "body", "lebo"]
+    title_hits, all_hits = KeywordMatcher(keywords).find("title", "body")
+    assert title_hits == {0}
+    # The scan runs over the concatenation, so a match may span both parts
+    assert all_hits == {0, 1, 2}
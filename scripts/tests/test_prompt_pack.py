@@ -0,0 +1,61 @@
+"""prompt_pack: hash-table lookups over the mapped pack match the corpus."""
+
+import pytest
+
+import prompt_pack
+import prompt_store
+from prompt_pack import PackedCorpus
+
+PROMPTS = [
+    {"id": f"{n:03d}", "title": f"タイトル {n}", "body": f"本文 {n} " * n,
+     "url": f"https://example.jp/{n:03d}.html",
+     "categories": ["#業務改善", "#文章作成・要約"] if n % 3 == 0 else ["#文章作成・要約"]}
+    for n in range(1, 41)
+] + [{"id": "x-1", "title": "no url, no categories", "body": "絵文字 🙂"}]
+
+
+@pytest.fixture
+def pack(tmp_path):
+    path = tmp_path / "prompts.pack"
+    prompt_pack.write(path, PROMPTS)
+    with PackedCorpus(path) as corpus:
+        yield corpus
+
+
+def test_get_every_record(pack) -> None:
+    assert len(pack) == len(PROMPTS)
+    for p in PROMPTS:
+        assert pack.get(p["id"]) == p
+        assert pack.title(p["id"]) == p["title"]
+        assert p["id"] in pack
+
+
+def test_missing_ids(pack) -> None:
+    for pid in ("000", "041", "", "x" * 40):
+        assert pack.get(pid) is None
+        assert pack.title(pid) is None
+        assert pid not in pack
+
+
+def test_order_and_category_filter(pack) -> None:
+    assert [p.id for p in pack] == [p["id"] for p in PROMPTS]
+    assert pack.ids() == [p["id"] for p in PROMPTS]
+    assert pack.ids("#業務改善") == [p["id"] for p in PROMPTS if "#業務改善" in p.get("categories", [])]
+    assert pack.ids("#unknown") == []
+
+
+def test_rejects_bad_ids() -> None:
+    with pytest.raises(ValueError):
+        prompt_pack.pack([{"id": "x" * 17, "title": "t", "body": "b"}])
+    with pytest.raises(ValueError):
+        prompt_pack.pack([{"id": "001", "title": "t", "body": "b"}] * 2)
+
+
+def test_store_backend_uses_the_pack(tmp_path) -> None:
+    path = tmp_path / "prompts.pack"
+    store = prompt_store.open_store(path)
+    store.save(PROMPTS)
+    assert store.get("030") == PROMPTS[29]
+    assert store.get("999") is None
+    store.save(PROMPTS[:5])  # Rewriting remaps the file
+    assert prompt_store.open_store(path).get("030") is None
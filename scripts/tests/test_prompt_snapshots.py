@@ -0,0 +1,90 @@
+"""prompt_snapshots: deltas, rollback, compaction and pruning."""
+
+import pytest
+
+import prompt_snapshots
+from prompt_snapshots import Snapshots
+
+
+def corpus(n: int, edited: tuple[str, ...] = ()) -> list[dict]:
+    return [
+        {"id": f"{i:03d}", "title": f"T{i}", "body": f"body {i}" + (" (edited)" if f"{i:03d}" in edited else ""),
+         "categories": ["#a"]}
+        for i in range(1, n + 1)
+    ]
+
+
+def ids(prompts) -> list[str]:
+    return [p["id"] for p in prompts]
+
+
+@pytest.fixture
+def snaps(tmp_path):
+    s = Snapshots(tmp_path / "prompts.snap")
+    yield s
+    s.wait()
+
+
+def test_deltas_materialize_every_version(snaps) -> None:
+    v1 = snaps.commit(corpus(5))
+    v2 = snaps.commit(corpus(6, edited=("002",)))
+    v3 = snaps.commit([p for p in corpus(6, edited=("002",)) if p["id"] != "004"])
+    assert snaps.commit(corpus(6, edited=("002",))[:3] + corpus(6, edited=("002",))[4:]) is None
+
+    assert snaps.materialize(v1) == corpus(5)
+    assert snaps.materialize(v2) == corpus(6, edited=("002",))
+    assert ids(snaps.materialize(v3)) == ["001", "002", "003", "005", "006"]
+    assert snaps.diff(v1, v3) == {"added": ["006"], "modified": ["002"], "removed": ["004"]}
+    assert snaps.entry(v2)["base"] is False and (snaps.dir / "delta-000002.jsonl").exists()
+
+
+def test_order_changes_are_recorded(snaps) -> None:
+    snaps.commit(corpus(4))
+    v2 = snaps.commit(corpus(4)[::-1])
+    assert ids(snaps.materialize(v2)) == ["004", "003", "002", "001"]
+
+
+def test_rollback_moves_the_head(tmp_path, snaps) -> None:
+    v1 = snaps.commit(corpus(3))
+    snaps.commit(corpus(3, edited=("001", "003")))
+    snaps.rollback(v1)
+    assert snaps.head == v1
+    assert Snapshots(tmp_path / "prompts.snap").materialize() == corpus(3)
+
+    v3 = snaps.commit(corpus(4))  # Commits after a rollback branch off it
+    assert snaps.entry(v3)["parent"] == v1
+    with pytest.raises(KeyError):
+        snaps.rollback(99)
+
+
+def test_compaction_writes_a_base(monkeypatch, snaps) -> None:
+    monkeypatch.setattr(prompt_snapshots, "COMPACT_AFTER", 2)
+    for i in range(1, 6):
+        snaps.commit(corpus(3 + i))
+    snaps.wait()
+    assert any(snaps.entry(v)["base"] for v in snaps.versions()[1:])
+    assert len(snaps.chain(snaps.head)) <= 3
+    assert snaps.materialize() == corpus(8)
+
+    v = snaps.commit(corpus(9))
+    assert snaps.compact() is True
+    assert snaps.compact() is False
+    assert snaps.chain(v) == [v]
+
+
+def test_prune_keeps_what_the_newest_versions_need(tmp_path, snaps) -> None:
+    for i in range(1, 6):
+        snaps.commit(corpus(i))
+    # Versions 4 and 5 are deltas on the base of version 1: nothing can go
+    assert snaps.prune(keep=2) == (0, 0)
+    assert snaps.versions() == [1, 2, 3, 4, 5]
+
+    snaps.compact(4)
+    dropped, freed = snaps.prune(keep=2)
+    assert dropped == 3 and freed > 0
+    assert sorted(p.name for p in snaps.dir.iterdir()) == ["base-000004.jsonl", "delta-000005.jsonl"]
+    assert snaps.versions() == [4, 5]
+
+    reopened = Snapshots(tmp_path / "prompts.snap")
+    assert reopened.materialize(4) == corpus(4)
+    assert reopened.materialize() == corpus(5)
@@ -6,17 +6,42 @@ echo  Prompt Aggregator - Data Update Tool
 echo ==========================================
 echo.
 echo Step 1: Crawling data from nanyo-city.jpn.org...
-python scripts/crawl_prompts.py
+python scripts/crawl_prompts.py --refresh
 if errorlevel 1 goto error
 
 echo.
 echo Step 2: Categorizing prompts...
-python scripts/categorize_prompts.py
+python scripts/categorize_prompts.py --changeset
 if errorlevel 1 goto error
 
 echo.
 echo Step 3: Generating single-file HTML app...
-python scripts/generate_html.py
+python scripts/generate_html.py --changeset
+if errorlevel 1 goto error
+
+echo.
+echo Step 4: Exporting the Dify knowledge base...
+python scripts/export_for_dify.py --changeset
+if errorlevel 1 goto error
+
+echo.
+echo Step 5: Building the search database...
+python scripts/prompt_db.py build
+if errorlevel 1 goto error
+
+echo.
+echo Step 6: Packing the corpus for lookups by ID...
+python scripts/prompt_pack.py build
+if errorlevel 1 goto error
+
+echo.
+echo Step 7: Recording a dataset snapshot...
+python scripts/prompt_snapshots.py commit --note update_app
+if errorlevel 1 goto error
+
+echo.
+echo Step 8: Marking the changeset as processed...
+python scripts/changeset.py commit
 if errorlevel 1 goto error
 
 echo.